@@ -1,12 +1,22 @@
 from flask import Flask, render_template, redirect, url_for, flash, request
 from flask_login import LoginManager, current_user
 from config import Config
-from models import db, User
+from models import db
+from utils.approval_events import install_event_hooks
+from utils.catalogue import catalogue
+from utils.db_engine import engine_options, install_sqlite_pragmas
 from utils.email_utils import mail
+from utils.identity_cache import identity_cache
+from utils.email_queue import start_email_workers
+from utils.migrations import upgrade_schema
+from utils.receipt_store import start_receipt_gc
+from utils.query_audit import install_query_plan_auditor, install_query_counter
 import os
+import threading
 
 app = Flask(__name__)
 app.config.from_object(Config)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
 
 db.init_app(app)
 mail.init_app(app)
@@ -17,7 +27,7 @@ login_manager.login_view = 'auth.login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity_cache.get(int(user_id))
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -25,11 +35,13 @@ from routes.auth_routes import auth_bp
 from routes.admin_routes import admin_bp
 from routes.employee_routes import employee_bp
 from routes.manager_routes import manager_bp
+from routes.api_routes import api_bp, API_VERSION
 
 app.register_blueprint(auth_bp, url_prefix='/auth')
 app.register_blueprint(admin_bp, url_prefix='/admin')
 app.register_blueprint(employee_bp, url_prefix='/employee')
 app.register_blueprint(manager_bp, url_prefix='/manager')
+app.register_blueprint(api_bp, url_prefix=f'/api/{API_VERSION}')
 
 @app.route('/')
 def index():
@@ -51,7 +63,47 @@ def server_error(e):
     return render_template('shared/500.html'), 500
 
 with app.app_context():
+    install_sqlite_pragmas(db.engine, app.config)
     db.create_all()
+    upgrade_schema()
+    install_event_hooks(db.session)
+    if app.config['QUERY_COUNTER']:
+        install_query_counter(app, db.engine)
+    if app.config['QUERY_PLAN_AUDIT']:
+        install_query_plan_auditor(app, db.engine)
+
+email_worker_pool = None
+receipt_gc = None
+_workers_pid = None
+_workers_lock = threading.Lock()
+
+def start_background_workers():
+    # Not run on import, so tests, migrations and one-off scripts that pull in
+    # the app don't spawn threads. Web processes start them on their first
+    # request, and `flask workers` at startup. Keyed by pid: a server that
+    # forks workers after importing the app leaves the threads behind.
+    global email_worker_pool, receipt_gc, _workers_pid
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers_pid = os.getpid()
+        email_worker_pool = start_email_workers(app)
+        receipt_gc = start_receipt_gc(app)
+        catalogue.start_refresh()
+        if email_worker_pool is None:
+            print("No email workers in this process: OTPs and notifications stay "
+                  "in the outbox until a `flask workers` process sends them")
+
+@app.before_request
+def ensure_background_workers():
+    if app.config['BACKGROUND_WORKERS'] and _workers_pid != os.getpid():
+        start_background_workers()
+
+@app.cli.command('workers')
+def run_workers():
+    """Run the email, receipt GC and catalogue workers in the foreground."""
+    start_background_workers()
+    threading.Event().wait()
 
 if __name__ == "__main__":
     app.run(debug=True, port=8000)
@@ -3,21 +3,98 @@ from datetime import timedelta
 
 class Config:
     SECRET_KEY = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///expense_management.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///expense_management.db').replace('postgres://', 'postgresql://', 1)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'True').lower() == 'true'
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 4096))
+    APPROVAL_PLAN_CACHE_TTL = int(os.environ.get('APPROVAL_PLAN_CACHE_TTL', 60))
+    
+    QUERY_COUNTER = os.environ.get('QUERY_COUNTER', 'False').lower() == 'true'
+    QUERY_PLAN_AUDIT = os.environ.get('QUERY_PLAN_AUDIT', 'False').lower() == 'true'
+    QUERY_PLAN_AUDIT_STRICT = os.environ.get('QUERY_PLAN_AUDIT_STRICT', 'False').lower() == 'true'
+    QUERY_PLAN_AUDIT_ALLOWED_TABLES = set(filter(None, os.environ.get('QUERY_PLAN_AUDIT_ALLOWED_TABLES', '').split(',')))
+    
     UPLOAD_FOLDER = 'static/uploads/receipts'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
+    RECEIPT_STORAGE_BACKEND = os.environ.get('RECEIPT_STORAGE_BACKEND', 'local')
+    RECEIPT_S3_BUCKET = os.environ.get('RECEIPT_S3_BUCKET', '')
+    RECEIPT_S3_PREFIX = os.environ.get('RECEIPT_S3_PREFIX', 'receipts/')
+    RECEIPT_S3_ENDPOINT_URL = os.environ.get('RECEIPT_S3_ENDPOINT_URL', '')
+    RECEIPT_S3_REGION = os.environ.get('RECEIPT_S3_REGION', '')
+    RECEIPT_GC_INTERVAL = int(os.environ.get('RECEIPT_GC_INTERVAL', 6 * 3600))
+    RECEIPT_GC_GRACE = int(os.environ.get('RECEIPT_GC_GRACE', 24 * 3600))
+    RECEIPT_MAX_BYTES = int(os.environ.get('RECEIPT_MAX_BYTES', 10 * 1024 * 1024))
+    RECEIPT_PREVIEW_WORKERS = int(os.environ.get('RECEIPT_PREVIEW_WORKERS', 2))
+    RECEIPT_PREVIEW_SIZE = int(os.environ.get('RECEIPT_PREVIEW_SIZE', 1280))
+    RECEIPT_THUMB_SIZE = int(os.environ.get('RECEIPT_THUMB_SIZE', 320))
+    RECEIPT_PREVIEW_QUALITY = int(os.environ.get('RECEIPT_PREVIEW_QUALITY', 75))
+    RECEIPT_CACHE_MAX_AGE = int(os.environ.get('RECEIPT_CACHE_MAX_AGE', 365 * 24 * 3600))
+    RECEIPT_PENDING_MAX_AGE = int(os.environ.get('RECEIPT_PENDING_MAX_AGE', 5))
+    
+    OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 0)) or os.cpu_count()
+    OCR_MAX_QUEUE = int(os.environ.get('OCR_MAX_QUEUE', 32))
+    OCR_JOB_TIMEOUT = int(os.environ.get('OCR_JOB_TIMEOUT', 60))
+    OCR_JOB_RETENTION = int(os.environ.get('OCR_JOB_RETENTION', 600))
+    OCR_CACHE_SIZE = int(os.environ.get('OCR_CACHE_SIZE', 1024))
+    OCR_TARGET_DPI = int(os.environ.get('OCR_TARGET_DPI', 300))
+    OCR_MAX_DIMENSION = int(os.environ.get('OCR_MAX_DIMENSION', 2400))
+    OCR_THRESHOLD_RADIUS = int(os.environ.get('OCR_THRESHOLD_RADIUS', 15))
+    OCR_THRESHOLD_OFFSET = int(os.environ.get('OCR_THRESHOLD_OFFSET', 10))
+    OCR_AUTO_ROTATE = os.environ.get('OCR_AUTO_ROTATE', 'False').lower() == 'true'
+    OCR_PDF_MAX_PAGES = int(os.environ.get('OCR_PDF_MAX_PAGES', 5))
     
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
-    MAIL_USE_TLS = True
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'True').lower() == 'true'
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME', '')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD', '')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@expensemanager.com')
     
+    # Web processes run the email, receipt GC and catalogue workers
+    # themselves; set to false when a separate `flask workers` runs them.
+    BACKGROUND_WORKERS = os.environ.get('BACKGROUND_WORKERS', 'True').lower() == 'true'
+    EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS', 2))
+    EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 50))
+    EMAIL_POLL_INTERVAL = float(os.environ.get('EMAIL_POLL_INTERVAL', 2))
+    EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 5))
+    EMAIL_RETRY_BASE_SECONDS = int(os.environ.get('EMAIL_RETRY_BASE_SECONDS', 30))
+    
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     
+    SSE_HEARTBEAT_INTERVAL = float(os.environ.get('SSE_HEARTBEAT_INTERVAL', 15))
+    SSE_BUFFER_SIZE = int(os.environ.get('SSE_BUFFER_SIZE', 100))
+    SSE_MAX_CONNECTIONS = int(os.environ.get('SSE_MAX_CONNECTIONS', 100))
+    SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', 5000))
+    
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 500))
+    STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 5000))
+    EXPORT_ROW_GROUP_SIZE = int(os.environ.get('EXPORT_ROW_GROUP_SIZE', 100000))
+    EXPORT_SPOOL_SIZE = int(os.environ.get('EXPORT_SPOOL_SIZE', 16 * 1024 * 1024))
+    EXPENSE_CATEGORIES = ['Travel', 'Meals', 'Accommodation', 'Transport', 'Supplies', 'Other']
+    
     CURRENCY_API_BASE = 'https://api.exchangerate-api.com/v4/latest/'
+    CURRENCY_RATES_FILE = os.environ.get('CURRENCY_RATES_FILE', '')
+    CURRENCY_RATE_BASE = os.environ.get('CURRENCY_RATE_BASE', 'USD')
+    CURRENCY_RATE_TTL = int(os.environ.get('CURRENCY_RATE_TTL', 3600))
+    CURRENCY_RATE_STALE_TTL = int(os.environ.get('CURRENCY_RATE_STALE_TTL', 86400))
     COUNTRIES_API = 'https://restcountries.com/v3.1/all?fields=name,currencies'
+    COUNTRY_CATALOGUE_FILE = os.environ.get(
+        'COUNTRY_CATALOGUE_FILE',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'countries_currencies.json')
+    )
+    COUNTRY_CATALOGUE_REFRESH_INTERVAL = int(os.environ.get('COUNTRY_CATALOGUE_REFRESH_INTERVAL', 0))
@@ -13,6 +13,7 @@ class Company(db.Model):
     name = db.Column(db.String(200), nullable=False)
     country = db.Column(db.String(100), nullable=False)
     currency = db.Column(db.String(10), nullable=False)
+    identity_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     users = db.relationship('User', backref='company', lazy=True)
@@ -20,6 +21,10 @@ class Company(db.Model):
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_company_role', 'company_id', 'role'),
+        db.Index('ix_users_manager', 'manager_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
@@ -55,8 +60,24 @@ class User(UserMixin, db.Model):
             return True
         return False
 
+class UserHierarchy(db.Model):
+    # Closure table over User.manager_id: one row per (ancestor, descendant)
+    # pair, including each user's own depth-0 row.
+    __tablename__ = 'user_hierarchy'
+    __table_args__ = (
+        db.Index('ix_user_hierarchy_descendant', 'descendant_id', 'depth'),
+    )
+    
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
 class Expense(db.Model):
     __tablename__ = 'expenses'
+    __table_args__ = (
+        db.Index('ix_expenses_employee_submitted', 'employee_id', 'submitted_at'),
+        db.Index('ix_expenses_receipt_path', 'receipt_path'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -70,13 +91,45 @@ class Expense(db.Model):
     vendor_name = db.Column(db.String(200))
     status = db.Column(db.String(20), default='pending')
     current_approval_step = db.Column(db.Integer, default=0)
+    approvals_total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    approvals_approved = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    approvals_rejected = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    current_step_pending = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     final_decision_at = db.Column(db.DateTime)
     
     approvals = db.relationship('ExpenseApproval', backref='expense', lazy=True, cascade='all, delete-orphan')
+    step_counters = db.relationship('ExpenseStepCounter', lazy=True, cascade='all, delete-orphan')
+
+class ExpenseStepCounter(db.Model):
+    __tablename__ = 'expense_step_counters'
+    
+    expense_id = db.Column(db.Integer, db.ForeignKey('expenses.id'), primary_key=True)
+    step_sequence = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    approved = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+
+class ExpenseSummary(db.Model):
+    __tablename__ = 'expense_summaries'
+    __table_args__ = (
+        db.Index('ix_expense_summaries_company_status', 'company_id', 'status'),
+        db.Index('ix_expense_summaries_employee_status', 'employee_id', 'status'),
+    )
+    
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)
+    expense_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
 
 class ApprovalRule(db.Model):
     __tablename__ = 'approval_rules'
+    __table_args__ = (
+        db.Index('ix_approval_rules_company_active', 'company_id', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
@@ -93,6 +146,9 @@ class ApprovalRule(db.Model):
 
 class ApprovalStep(db.Model):
     __tablename__ = 'approval_steps'
+    __table_args__ = (
+        db.Index('ix_approval_steps_rule_sequence', 'rule_id', 'sequence'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     rule_id = db.Column(db.Integer, db.ForeignKey('approval_rules.id'), nullable=False)
@@ -104,6 +160,10 @@ class ApprovalStep(db.Model):
 
 class ExpenseApproval(db.Model):
     __tablename__ = 'expense_approvals'
+    __table_args__ = (
+        db.Index('ix_expense_approvals_approver_status', 'approver_id', 'status'),
+        db.Index('ix_expense_approvals_expense_step', 'expense_id', 'step_sequence'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     expense_id = db.Column(db.Integer, db.ForeignKey('expenses.id'), nullable=False)
@@ -113,3 +173,45 @@ class ExpenseApproval(db.Model):
     comments = db.Column(db.Text)
     decision_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class FxRate(db.Model):
+    __tablename__ = 'fx_rates'
+    __table_args__ = (
+        db.UniqueConstraint('base', 'quote', 'date', name='uq_fx_rates_base_quote_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)
+    base = db.Column(db.String(10), nullable=False)
+    quote = db.Column(db.String(10), nullable=False)
+    rate = db.Column(db.Float, nullable=False)
+
+class OutboundEmail(db.Model):
+    __tablename__ = 'outbound_emails'
+    __table_args__ = (
+        db.Index('ix_outbound_emails_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    dedupe_key = db.Column(db.String(200), unique=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class OcrResult(db.Model):
+    __tablename__ = 'ocr_results'
+    
+    content_hash = db.Column(db.String(64), primary_key=True)
+    amount = db.Column(db.Float)
+    date = db.Column(db.Date)
+    vendor = db.Column(db.String(200))
+    description = db.Column(db.Text)
+    raw_text = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,8 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from functools import wraps
 from models import db, User, Company, ApprovalRule, ApprovalStep, Expense
 from werkzeug.security import generate_password_hash
+from datetime import datetime
+from utils.approval_plans import approval_plan_cache
+from utils.identity_cache import identity_cache
+from utils.expense_summaries import company_status_totals
+from utils.expense_import import import_expenses
+from utils.expense_search import search_available, search_expenses
+from utils.expense_export import EXPORT_FORMATS, ExportFilterError, export_expenses, format_available, parse_filters
+from utils.team_hierarchy import TeamCycleError, add_user, set_manager
+from utils.pagination import keyset_paginate, page_size, order_keyset, sort_order, apply_expense_filters, wants_stream, stream_listing
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -21,13 +30,13 @@ def admin_required(f):
 def dashboard():
     company = current_user.company
     total_employees = User.query.filter_by(company_id=company.id).count()
-    total_expenses = Expense.query.join(User).filter(User.company_id == company.id).count()
-    pending_expenses = Expense.query.join(User).filter(
-        User.company_id == company.id,
-        Expense.status == 'pending'
-    ).count()
+    totals = company_status_totals(company.id)
+    total_expenses = sum(t['count'] for t in totals.values())
+    pending_expenses = totals.get('pending', {}).get('count', 0)
     
-    recent_expenses = Expense.query.join(User).filter(
+    recent_expenses = Expense.query.join(User).options(
+        db.contains_eager(Expense.employee)
+    ).filter(
         User.company_id == company.id
     ).order_by(Expense.submitted_at.desc()).limit(10).all()
     
@@ -41,7 +50,9 @@ def dashboard():
 @login_required
 @admin_required
 def employees():
-    company_employees = User.query.filter_by(company_id=current_user.company_id).all()
+    company_employees = User.query.options(
+        db.joinedload(User.manager)
+    ).filter_by(company_id=current_user.company_id).all()
     return render_template('admin/employees.html', employees=company_employees)
 
 @admin_bp.route('/employees/create', methods=['GET', 'POST'])
@@ -70,6 +81,9 @@ def create_employee():
         user.set_password(password)
         
         db.session.add(user)
+        db.session.flush()
+        add_user(user.id, user.manager_id)
+        identity_cache.invalidate(current_user.company_id)
         db.session.commit()
         
         flash(f'{role.capitalize()} created successfully', 'success')
@@ -89,16 +103,24 @@ def edit_employee(user_id):
         return redirect(url_for('admin.employees'))
     
     if request.method == 'POST':
+        manager_id = request.form.get('manager_id')
+        try:
+            set_manager(user, int(manager_id) if manager_id else None)
+        except TeamCycleError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return redirect(url_for('admin.edit_employee', user_id=user_id))
+        
         user.full_name = request.form.get('full_name')
         user.role = request.form.get('role')
-        manager_id = request.form.get('manager_id')
-        user.manager_id = int(manager_id) if manager_id else None
         
         password = request.form.get('password')
         if password:
             user.set_password(password)
         
+        identity_cache.invalidate(current_user.company_id)
         db.session.commit()
+        approval_plan_cache.invalidate(current_user.company_id)
         flash('Employee updated successfully', 'success')
         return redirect(url_for('admin.employees'))
     
@@ -150,6 +172,7 @@ def create_approval_rule():
                 db.session.add(step)
         
         db.session.commit()
+        approval_plan_cache.invalidate(current_user.company_id)
         flash('Approval rule created successfully', 'success')
         return redirect(url_for('admin.approval_rules'))
     
@@ -163,7 +186,72 @@ def create_approval_rule():
 @login_required
 @admin_required
 def all_expenses():
-    expenses = Expense.query.join(User).filter(
+    query = Expense.query.join(User).options(
+        db.contains_eager(Expense.employee)
+    ).filter(
         User.company_id == current_user.company_id
-    ).order_by(Expense.submitted_at.desc()).all()
-    return render_template('admin/all_expenses.html', expenses=expenses)
+    )
+    categories = current_app.config['EXPENSE_CATEGORIES']
+    
+    search_query = request.args.get('q', '').strip()
+    if search_query and search_available():
+        page = search_expenses(current_user.company_id, search_query, page_size(), request.args.get('cursor'))
+        by_id = {expense.id: expense for expense in query.filter(Expense.id.in_([hit.id for hit in page]))}
+        page.items = [by_id[hit.id] for hit in page if hit.id in by_id]
+        return render_template('admin/all_expenses.html', expenses=page, page=page, categories=categories,
+                               search_query=search_query)
+    
+    query = apply_expense_filters(query, Expense)
+    
+    if wants_stream():
+        expenses = order_keyset(query, Expense.submitted_at, Expense.id, sort_order())
+        return stream_listing('admin/all_expenses.html',
+                              expenses=expenses.yield_per(current_app.config['STREAM_BATCH_SIZE']),
+                              page=None,
+                              categories=categories)
+    
+    page = keyset_paginate(query, Expense.submitted_at, Expense.id, lambda e: (e.submitted_at, e.id))
+    return render_template('admin/all_expenses.html', expenses=page, page=page, categories=categories)
+
+@admin_bp.route('/expenses/export')
+@login_required
+@admin_required
+def export_expenses_api():
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'Format must be csv, xlsx or parquet'}), 400
+    if not format_available(fmt):
+        return jsonify({'success': False, 'message': f'{fmt} export is not available on this server'}), 501
+    
+    try:
+        filters = parse_filters(request.args)
+    except ExportFilterError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"expenses-{datetime.utcnow().strftime('%Y%m%d')}.{extension}"
+    body = export_expenses(current_user.company_id, filters, fmt)
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@admin_bp.route('/expenses/import', methods=['POST'])
+@login_required
+@admin_required
+def import_expenses_api():
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+    
+    extension = file.filename.rsplit('.', 1)[-1].lower()
+    if extension not in ('csv', 'json', 'jsonl', 'ndjson'):
+        return jsonify({'success': False, 'message': 'File must be CSV, JSON or JSON Lines'}), 400
+    
+    report = import_expenses(file.stream, extension, current_user.company)
+    if report['aborted']:
+        # Rows before the parse error are already committed; the report
+        # says how many, and the error gives the offset to resume from.
+        return jsonify({'success': False, **report}), 400
+    return jsonify({'success': True, **report})
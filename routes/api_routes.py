@@ -0,0 +1,431 @@
+from flask import Blueprint, request, jsonify, current_app, url_for
+from flask_login import current_user
+from functools import wraps
+from models import db, Expense, ExpenseApproval, User
+from routes.employee_routes import allowed_file, create_expense
+from routes.manager_routes import decide_approval, apply_bulk_decision
+from utils.catalogue import catalogue
+from utils.currency_utils import get_supported_currencies
+from utils.expense_search import search_available, search_expenses
+from utils.pagination import keyset_paginate, page_size, apply_expense_filters
+from utils.receipt_store import ReceiptRejected, is_receipt_key, receipt_store
+from utils.team_hierarchy import join_team
+from datetime import date, datetime
+import hashlib
+import math
+
+API_VERSION = 'v1'
+
+api_bp = Blueprint('api_v1', __name__)
+
+# Compact projections: list and detail responses are built from these
+# columns directly, never from loaded ORM objects.
+EXPENSE_COLUMNS = (
+    Expense.id,
+    Expense.employee_id,
+    User.full_name.label('employee_name'),
+    Expense.amount,
+    Expense.currency,
+    Expense.amount_in_company_currency,
+    Expense.category,
+    Expense.description,
+    Expense.vendor_name,
+    Expense.expense_date,
+    Expense.status,
+    Expense.submitted_at,
+    Expense.final_decision_at,
+)
+
+APPROVAL_COLUMNS = (
+    ExpenseApproval.id,
+    ExpenseApproval.expense_id,
+    ExpenseApproval.step_sequence,
+    ExpenseApproval.status,
+    ExpenseApproval.comments,
+    ExpenseApproval.decision_at,
+    User.full_name.label('employee_name'),
+    Expense.amount_in_company_currency,
+    Expense.category,
+    Expense.description,
+    Expense.vendor_name,
+    Expense.expense_date,
+    Expense.status.label('expense_status'),
+    Expense.current_approval_step,
+    Expense.submitted_at,
+)
+
+DETAIL_APPROVAL_COLUMNS = (
+    ExpenseApproval.id,
+    ExpenseApproval.approver_id,
+    User.full_name.label('approver_name'),
+    ExpenseApproval.step_sequence,
+    ExpenseApproval.status,
+    ExpenseApproval.comments,
+    ExpenseApproval.decision_at,
+)
+
+class ExpensePayloadError(ValueError):
+    pass
+
+@api_bp.before_request
+def require_login():
+    if not current_user.is_authenticated:
+        return jsonify({'success': False, 'message': 'Authentication required'}), 401
+
+@api_bp.before_request
+def require_json_object():
+    # Every handler reads named fields off the body, so an array or a bare
+    # value is rejected here rather than failing inside the view.
+    if request.method == 'POST' and request.is_json and not isinstance(request.get_json(silent=True), (dict, type(None))):
+        return jsonify({'success': False, 'message': 'Request body must be a JSON object'}), 400
+
+@api_bp.errorhandler(400)
+def bad_request(e):
+    return jsonify({'success': False, 'message': e.description}), 400
+
+@api_bp.errorhandler(404)
+def not_found(e):
+    return jsonify({'success': False, 'message': 'Not found'}), 404
+
+def approver_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if current_user.role not in ['manager', 'admin']:
+            return jsonify({'success': False, 'message': 'Manager access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def serialize_row(row):
+    return {
+        key: value.isoformat() if isinstance(value, (date, datetime)) else value
+        for key, value in row._mapping.items()
+    }
+
+def serialize_page(page):
+    next_url = None
+    if page.next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = page.next_cursor
+        next_url = url_for(request.endpoint, **request.view_args, **args)
+    return {
+        'success': True,
+        'items': [serialize_row(row) for row in page],
+        'next_cursor': page.next_cursor,
+        'next_url': next_url,
+        'sort': page.sort
+    }
+
+def make_etag(*parts):
+    # The version rows are an aggregate over exactly the set a response is
+    # built from, so they change whenever a submission or decision would
+    # change the body. Who is asking and the full query string are mixed in
+    # so each page and scope gets its own tag.
+    raw = '|'.join(
+        part.isoformat() if isinstance(part, (date, datetime)) else str(part)
+        for part in (API_VERSION, current_user.id, request.full_path) + parts
+    )
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def conditional_json(etag, build):
+    # Polling clients send If-None-Match; when nothing changed the body is
+    # never queried or serialized.
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+def scoped_expenses(*entities):
+    query = db.session.query(*entities).select_from(Expense).join(User, User.id == Expense.employee_id)
+    scope = request.args.get('scope', 'mine')
+    if scope == 'team' and current_user.role == 'manager':
+        query = join_team(query, current_user.id, Expense.employee_id)
+    elif scope == 'team' and current_user.role == 'admin':
+        query = query.filter(User.company_id == current_user.company_id)
+    else:
+        query = query.filter(Expense.employee_id == current_user.id)
+    return apply_expense_filters(query, Expense)
+
+def approval_queue(*entities):
+    query = db.session.query(*entities).select_from(ExpenseApproval).join(
+        Expense, Expense.id == ExpenseApproval.expense_id
+    ).filter(ExpenseApproval.approver_id == current_user.id)
+    status = request.args.get('status')
+    if status:
+        query = query.filter(ExpenseApproval.status == status)
+    return query
+
+@api_bp.route('/expenses', methods=['GET'])
+def list_expenses():
+    if request.args.get('scope', 'mine') not in ('mine', 'team'):
+        return jsonify({'success': False, 'message': 'scope must be mine or team'}), 400
+    if request.args.get('scope') == 'team' and current_user.role not in ['manager', 'admin']:
+        return jsonify({'success': False, 'message': 'Manager access required'}), 403
+
+    version = scoped_expenses(
+        db.func.count(Expense.id),
+        db.func.max(Expense.submitted_at),
+        db.func.max(Expense.final_decision_at)
+    ).one()
+
+    def build():
+        query = scoped_expenses(*EXPENSE_COLUMNS)
+        return serialize_page(keyset_paginate(query, Expense.submitted_at, Expense.id, lambda r: (r.submitted_at, r.id)))
+
+    return conditional_json(make_etag(*version), build)
+
+@api_bp.route('/expenses/search', methods=['GET'])
+def search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': 'q is required'}), 400
+    if not search_available():
+        return jsonify({'success': False, 'message': 'Search is not available on this server'}), 501
+
+    # Admins search the whole company, managers their own expenses and their
+    # reporting subtree, employees their own.
+    employee_id = current_user.id if current_user.role == 'employee' else None
+    team_of = current_user.id if current_user.role == 'manager' else None
+    page = search_expenses(
+        current_user.company_id, query, page_size(), request.args.get('cursor'), employee_id, team_of
+    )
+
+    ids = [hit.id for hit in page]
+    rows = {
+        row.id: row for row in db.session.query(*EXPENSE_COLUMNS).join(
+            User, User.id == Expense.employee_id
+        ).filter(Expense.id.in_(ids)).all()
+    } if ids else {}
+
+    items = []
+    for hit in page:
+        if hit.id not in rows:
+            continue
+        item = serialize_row(rows[hit.id])
+        item['score'] = hit.score
+        item['ocr_snippet'] = hit.ocr_snippet or None
+        items.append(item)
+
+    next_url = None
+    if page.next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = page.next_cursor
+        next_url = url_for('api_v1.search', **args)
+    return jsonify({'success': True, 'items': items, 'next_cursor': page.next_cursor, 'next_url': next_url})
+
+@api_bp.route('/expenses/<int:expense_id>', methods=['GET'])
+def get_expense(expense_id):
+    version = db.session.query(
+        Expense.employee_id,
+        User.company_id,
+        Expense.status,
+        Expense.current_approval_step,
+        Expense.submitted_at,
+        Expense.final_decision_at,
+        db.func.max(ExpenseApproval.decision_at),
+        db.func.count(ExpenseApproval.id)
+    ).join(User, User.id == Expense.employee_id).outerjoin(
+        ExpenseApproval, ExpenseApproval.expense_id == Expense.id
+    ).filter(Expense.id == expense_id).group_by(Expense.id, User.company_id).first()
+
+    if version is None or not can_view_expense(version.employee_id, version.company_id):
+        return not_found(None)
+
+    return conditional_json(make_etag(*version), lambda: serialize_expense_detail(expense_id))
+
+def can_view_expense(employee_id, company_id):
+    if employee_id == current_user.id:
+        return True
+    return current_user.role in ['admin', 'manager'] and company_id == current_user.company_id
+
+def serialize_expense_detail(expense_id):
+    expense = db.session.query(
+        *EXPENSE_COLUMNS,
+        Expense.current_approval_step,
+        Expense.receipt_path.isnot(None).label('has_receipt')
+    ).join(User, User.id == Expense.employee_id).filter(Expense.id == expense_id).one()
+
+    approvals = db.session.query(*DETAIL_APPROVAL_COLUMNS).join(
+        User, User.id == ExpenseApproval.approver_id
+    ).filter(ExpenseApproval.expense_id == expense_id).order_by(
+        ExpenseApproval.step_sequence, ExpenseApproval.id
+    ).all()
+
+    data = serialize_row(expense)
+    data['approvals'] = [serialize_row(row) for row in approvals]
+    if expense.has_receipt:
+        data['receipt_url'] = url_for('employee.receipt_file', expense_id=expense_id, variant='original')
+        data['preview_url'] = url_for('employee.receipt_file', expense_id=expense_id, variant='preview')
+    return {'success': True, 'expense': data}
+
+def payload_text(data, name):
+    value = data.get(name)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ExpensePayloadError(f'{name} must be a string')
+    return value.strip()
+
+def payload_comments(payload):
+    comments = payload.get('comments')
+    if comments is not None and not isinstance(comments, str):
+        raise ExpensePayloadError('comments must be a string')
+    return comments or ''
+
+def parse_expense_payload(data):
+    try:
+        amount = float(data.get('amount'))
+    except (TypeError, ValueError):
+        raise ExpensePayloadError('amount must be a number')
+    if not math.isfinite(amount):
+        raise ExpensePayloadError('amount must be a number')
+    if amount <= 0:
+        raise ExpensePayloadError('amount must be positive')
+
+    company_currency = current_user.company.currency
+    currency = payload_text(data, 'currency') or company_currency
+    if currency not in catalogue.snapshot.currencies:
+        raise ExpensePayloadError(f'Unknown currency {currency}')
+    if currency not in get_supported_currencies(company_currency):
+        raise ExpensePayloadError(f'No exchange rate for {currency} to {company_currency}')
+
+    category = data.get('category')
+    if category not in current_app.config['EXPENSE_CATEGORIES']:
+        raise ExpensePayloadError('category must be one of ' + ', '.join(current_app.config['EXPENSE_CATEGORIES']))
+
+    description = payload_text(data, 'description')
+    if not description:
+        raise ExpensePayloadError('description is required')
+
+    try:
+        expense_date = datetime.strptime(payload_text(data, 'expense_date'), '%Y-%m-%d').date()
+    except ValueError:
+        raise ExpensePayloadError('expense_date must be YYYY-MM-DD')
+
+    return {
+        'amount': amount,
+        'currency': currency,
+        'category': category,
+        'description': description,
+        'expense_date': expense_date,
+        'vendor_name': payload_text(data, 'vendor_name')
+    }
+
+def payload_receipt(data):
+    # Either a multipart upload, or the filepath an earlier /employee/ocr-scan
+    # call returned for a receipt that is already stored.
+    file = request.files.get('receipt')
+    if file and file.filename:
+        if not allowed_file(file.filename):
+            raise ExpensePayloadError('Invalid file type')
+        try:
+            receipt_path, _ = receipt_store.save_upload(file, current_app.config['RECEIPT_MAX_BYTES'])
+        except ReceiptRejected as e:
+            raise ExpensePayloadError(str(e))
+        return receipt_path
+
+    receipt_path = data.get('receipt_path')
+    if not receipt_path:
+        return None
+    if not isinstance(receipt_path, str) or not is_receipt_key(receipt_path) or not receipt_store.exists(receipt_path):
+        raise ExpensePayloadError('Unknown receipt_path')
+    return receipt_path
+
+@api_bp.route('/expenses', methods=['POST'])
+def submit_expense():
+    data = request.get_json(silent=True) if request.is_json else request.form
+    try:
+        values = parse_expense_payload(data or {})
+        receipt_path = payload_receipt(data or {})
+    except ExpensePayloadError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    expense = create_expense(receipt_path=receipt_path, **values)
+    response = jsonify(serialize_expense_detail(expense.id))
+    response.status_code = 201
+    response.headers['Location'] = url_for('api_v1.get_expense', expense_id=expense.id)
+    return response
+
+@api_bp.route('/approvals', methods=['GET'])
+@approver_required
+def list_approvals():
+    # current_approval_step only moves forward, so its sum changes whenever
+    # an earlier step completes on any expense in the queue.
+    version = approval_queue(
+        db.func.count(ExpenseApproval.id),
+        db.func.max(Expense.submitted_at),
+        db.func.max(ExpenseApproval.decision_at),
+        db.func.max(Expense.final_decision_at),
+        db.func.sum(Expense.current_approval_step)
+    ).one()
+
+    def build():
+        query = approval_queue(*APPROVAL_COLUMNS).join(User, User.id == Expense.employee_id)
+        return serialize_page(keyset_paginate(query, Expense.submitted_at, ExpenseApproval.id, lambda r: (r.submitted_at, r.id)))
+
+    return conditional_json(make_etag(*version), build)
+
+def serialize_approval(approval_id):
+    row = approval_queue(*APPROVAL_COLUMNS).join(User, User.id == Expense.employee_id).filter(
+        ExpenseApproval.id == approval_id
+    ).one()
+    return serialize_row(row)
+
+@api_bp.route('/approvals/<int:approval_id>/decision', methods=['POST'])
+@approver_required
+def decide(approval_id):
+    payload = request.get_json(silent=True) or {}
+    action = payload.get('action')
+    if action not in ('approve', 'reject'):
+        return jsonify({'success': False, 'message': 'action must be approve or reject'}), 400
+
+    try:
+        comments = payload_comments(payload)
+    except ExpensePayloadError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    approval = db.session.get(ExpenseApproval, approval_id)
+    if approval is None or approval.approver_id != current_user.id:
+        return not_found(None)
+
+    if not decide_approval(approval, action, comments):
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'This approval has already been decided'}), 409
+
+    db.session.commit()
+    return jsonify({'success': True, 'approval': serialize_approval(approval_id)})
+
+@api_bp.route('/approvals/decisions', methods=['POST'])
+@approver_required
+def decide_many():
+    payload = request.get_json(silent=True) or {}
+    action = payload.get('action')
+    approval_ids = payload.get('approval_ids')
+    approval_ids = [int(i) for i in approval_ids if str(i).isdigit()] if isinstance(approval_ids, list) else []
+    if action not in ('approve', 'reject') or not approval_ids:
+        return jsonify({'success': False, 'message': 'approval_ids and a valid action are required'}), 400
+    try:
+        comments = payload_comments(payload)
+    except ExpensePayloadError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    owned_ids = db.session.scalars(
+        db.select(ExpenseApproval.id).join(Expense).where(
+            ExpenseApproval.id.in_(approval_ids),
+            ExpenseApproval.approver_id == current_user.id,
+            ExpenseApproval.status == 'pending',
+            Expense.status == 'pending'
+        )
+    ).all()
+
+    decided_ids = apply_bulk_decision(owned_ids, action, comments)
+    db.session.commit()
+    return jsonify({
+        'success': True,
+        'decided': decided_ids,
+        'skipped': sorted(set(approval_ids) - set(decided_ids))
+    })
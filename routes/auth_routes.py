@@ -2,7 +2,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, current_user
 from models import db, User, Company
 from utils.email_utils import send_otp_email
-from utils.currency_utils import get_all_countries_currencies
+from utils.catalogue import catalogue
+from utils.team_hierarchy import add_user
 from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__)
@@ -38,16 +39,16 @@ def signup():
         otp = user.generate_otp()
         
         db.session.add(user)
-        db.session.commit()
-        
+        db.session.flush()
+        add_user(user.id)
         send_otp_email(email, otp, full_name)
+        db.session.commit()
         
         session['pending_verification_user_id'] = user.id
         flash('OTP sent to your email. Please verify to complete registration.', 'success')
         return redirect(url_for('auth.verify_otp'))
     
-    countries_currencies = get_all_countries_currencies()
-    return render_template('auth/signup.html', countries_currencies=countries_currencies)
+    return render_template('auth/signup.html', country_options=catalogue.snapshot.country_options)
 
 @auth_bp.route('/verify-otp', methods=['GET', 'POST'])
 def verify_otp():
@@ -93,8 +94,8 @@ def login():
         
         if user and user.check_password(password):
             otp = user.generate_otp()
-            db.session.commit()
             send_otp_email(email, otp, user.full_name)
+            db.session.commit()
             session['pending_verification_user_id'] = user.id
             session['login_next_page'] = request.args.get('next')
             flash('OTP sent to your email. Please verify to login.', 'success')
@@ -121,9 +122,9 @@ def resend_otp():
         return {'success': False, 'message': 'User not found'}, 404
     
     otp = user.generate_otp()
-    db.session.commit()
-    
-    if send_otp_email(user.email, otp, user.full_name):
-        return {'success': True, 'message': 'OTP resent successfully'}
-    else:
+    if not send_otp_email(user.email, otp, user.full_name):
+        db.session.rollback()
         return {'success': False, 'message': 'Failed to send OTP'}, 500
+    
+    db.session.commit()
+    return {'success': True, 'message': 'OTP resent successfully'}
@@ -1,10 +1,19 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, abort, send_file
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from models import db, Expense, ExpenseApproval, ApprovalRule, ApprovalStep
-from utils.currency_utils import convert_currency, get_supported_currencies
-from utils.ocr_utils import extract_receipt_data
+from models import db, Expense, ExpenseApproval
+from utils.currency_utils import convert_currency, currency_options, get_supported_currencies
+from utils.fx_history import record_daily_snapshot
+from utils.ocr_jobs import ocr_job_queue, QueueFullError
+from utils.ocr_cache import ocr_cache
+from utils.receipt_previews import PENDING_PLACEHOLDER, PREVIEW_FORMAT, PREVIEW_MIMETYPES, preview_generator
+from utils.receipt_store import ReceiptRejected, content_hash_of, receipt_store
+from utils.pagination import keyset_paginate, apply_expense_filters
+from utils.expense_search import attach_ocr_text, index_expense
+from utils.expense_summaries import employee_status_totals, record_new_expense
 from utils.email_utils import send_approval_notification
+from utils.approval_plans import approval_plan_cache, snapshot_user
+from utils.approval_counters import init_counters
+from utils.approval_events import publish_after_commit, approval_payload
 from datetime import datetime
 import os
 
@@ -17,17 +26,22 @@ def allowed_file(filename):
 @employee_bp.route('/dashboard')
 @login_required
 def dashboard():
-    my_expenses = Expense.query.filter_by(employee_id=current_user.id).order_by(Expense.submitted_at.desc()).all()
+    totals = employee_status_totals(current_user.id)
     
-    pending = sum(1 for e in my_expenses if e.status == 'pending')
-    approved = sum(1 for e in my_expenses if e.status == 'approved')
-    rejected = sum(1 for e in my_expenses if e.status == 'rejected')
+    page = keyset_paginate(
+        apply_expense_filters(Expense.query.filter_by(employee_id=current_user.id), Expense),
+        Expense.submitted_at,
+        Expense.id,
+        lambda e: (e.submitted_at, e.id)
+    )
     
     return render_template('employee/dashboard.html', 
-                         expenses=my_expenses,
-                         pending_count=pending,
-                         approved_count=approved,
-                         rejected_count=rejected)
+                         expenses=page,
+                         page=page,
+                         categories=current_app.config['EXPENSE_CATEGORIES'],
+                         pending_count=totals.get('pending', {}).get('count', 0),
+                         approved_count=totals.get('approved', {}).get('count', 0),
+                         rejected_count=totals.get('rejected', {}).get('count', 0))
 
 @employee_bp.route('/expenses/submit', methods=['GET', 'POST'])
 @login_required
@@ -40,45 +54,35 @@ def submit_expense():
         expense_date = datetime.strptime(request.form.get('expense_date'), '%Y-%m-%d').date()
         vendor_name = request.form.get('vendor_name', '')
         
-        company_currency = current_user.company.currency
-        amount_in_company_currency = convert_currency(amount, currency, company_currency)
-        
-        expense = Expense(
-            employee_id=current_user.id,
-            amount=amount,
-            currency=currency,
-            amount_in_company_currency=amount_in_company_currency,
-            category=category,
-            description=description,
-            expense_date=expense_date,
-            vendor_name=vendor_name
-        )
+        if currency not in get_supported_currencies(current_user.company.currency):
+            flash(f'No exchange rate is available for {currency}', 'error')
+            return redirect(url_for('employee.submit_expense'))
         
+        receipt_path = None
         if 'receipt' in request.files:
             file = request.files['receipt']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(f"{current_user.id}_{datetime.now().timestamp()}_{file.filename}")
-                filepath = os.path.join('static/uploads/receipts', filename)
-                file.save(filepath)
-                expense.receipt_path = filepath
-        
-        db.session.add(expense)
-        db.session.flush()
+                try:
+                    receipt_path, _ = receipt_store.save_upload(file, current_app.config['RECEIPT_MAX_BYTES'])
+                except ReceiptRejected as e:
+                    flash(str(e), 'error')
+                    return redirect(url_for('employee.submit_expense'))
         
-        create_approval_workflow(expense)
-        
-        db.session.commit()
+        create_expense(amount, currency, category, description, expense_date, vendor_name, receipt_path)
         flash('Expense submitted successfully', 'success')
         return redirect(url_for('employee.dashboard'))
     
-    currencies = get_supported_currencies()
-    categories = ['Travel', 'Meals', 'Accommodation', 'Transport', 'Supplies', 'Other']
-    return render_template('employee/submit_expense.html', currencies=currencies, categories=categories)
+    categories = current_app.config['EXPENSE_CATEGORIES']
+    return render_template('employee/submit_expense.html',
+                           currency_options=currency_options(current_user.company.currency),
+                           categories=categories)
 
 @employee_bp.route('/expenses/<int:expense_id>')
 @login_required
 def view_expense(expense_id):
-    expense = Expense.query.get_or_404(expense_id)
+    expense = Expense.query.options(
+        db.selectinload(Expense.approvals).joinedload(ExpenseApproval.approver)
+    ).get_or_404(expense_id)
     
     if expense.employee_id != current_user.id and current_user.role not in ['admin', 'manager']:
         flash('Access denied', 'error')
@@ -86,6 +90,60 @@ def view_expense(expense_id):
     
     return render_template('employee/view_expense.html', expense=expense)
 
+@employee_bp.route('/expenses/<int:expense_id>/receipt/<variant>')
+@login_required
+def receipt_file(expense_id, variant):
+    if variant not in ('thumb', 'preview', 'original'):
+        abort(404)
+    
+    expense = db.get_or_404(Expense, expense_id)
+    if expense.employee.company_id != current_user.company_id:
+        abort(403)
+    if expense.employee_id != current_user.id and current_user.role not in ['admin', 'manager']:
+        abort(403)
+    if not expense.receipt_path:
+        abort(404)
+    
+    if variant == 'original':
+        path, mimetype = receipt_store.local_path(expense.receipt_path), None
+    else:
+        path = preview_generator.lookup(expense.receipt_path, variant)
+        if path is None:
+            return pending_preview(expense.receipt_path)
+        mimetype = PREVIEW_MIMETYPES[PREVIEW_FORMAT]
+    if path is None or not os.path.exists(path):
+        abort(404)
+    
+    # Receipts are stored under their content hash, so a URL's bytes never
+    # change and the response can be cached for as long as browsers allow.
+    response = send_file(
+        os.path.abspath(path),
+        mimetype=mimetype,
+        conditional=True,
+        etag=f"{content_hash_of(expense.receipt_path)}-{variant}",
+        max_age=current_app.config['RECEIPT_CACHE_MAX_AGE']
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+def pending_preview(receipt_path):
+    # The derivative is still rendering: stand in with the original image
+    # (or a placeholder for PDFs) and have the browser ask again shortly.
+    max_age = current_app.config['RECEIPT_PENDING_MAX_AGE']
+    if receipt_path.lower().endswith('.pdf'):
+        response = current_app.response_class(PENDING_PLACEHOLDER, mimetype='image/svg+xml')
+        response.cache_control.max_age = max_age
+    else:
+        path = receipt_store.local_path(receipt_path)
+        if path is None or not os.path.exists(path):
+            abort(404)
+        response = send_file(os.path.abspath(path), max_age=max_age)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
 @employee_bp.route('/ocr-scan', methods=['POST'])
 @login_required
 def ocr_scan():
@@ -97,136 +155,145 @@ def ocr_scan():
         return jsonify({'success': False, 'message': 'No file selected'}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(f"temp_{current_user.id}_{datetime.now().timestamp()}_{file.filename}")
-        filepath = os.path.join('static/uploads/receipts', filename)
-        file.save(filepath)
-        
-        extracted_data = extract_receipt_data(filepath)
+        try:
+            filepath, content_hash = receipt_store.save_upload(file, current_app.config['RECEIPT_MAX_BYTES'])
+        except ReceiptRejected as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
+        extracted_data = ocr_cache.get(content_hash)
         if extracted_data:
-            response_data = {
+            return jsonify({
                 'success': True,
-                'data': {
-                    'amount': extracted_data.get('amount'),
-                    'date': extracted_data.get('date').isoformat() if extracted_data.get('date') else None,
-                    'vendor': extracted_data.get('vendor'),
-                    'description': extracted_data.get('description')
-                },
+                'status': 'done',
+                'data': serialize_ocr_data(extracted_data),
                 'filepath': filepath
-            }
-            return jsonify(response_data)
-        else:
-            return jsonify({'success': False, 'message': 'Failed to extract data from receipt'}), 500
+            })
+        
+        try:
+            app = current_app._get_current_object()
+            job = ocr_job_queue.submit(
+                current_user.id, receipt_store.local_path(filepath), content_hash,
+                on_result=lambda job: record_ocr_result(app, filepath, job)
+            )
+        except QueueFullError:
+            return jsonify({'success': False, 'message': 'OCR is busy, please try again shortly'}), 503
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': url_for('employee.ocr_job_status', job_id=job.id),
+            'filepath': filepath
+        }), 202
     
     return jsonify({'success': False, 'message': 'Invalid file type'}), 400
 
+def record_ocr_result(app, receipt_path, job):
+    # Stores the scan for later uploads of the same file, and gives an
+    # expense submitted before the scan finished its OCR text in search.
+    extracted_data = job.result()
+    with app.app_context():
+        ocr_cache.put(job.content_hash, extracted_data)
+        attach_ocr_text(receipt_path, extracted_data.get('raw_text'))
+        db.session.commit()
+
+@employee_bp.route('/ocr-jobs/<job_id>')
+@login_required
+def ocr_job_status(job_id):
+    job = ocr_job_queue.get(job_id)
+    if not job or job.user_id != current_user.id:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    
+    status = job.status
+    response_data = {'success': True, 'job_id': job.id, 'status': status, 'filepath': job.filepath}
+    
+    if status == 'done':
+        extracted_data = job.result()
+        response_data['data'] = serialize_ocr_data(extracted_data)
+        response_data['timings'] = extracted_data.get('timings')
+    elif status in ('failed', 'timeout'):
+        response_data['success'] = False
+        response_data['message'] = 'Failed to extract data from receipt'
+    
+    return jsonify(response_data)
+
+@employee_bp.route('/ocr-jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_ocr_job(job_id):
+    job = ocr_job_queue.get(job_id)
+    if not job or job.user_id != current_user.id:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    
+    ocr_job_queue.cancel(job_id)
+    return jsonify({'success': True, 'job_id': job.id, 'status': job.status})
+
+def serialize_ocr_data(extracted_data):
+    return {
+        'amount': extracted_data.get('amount'),
+        'date': extracted_data.get('date').isoformat() if extracted_data.get('date') else None,
+        'vendor': extracted_data.get('vendor'),
+        'description': extracted_data.get('description')
+    }
+
+def create_expense(amount, currency, category, description, expense_date, vendor_name='', receipt_path=None):
+    amount_in_company_currency = convert_currency(amount, currency, current_user.company.currency)
+    
+    expense = Expense(
+        employee_id=current_user.id,
+        amount=amount,
+        currency=currency,
+        amount_in_company_currency=amount_in_company_currency,
+        category=category,
+        description=description,
+        expense_date=expense_date,
+        vendor_name=vendor_name,
+        receipt_path=receipt_path
+    )
+    db.session.add(expense)
+    db.session.flush()
+    
+    create_approval_workflow(expense)
+    record_new_expense(expense, current_user.company_id)
+    index_expense(expense, current_user.company_id)
+    
+    db.session.commit()
+    record_daily_snapshot()
+    if expense.receipt_path:
+        preview_generator.submit(expense.receipt_path)
+    return expense
+
 def create_approval_workflow(expense):
-    active_rule = ApprovalRule.query.filter_by(
-        company_id=current_user.company_id,
-        is_active=True
-    ).first()
+    plan = approval_plan_cache.get(current_user.company_id)
+    manager = snapshot_user(current_user.manager) if plan.is_manager_first else None
+    approvals = plan.initial_approvals(manager)
     
-    if active_rule and active_rule.is_manager_first and current_user.manager:
+    created = []
+    for step_sequence, approver, _ in approvals:
         approval = ExpenseApproval(
             expense_id=expense.id,
-            approver_id=current_user.manager.id,
-            step_sequence=0,
+            approver_id=approver.id,
+            step_sequence=step_sequence,
             status='pending'
         )
         db.session.add(approval)
-        send_approval_notification(
-            current_user.manager.email,
-            expense.id,
-            expense.amount_in_company_currency,
-            current_user.company.currency,
-            current_user.manager.full_name
-        )
+        created.append(approval)
     
-    if active_rule:
-        if active_rule.rule_type == 'sequential':
-            for step in active_rule.approval_steps:
-                approval = ExpenseApproval(
-                    expense_id=expense.id,
-                    approver_id=step.approver_id,
-                    step_sequence=step.sequence,
-                    status='pending'
-                )
-                db.session.add(approval)
-                
-                if step.sequence == (1 if active_rule.is_manager_first else 0):
-                    send_approval_notification(
-                        step.approver.email,
-                        expense.id,
-                        expense.amount_in_company_currency,
-                        current_user.company.currency,
-                        step.approver.full_name
-                    )
-        
-        elif active_rule.rule_type == 'percentage':
-            for step in active_rule.approval_steps:
-                approval = ExpenseApproval(
-                    expense_id=expense.id,
-                    approver_id=step.approver_id,
-                    step_sequence=0,
-                    status='pending'
-                )
-                db.session.add(approval)
-                send_approval_notification(
-                    step.approver.email,
-                    expense.id,
-                    expense.amount_in_company_currency,
-                    current_user.company.currency,
-                    step.approver.full_name
-                )
-        
-        elif active_rule.rule_type == 'specific':
-            if active_rule.specific_approver_id:
-                approval = ExpenseApproval(
-                    expense_id=expense.id,
-                    approver_id=active_rule.specific_approver_id,
-                    step_sequence=0,
-                    status='pending'
-                )
-                db.session.add(approval)
-                send_approval_notification(
-                    active_rule.specific_approver.email,
-                    expense.id,
-                    expense.amount_in_company_currency,
-                    current_user.company.currency,
-                    active_rule.specific_approver.full_name
-                )
-        
-        elif active_rule.rule_type == 'hybrid':
-            for step in active_rule.approval_steps:
-                approval = ExpenseApproval(
-                    expense_id=expense.id,
-                    approver_id=step.approver_id,
-                    step_sequence=0,
-                    status='pending'
-                )
-                db.session.add(approval)
-                send_approval_notification(
-                    step.approver.email,
-                    expense.id,
-                    expense.amount_in_company_currency,
-                    current_user.company.currency,
-                    step.approver.full_name
-                )
-            
-            if active_rule.specific_approver_id:
-                existing = any(step.approver_id == active_rule.specific_approver_id for step in active_rule.approval_steps)
-                if not existing:
-                    approval = ExpenseApproval(
-                        expense_id=expense.id,
-                        approver_id=active_rule.specific_approver_id,
-                        step_sequence=0,
-                        status='pending'
-                    )
-                    db.session.add(approval)
-                    send_approval_notification(
-                        active_rule.specific_approver.email,
-                        expense.id,
-                        expense.amount_in_company_currency,
-                        current_user.company.currency,
-                        active_rule.specific_approver.full_name
-                    )
+    expense.current_approval_step = plan.initial_step(approvals)
+    init_counters(expense, [step_sequence for step_sequence, _, _ in approvals], expense.current_approval_step)
+    
+    db.session.flush()
+    for approval in created:
+        publish_after_commit(db.session, approval.approver_id, 'approval_created', approval_payload(
+            approval.id, approval.step_sequence, expense, current_user.full_name, current_user.company.currency
+        ))
+    
+    for step_sequence, approver, notify in approvals:
+        if notify:
+            send_approval_notification(
+                approver.email,
+                expense.id,
+                step_sequence,
+                expense.amount_in_company_currency,
+                current_user.company.currency,
+                approver.full_name
+            )
@@ -1,8 +1,16 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from functools import wraps
-from models import db, Expense, ExpenseApproval, User, ApprovalRule
+from models import db, Expense, ExpenseApproval, User
+from utils.approval_plans import approval_plan_cache
+from utils.approval_events import approval_events, publish_after_commit, approval_payload
+from utils.approval_counters import record_decision, record_decisions, advance_to_next_step, advance_many, final_status
+from utils.email_utils import send_approval_notification, send_approval_digest
+from utils.expense_summaries import record_status_change, record_status_changes
+from utils.team_hierarchy import join_team
+from utils.pagination import keyset_paginate, order_keyset, sort_order, apply_expense_filters, wants_stream, stream_listing
 from datetime import datetime
+import hashlib
 
 manager_bp = Blueprint('manager', __name__)
 
@@ -22,13 +30,15 @@ def dashboard():
     pending_approvals = ExpenseApproval.query.filter_by(
         approver_id=current_user.id,
         status='pending'
-    ).join(Expense).order_by(Expense.submitted_at.desc()).all()
+    ).join(Expense).options(
+        db.contains_eager(ExpenseApproval.expense).joinedload(Expense.employee)
+    ).order_by(Expense.submitted_at.desc()).all()
     
     my_team_expenses = []
     if current_user.role == 'manager':
-        my_team_expenses = Expense.query.filter(
-            Expense.employee_id.in_([u.id for u in current_user.subordinates])
-        ).order_by(Expense.submitted_at.desc()).limit(10).all()
+        my_team_expenses = join_team(Expense.query.join(User).options(
+            db.contains_eager(Expense.employee)
+        ), current_user.id, Expense.employee_id).order_by(Expense.submitted_at.desc()).limit(10).all()
     
     return render_template('manager/dashboard.html', 
                          pending_approvals=pending_approvals,
@@ -38,11 +48,63 @@ def dashboard():
 @login_required
 @manager_required
 def approvals():
-    all_approvals = ExpenseApproval.query.filter_by(
+    query = ExpenseApproval.query.filter_by(
         approver_id=current_user.id
-    ).join(Expense).order_by(Expense.submitted_at.desc()).all()
+    ).join(Expense).options(
+        db.contains_eager(ExpenseApproval.expense).joinedload(Expense.employee)
+    )
+    status = request.args.get('status')
+    if status:
+        query = query.filter(ExpenseApproval.status == status)
     
-    return render_template('manager/approvals.html', approvals=all_approvals)
+    if wants_stream():
+        all_approvals = order_keyset(query, Expense.submitted_at, ExpenseApproval.id, sort_order())
+        return stream_listing('manager/approvals.html',
+                              approvals=all_approvals.yield_per(current_app.config['STREAM_BATCH_SIZE']),
+                              page=None)
+    
+    page = keyset_paginate(query, Expense.submitted_at, ExpenseApproval.id, lambda a: (a.expense.submitted_at, a.id))
+    return render_template('manager/approvals.html', approvals=page, page=page)
+
+@manager_bp.route('/approvals/events')
+@login_required
+@manager_required
+def approval_event_stream():
+    subscription = approval_events.subscribe(current_user.id)
+    if subscription is None:
+        response = jsonify({'success': False, 'message': 'Too many live connections, please refresh later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(current_app.config['SSE_RETRY_MS'] // 1000)
+        return response
+    if request.headers.get('Last-Event-ID'):
+        # Events are not kept once delivered, so a reconnecting page may have
+        # missed some; have it reload instead of guessing.
+        subscription.request_resync()
+    
+    heartbeat = current_app.config['SSE_HEARTBEAT_INTERVAL']
+    retry = current_app.config['SSE_RETRY_MS']
+    
+    def stream():
+        # Runs after the request context is gone and never touches the
+        # database; the heartbeat keeps proxies from timing the connection
+        # out and lets the server notice a closed tab on its next write.
+        yield f"retry: {retry}\n\n"
+        while True:
+            events = subscription.wait(heartbeat)
+            if events is None:
+                return
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+            yield ''.join(approval_event.encode() for approval_event in events)
+    
+    response = current_app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # The server closes the response however it ends, including a HEAD or a
+    # client gone before the first chunk, when the generator never started.
+    response.call_on_close(subscription.close)
+    return response
 
 @manager_bp.route('/approvals/<int:approval_id>/review', methods=['GET', 'POST'])
 @login_required
@@ -58,17 +120,9 @@ def review_approval(approval_id):
         action = request.form.get('action')
         comments = request.form.get('comments', '')
         
-        approval.status = 'approved' if action == 'approve' else 'rejected'
-        approval.comments = comments
-        approval.decision_at = datetime.utcnow()
-        
-        expense = approval.expense
-        
-        if action == 'reject':
-            expense.status = 'rejected'
-            expense.final_decision_at = datetime.utcnow()
-        else:
-            check_and_update_expense_status(expense)
+        if not decide_approval(approval, action, comments):
+            flash('This approval has already been decided', 'error')
+            return redirect(url_for('manager.dashboard'))
         
         db.session.commit()
         
@@ -77,86 +131,226 @@ def review_approval(approval_id):
     
     return render_template('manager/review_approval.html', approval=approval)
 
+@manager_bp.route('/approvals/bulk', methods=['POST'])
+@login_required
+@manager_required
+def bulk_review():
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'success': False, 'message': 'Request body must be a JSON object'}), 400
+        approval_ids = payload.get('approval_ids', [])
+        action = payload.get('action')
+        comments = payload.get('comments') or ''
+        if not isinstance(comments, str):
+            return jsonify({'success': False, 'message': 'comments must be a string'}), 400
+    else:
+        approval_ids = request.form.getlist('approval_ids[]')
+        action = request.form.get('action')
+        comments = request.form.get('comments', '')
+    
+    approval_ids = [int(i) for i in approval_ids if str(i).isdigit()] if isinstance(approval_ids, list) else []
+    if action not in ('approve', 'reject') or not approval_ids:
+        if request.is_json:
+            return jsonify({'success': False, 'message': 'approval_ids and a valid action are required'}), 400
+        flash('Select at least one approval and an action', 'error')
+        return redirect(url_for('manager.approvals'))
+    
+    owned_ids = db.session.scalars(
+        db.select(ExpenseApproval.id).join(Expense).where(
+            ExpenseApproval.id.in_(approval_ids),
+            ExpenseApproval.approver_id == current_user.id,
+            ExpenseApproval.status == 'pending',
+            Expense.status == 'pending'
+        )
+    ).all()
+    
+    decided_ids = apply_bulk_decision(owned_ids, action, comments)
+    db.session.commit()
+    
+    if request.is_json:
+        return jsonify({
+            'success': True,
+            'decided': decided_ids,
+            'skipped': sorted(set(approval_ids) - set(decided_ids))
+        })
+    flash(f'{len(decided_ids)} expenses {action}d successfully', 'success')
+    return redirect(url_for('manager.approvals'))
+
 @manager_bp.route('/team-expenses')
 @login_required
 @manager_required
 def team_expenses():
     if current_user.role == 'manager':
-        team_expenses = Expense.query.filter(
-            Expense.employee_id.in_([u.id for u in current_user.subordinates])
-        ).order_by(Expense.submitted_at.desc()).all()
+        query = join_team(Expense.query.join(User).options(
+            db.contains_eager(Expense.employee)
+        ), current_user.id, Expense.employee_id)
     else:
-        team_expenses = Expense.query.join(User).filter(
+        query = Expense.query.join(User).options(
+            db.contains_eager(Expense.employee)
+        ).filter(
             User.company_id == current_user.company_id
-        ).order_by(Expense.submitted_at.desc()).all()
+        )
+    query = apply_expense_filters(query, Expense)
+    categories = current_app.config['EXPENSE_CATEGORIES']
     
-    return render_template('manager/team_expenses.html', expenses=team_expenses)
+    if wants_stream():
+        team_expenses = order_keyset(query, Expense.submitted_at, Expense.id, sort_order())
+        return stream_listing('manager/team_expenses.html',
+                              expenses=team_expenses.yield_per(current_app.config['STREAM_BATCH_SIZE']),
+                              page=None,
+                              categories=categories)
+    
+    page = keyset_paginate(query, Expense.submitted_at, Expense.id, lambda e: (e.submitted_at, e.id))
+    return render_template('manager/team_expenses.html', expenses=page, page=page, categories=categories)
 
-def check_and_update_expense_status(expense):
-    active_rule = ApprovalRule.query.filter_by(
-        company_id=expense.employee.company_id,
-        is_active=True
-    ).first()
-    
-    all_approvals = ExpenseApproval.query.filter_by(expense_id=expense.id).all()
-    
-    if not active_rule:
-        if all(a.status == 'approved' for a in all_approvals):
-            expense.status = 'approved'
-            expense.final_decision_at = datetime.utcnow()
-        return
+def decide_approval(approval, action, comments):
+    expense = approval.expense
+    # A later step's approval stays pending when an earlier one rejects the
+    # expense; deciding it must not reopen the expense, as in the bulk path.
+    if expense.status != 'pending':
+        return False
+    
+    status = 'approved' if action == 'approve' else 'rejected'
+    if not record_decision(approval, status, comments):
+        return False
     
-    if active_rule.rule_type == 'percentage':
-        approved_count = sum(1 for a in all_approvals if a.status == 'approved')
-        total_count = len(all_approvals)
-        if total_count > 0:
-            approval_percentage = (approved_count / total_count) * 100
-            if approval_percentage >= active_rule.percentage_required:
+    previous_status = expense.status
+    
+    if action == 'reject':
+        expense.status = 'rejected'
+        expense.final_decision_at = datetime.utcnow()
+    else:
+        check_and_update_expense_status(expense, approval)
+    
+    record_status_change(expense, expense.employee.company_id, previous_status, expense.status)
+    publish_after_commit(db.session, approval.approver_id, 'approval_decided', decision_payload(approval, status, expense))
+    return True
+
+def decision_payload(approval, status, expense):
+    return {
+        'approval_id': approval.id,
+        'expense_id': expense.id,
+        'status': status,
+        'expense_status': expense.status
+    }
+
+def check_and_update_expense_status(expense, approval):
+    plan = approval_plan_cache.get(expense.employee.company_id)
+    outcome = plan.decide(expense, approval)
+    
+    if outcome == 'step_complete':
+        next_step = advance_to_next_step(expense)
+        if next_step is None:
+            outcome = final_status(expense)
+        else:
+            next_approvals = ExpenseApproval.query.filter_by(
+                expense_id=expense.id, step_sequence=next_step, status='pending'
+            ).all()
+            for next_approval in next_approvals:
+                send_approval_notification(
+                    next_approval.approver.email,
+                    expense.id,
+                    next_step,
+                    expense.amount_in_company_currency,
+                    expense.employee.company.currency,
+                    next_approval.approver.full_name
+                )
+                publish_after_commit(db.session, next_approval.approver_id, 'approval_active', approval_payload(
+                    next_approval.id, next_step, expense, expense.employee.full_name, expense.employee.company.currency
+                ))
+    
+    if outcome in ('approved', 'rejected'):
+        expense.status = outcome
+        expense.final_decision_at = datetime.utcnow()
+
+def apply_bulk_decision(approval_ids, action, comments):
+    status = 'approved' if action == 'approve' else 'rejected'
+    decided_ids = record_decisions(approval_ids, status, comments)
+    if not decided_ids:
+        return []
+    
+    rows = db.session.query(ExpenseApproval, Expense).join(Expense).options(
+        db.joinedload(Expense.employee)
+    ).filter(
+        ExpenseApproval.id.in_(decided_ids)
+    ).populate_existing().all()
+    
+    plan = approval_plan_cache.get(current_user.company_id)
+    now = datetime.utcnow()
+    touched = {}
+    completed_steps = []
+    
+    for approval, expense in rows:
+        if expense.status != 'pending' or expense.id in touched:
+            continue
+        if action == 'reject':
+            expense.status = 'rejected'
+            expense.final_decision_at = now
+        else:
+            outcome = plan.decide(expense, approval)
+            if outcome == 'step_complete':
+                completed_steps.append(expense)
+            elif outcome == 'approved':
                 expense.status = 'approved'
-                expense.final_decision_at = datetime.utcnow()
+                expense.final_decision_at = now
+        touched[expense.id] = expense
     
-    elif active_rule.rule_type == 'specific':
-        specific_approval = next(
-            (a for a in all_approvals if a.approver_id == active_rule.specific_approver_id),
-            None
-        )
-        if specific_approval and specific_approval.status == 'approved':
-            expense.status = 'approved'
-            expense.final_decision_at = datetime.utcnow()
-    
-    elif active_rule.rule_type == 'hybrid':
-        approved_count = sum(1 for a in all_approvals if a.status == 'approved')
-        total_count = len(all_approvals)
-        approval_percentage = (approved_count / total_count) * 100 if total_count > 0 else 0
-        
-        specific_approval = next(
-            (a for a in all_approvals if a.approver_id == active_rule.specific_approver_id),
-            None
+    next_steps = advance_many(completed_steps)
+    for expense in completed_steps:
+        if next_steps[expense.id] is None:
+            expense.status = final_status(expense)
+            expense.final_decision_at = now
+    
+    record_status_changes(
+        (expense, current_user.company_id, 'pending', expense.status) for expense in touched.values()
+    )
+    for approval, expense in rows:
+        publish_after_commit(db.session, approval.approver_id, 'approval_decided', decision_payload(approval, status, expense))
+    notify_next_step_approvers(completed_steps, next_steps)
+    return decided_ids
+
+def digest_key(approval_ids):
+    # Identifies the exact set of approvals a digest announces; two bulk
+    # actions only share a key when they activate the same approvals.
+    return hashlib.sha256(','.join(map(str, sorted(approval_ids))).encode()).hexdigest()[:32]
+
+def notify_next_step_approvers(expenses, next_steps):
+    by_step = {}
+    for expense in expenses:
+        if next_steps.get(expense.id) is not None:
+            by_step.setdefault(next_steps[expense.id], []).append(expense.id)
+    if not by_step:
+        return
+    
+    # One (step_sequence = ? AND expense_id IN ...) term per distinct step:
+    # SQLite plans each as a search on ix_expense_approvals_expense_step,
+    # whereas a row-value IN over (expense_id, step_sequence) scans the table.
+    amounts = {expense.id: expense.amount_in_company_currency for expense in expenses}
+    next_approvals = ExpenseApproval.query.options(
+        db.joinedload(ExpenseApproval.approver)
+    ).filter(ExpenseApproval.status == 'pending', db.or_(*[
+        db.and_(ExpenseApproval.expense_id.in_(expense_ids), ExpenseApproval.step_sequence == step)
+        for step, expense_ids in by_step.items()
+    ])).all()
+    
+    by_id = {expense.id: expense for expense in expenses}
+    by_approver = {}
+    pending_approvals = {}
+    for approval in next_approvals:
+        expense = by_id[approval.expense_id]
+        publish_after_commit(db.session, approval.approver_id, 'approval_active', approval_payload(
+            approval.id, approval.step_sequence, expense, expense.employee.full_name, current_user.company.currency
+        ))
+        by_approver.setdefault(approval.approver_id, (approval.approver, []))[1].append(
+            (approval.expense_id, amounts[approval.expense_id])
         )
-        
-        if (approval_percentage >= active_rule.percentage_required or 
-            (specific_approval and specific_approval.status == 'approved')):
-            expense.status = 'approved'
-            expense.final_decision_at = datetime.utcnow()
+        pending_approvals.setdefault(approval.approver_id, []).append(approval.id)
     
-    elif active_rule.rule_type == 'sequential':
-        current_step_approvals = [a for a in all_approvals if a.step_sequence == expense.current_approval_step]
-        
-        if current_step_approvals and all(a.status == 'approved' for a in current_step_approvals):
-            next_step = expense.current_approval_step + 1
-            next_step_approvals = [a for a in all_approvals if a.step_sequence == next_step]
-            
-            if next_step_approvals:
-                expense.current_approval_step = next_step
-                from utils.email_utils import send_approval_notification
-                for approval in next_step_approvals:
-                    send_approval_notification(
-                        approval.approver.email,
-                        expense.id,
-                        expense.amount_in_company_currency,
-                        expense.employee.company.currency,
-                        approval.approver.full_name
-                    )
-            else:
-                expense.status = 'approved'
-                expense.final_decision_at = datetime.utcnow()
+    currency = current_user.company.currency
+    for approver, pending in by_approver.values():
+        if len(pending) == 1:
+            expense_id, amount = pending[0]
+            send_approval_notification(approver.email, expense_id, next_steps[expense_id], amount, currency, approver.full_name)
+        else:
+            send_approval_digest(approver.email, approver.full_name, pending, currency, f"bulk:{digest_key(pending_approvals[approver.id])}")
@@ -0,0 +1,121 @@
+import itertools
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix='expense-tests-')
+
+# config.py reads the environment when it is first imported, so the test
+# database and a local rate table have to be in place before app is.
+with open(os.path.join(TMP, 'rates.json'), 'w') as f:
+    json.dump({'base': 'USD', 'rates': {'USD': 1.0, 'EUR': 0.9, 'GBP': 0.8, 'INR': 83.0}}, f)
+# TEST_DATABASE_URL points the suite (e.g. `pytest -m load`) at Postgres.
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'test.db')}")
+os.environ['CURRENCY_RATES_FILE'] = os.path.join(TMP, 'rates.json')
+os.environ['BACKGROUND_WORKERS'] = 'false'
+os.environ['EMAIL_WORKERS'] = '0'
+os.environ['RECEIPT_GC_INTERVAL'] = '0'
+# Every request made by the suite runs under the strict plan auditor, so a
+# new full table scan fails the test that hits it.
+os.environ['QUERY_PLAN_AUDIT'] = 'true'
+os.environ['QUERY_PLAN_AUDIT_STRICT'] = 'true'
+os.environ['QUERY_COUNTER'] = 'true'
+sys.path.insert(0, ROOT)
+
+from app import app as flask_app  # noqa: E402
+from models import db, Company, User  # noqa: E402
+from utils.team_hierarchy import add_user  # noqa: E402
+
+flask_app.config['TESTING'] = True
+flask_app.extensions['mail'].suppress = True
+
+_sequence = itertools.count(1)
+
+def pytest_collection_modifyitems(config, items):
+    # Benchmarks and load tests only run when asked for with -m.
+    if config.option.markexpr:
+        return
+    skip = pytest.mark.skip(reason='run with -m bench or -m load')
+    for item in items:
+        if 'bench' in item.keywords or 'load' in item.keywords:
+            item.add_marker(skip)
+
+@pytest.fixture
+def app():
+    return flask_app
+
+@pytest.fixture
+def app_context(app):
+    # Only for tests that work on the database directly: a pushed context is
+    # shared by test client requests, and with it flask-login's g._login_user.
+    with app.app_context():
+        yield
+        db.session.rollback()
+
+@pytest.fixture
+def company(app):
+    # A fresh company per test instead of wiping tables: the identity, plan
+    # and hierarchy caches are keyed by id and would outlive a truncate.
+    with app.app_context():
+        return seed_company(next(_sequence))
+
+def seed_company(n):
+    company = Company(name=f'Acme {n}', country='US', currency='USD')
+    db.session.add(company)
+    db.session.flush()
+
+    def user(role, name, manager=None):
+        member = User(
+            email=f'{name}{n}@example.com',
+            full_name=f'{name.title()} {n}',
+            role=role,
+            company_id=company.id,
+            manager_id=manager.id if manager else None,
+            is_verified=True
+        )
+        member.set_password('secret')
+        db.session.add(member)
+        db.session.flush()
+        add_user(member.id, member.manager_id)
+        return member
+
+    admin = user('admin', 'admin')
+    manager = user('manager', 'manager', admin)
+    employee = user('employee', 'employee', manager)
+    outsider = user('employee', 'outsider', admin)
+    db.session.commit()
+    return SimpleNamespace(
+        id=company.id, number=n, admin=admin.id, manager=manager.id, employee=employee.id, outsider=outsider.id
+    )
+
+@pytest.fixture
+def login(app):
+    def client_for(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return client_for
+
+@pytest.fixture
+def workflow(company, login):
+    # Manager first, then the admin: enough to touch every approval view.
+    admin = login(company.admin)
+    admin.post('/admin/approval-rules/create', data={
+        'name': 'Default', 'rule_type': 'sequential', 'is_manager_first': 'on',
+        'approver_ids[]': [str(company.admin)]
+    })
+    employee = login(company.employee)
+    for amount in ('10', '20', '30'):
+        response = employee.post('/employee/expenses/submit', data={
+            'amount': amount, 'currency': 'EUR', 'category': 'Travel',
+            'description': f'Taxi {amount}', 'expense_date': '2025-01-02'
+        })
+        assert response.status_code == 302
+    return company
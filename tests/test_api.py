@@ -0,0 +1,77 @@
+import pytest
+
+from models import db, Expense, ExpenseApproval
+
+@pytest.mark.parametrize('path', [
+    '/api/v1/expenses', '/api/v1/approvals/1/decision', '/api/v1/approvals/decisions', '/manager/approvals/bulk',
+])
+@pytest.mark.parametrize('body', [[], [{'action': 'approve'}], 'approve', 7])
+def test_json_bodies_must_be_objects(company, login, path, body):
+    response = login(company.manager).post(path, json=body)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Request body must be a JSON object'
+
+def test_approval_ids_must_be_a_list(company, login):
+    for path in ('/api/v1/approvals/decisions', '/manager/approvals/bulk'):
+        response = login(company.manager).post(path, json={'approval_ids': 5, 'action': 'approve'})
+        assert response.status_code == 400
+
+def test_leftover_approval_cannot_reopen_a_rejected_expense(app, workflow, login):
+    with app.app_context():
+        expense_id = Expense.query.filter_by(employee_id=workflow.employee).order_by(Expense.id).first().id
+        first, second = [a.id for a in ExpenseApproval.query.filter_by(expense_id=expense_id).order_by(ExpenseApproval.step_sequence)]
+
+    assert login(workflow.manager).post(f'/api/v1/approvals/{first}/decision', json={'action': 'reject'}).status_code == 200
+    response = login(workflow.admin).post(f'/api/v1/approvals/{second}/decision', json={'action': 'approve'})
+    assert response.status_code == 409
+
+    with app.app_context():
+        assert db.session.get(Expense, expense_id).status == 'rejected'
+        assert db.session.get(ExpenseApproval, second).status == 'pending'
+
+@pytest.mark.parametrize('path', ['/api/v1/approvals/decisions', '/manager/approvals/bulk'])
+def test_bulk_decisions_skip_approvals_of_decided_expenses(app, workflow, login, path):
+    with app.app_context():
+        expense_id = Expense.query.filter_by(employee_id=workflow.employee).order_by(Expense.id).first().id
+        first, second = [a.id for a in ExpenseApproval.query.filter_by(expense_id=expense_id).order_by(ExpenseApproval.step_sequence)]
+
+    login(workflow.manager).post(f'/api/v1/approvals/{first}/decision', json={'action': 'reject'})
+    response = login(workflow.admin).post(path, json={'approval_ids': [second], 'action': 'approve'})
+    assert response.get_json()['decided'] == []
+    assert response.get_json()['skipped'] == [second]
+
+    with app.app_context():
+        assert db.session.get(Expense, expense_id).status == 'rejected'
+        assert db.session.get(ExpenseApproval, second).status == 'pending'
+
+def expense_body(**overrides):
+    return dict({
+        'amount': 12.5, 'currency': 'EUR', 'category': 'Meals',
+        'description': 'Lunch', 'expense_date': '2025-06-01'
+    }, **overrides)
+
+@pytest.mark.parametrize('overrides, message', [
+    ({'amount': 'nan'}, 'amount must be a number'),
+    ({'amount': 'inf'}, 'amount must be a number'),
+    ({'amount': 1e308 * 10}, 'amount must be a number'),
+    ({'currency': 'JPY'}, 'No exchange rate for JPY to USD'),
+    ({'currency': 5}, 'currency must be a string'),
+    ({'description': ['x']}, 'description must be a string'),
+    ({'expense_date': 20250601}, 'expense_date must be YYYY-MM-DD'),
+])
+def test_expense_payload_is_validated(app, company, login, overrides, message):
+    response = login(company.employee).post('/api/v1/expenses', json=expense_body(**overrides))
+    assert response.status_code == 400
+    assert response.get_json()['message'] == message
+    with app.app_context():
+        assert Expense.query.filter_by(employee_id=company.employee).count() == 0
+
+@pytest.mark.parametrize('comments', [['x'], {'a': 1}, 7])
+def test_decision_comments_must_be_text(workflow, login, comments):
+    client = login(workflow.manager)
+    for path, body in (('/api/v1/approvals/1/decision', {'action': 'approve'}),
+                       ('/api/v1/approvals/decisions', {'action': 'approve', 'approval_ids': [1]}),
+                       ('/manager/approvals/bulk', {'action': 'approve', 'approval_ids': [1]})):
+        response = client.post(path, json=dict(body, comments=comments))
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'comments must be a string'
@@ -0,0 +1,83 @@
+from models import db, Expense, ExpenseApproval, ExpenseStepCounter
+from utils.approval_counters import rebuild_counters
+
+def pending_approvals(app, company):
+    # {expense_id: [approval ids by step]} for the workflow's three expenses.
+    with app.app_context():
+        approvals = ExpenseApproval.query.join(Expense).filter(
+            Expense.employee_id == company.employee
+        ).order_by(ExpenseApproval.expense_id, ExpenseApproval.step_sequence)
+        by_expense = {}
+        for approval in approvals:
+            by_expense.setdefault(approval.expense_id, []).append(approval.id)
+        return by_expense
+
+def recount(expense):
+    approvals = ExpenseApproval.query.filter_by(expense_id=expense.id).all()
+    current = [a for a in approvals if a.step_sequence == expense.current_approval_step]
+    steps = {}
+    for a in approvals:
+        total, approved, rejected = steps.get(a.step_sequence, (0, 0, 0))
+        steps[a.step_sequence] = (total + 1, approved + (a.status == 'approved'), rejected + (a.status == 'rejected'))
+    return (
+        len(approvals),
+        sum(a.status == 'approved' for a in approvals),
+        sum(a.status == 'rejected' for a in approvals),
+        sum(a.status == 'pending' for a in current),
+        steps
+    )
+
+def counters(expense):
+    return (
+        expense.approvals_total, expense.approvals_approved, expense.approvals_rejected, expense.current_step_pending,
+        {c.step_sequence: (c.total, c.approved, c.rejected) for c in ExpenseStepCounter.query.filter_by(expense_id=expense.id)}
+    )
+
+def test_counters_match_a_recount_after_mixed_decisions_and_repair(app, workflow, login):
+    workflows = pending_approvals(app, workflow)
+    expense_ids = list(workflows)
+    first, second, third = workflows.values()
+    manager, admin = login(workflow.manager), login(workflow.admin)
+
+    manager.post(f'/manager/approvals/{first[0]}/review', data={'action': 'approve'})
+    admin.post(f'/manager/approvals/{first[1]}/review', data={'action': 'approve'})
+    manager.post(f'/manager/approvals/{second[0]}/review', data={'action': 'reject'})
+    manager.post('/manager/approvals/bulk', json={'approval_ids': [third[0]], 'action': 'approve'})
+
+    with app.app_context():
+        expenses = Expense.query.filter(Expense.id.in_(expense_ids)).order_by(Expense.id).all()
+        assert [e.status for e in expenses] == ['approved', 'rejected', 'pending']
+        for expense in expenses:
+            assert counters(expense) == recount(expense)
+        assert rebuild_counters(expense_ids) == []
+
+        db.session.execute(db.update(Expense).where(Expense.id.in_(expense_ids[:2])).values(
+            approvals_total=9, approvals_approved=0, approvals_rejected=5, current_step_pending=3
+        ))
+        db.session.execute(db.update(ExpenseStepCounter).where(ExpenseStepCounter.expense_id == expense_ids[2]).values(approved=0))
+        db.session.commit()
+        db.session.expire_all()
+
+        assert sorted(rebuild_counters(expense_ids)) == expense_ids
+        db.session.commit()
+        db.session.expire_all()
+        for expense in Expense.query.filter(Expense.id.in_(expense_ids)):
+            assert counters(expense) == recount(expense)
+        assert rebuild_counters(expense_ids) == []
+
+def test_later_step_decided_first_does_not_strand_the_expense(app, workflow, login):
+    workflows = pending_approvals(app, workflow)
+    (single_id, single), (bulk_id, bulk) = list(workflows.items())[:2]
+    manager, admin = login(workflow.manager), login(workflow.admin)
+
+    admin.post(f'/manager/approvals/{single[1]}/review', data={'action': 'approve'})
+    manager.post(f'/manager/approvals/{single[0]}/review', data={'action': 'approve'})
+    admin.post('/manager/approvals/bulk', json={'approval_ids': [bulk[1]], 'action': 'approve'})
+    manager.post('/manager/approvals/bulk', json={'approval_ids': [bulk[0]], 'action': 'approve'})
+
+    with app.app_context():
+        for expense_id in (single_id, bulk_id):
+            expense = db.session.get(Expense, expense_id)
+            assert expense.status == 'approved'
+            assert expense.final_decision_at is not None
+            assert counters(expense) == recount(expense)
@@ -0,0 +1,58 @@
+import pytest
+
+from utils.approval_events import approval_events
+
+PATH = '/manager/approvals/events'
+
+@pytest.fixture(autouse=True)
+def quick_heartbeat(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'SSE_HEARTBEAT_INTERVAL', 0.05)
+
+def open_stream(client):
+    response = client.get(PATH, buffered=False)
+    assert response.status_code == 200
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+    return response, chunks
+
+def next_event(chunks):
+    return next(chunk for chunk in chunks if not chunk.startswith(b': heartbeat'))
+
+def test_events_fan_out_to_every_open_stream(company, login):
+    client = login(company.manager)
+    streams = [open_stream(client) for _ in range(2)]
+    try:
+        approval_events.publish(company.manager, 'approval_created', {'approval_id': 1})
+        for _, chunks in streams:
+            assert b'event: approval_created\ndata: {"approval_id": 1}' in next_event(chunks)
+    finally:
+        for response, _ in streams:
+            response.close()
+
+def test_closing_a_stream_frees_its_slot(company, login):
+    client = login(company.manager)
+    before = approval_events.connections
+
+    response, chunks = open_stream(client)
+    assert approval_events.connections == before + 1
+    response.close()
+    assert approval_events.connections == before
+
+    # Neither a HEAD nor a client gone before the first chunk ever starts
+    # the generator; the slot still has to come back.
+    client.head(PATH).close()
+    client.get(PATH, buffered=False).close()
+    assert approval_events.connections == before
+
+def test_connections_past_the_cap_get_503(app, company, login, monkeypatch):
+    monkeypatch.setattr(approval_events, 'max_connections', approval_events.connections + 1)
+    client = login(company.manager)
+
+    response, _ = open_stream(client)
+    rejected = client.get(PATH)
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After'] == str(app.config['SSE_RETRY_MS'] // 1000)
+
+    response.close()
+    response, _ = open_stream(client)
+    response.close()
@@ -0,0 +1,33 @@
+from models import Expense, ExpenseApproval
+from utils.approval_plans import approval_plan_cache
+
+def submit(client, description):
+    response = client.post('/employee/expenses/submit', data={
+        'amount': '25', 'currency': 'USD', 'category': 'Meals',
+        'description': description, 'expense_date': '2025-05-01'
+    })
+    assert response.status_code == 302
+
+def approvers_of(app, description):
+    with app.app_context():
+        return [(a.step_sequence, a.approver_id) for a in ExpenseApproval.query.join(Expense).filter(
+            Expense.description == description
+        ).order_by(ExpenseApproval.step_sequence)]
+
+def test_rule_change_reaches_the_next_submit(app, company, login, monkeypatch):
+    # Far beyond the test's runtime, so only invalidation can drop the plan.
+    monkeypatch.setattr(approval_plan_cache, 'ttl', 3600)
+    employee = login(company.employee)
+
+    submit(employee, f'Before rule {company.number}')
+    assert approvers_of(app, f'Before rule {company.number}') == []
+    assert company.id in approval_plan_cache._plans
+
+    login(company.admin).post('/admin/approval-rules/create', data={
+        'name': 'Default', 'rule_type': 'sequential', 'is_manager_first': 'on',
+        'approver_ids[]': [str(company.admin)]
+    })
+    assert company.id not in approval_plan_cache._plans
+
+    submit(employee, f'After rule {company.number}')
+    assert approvers_of(app, f'After rule {company.number}') == [(0, company.manager), (1, company.admin)]
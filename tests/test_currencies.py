@@ -0,0 +1,19 @@
+from models import Expense
+from utils.catalogue import catalogue
+
+def test_only_convertible_currencies_are_offered(company, login):
+    assert 'JPY' in catalogue.snapshot.currencies
+    page = login(company.employee).get('/employee/expenses/submit').get_data(as_text=True)
+    assert '<option value="USD" selected>USD</option>' in page
+    assert '<option value="EUR">EUR</option>' in page
+    assert 'value="JPY"' not in page
+
+def test_submit_rejects_a_currency_without_a_rate(app, company, login):
+    response = login(company.employee).post('/employee/expenses/submit', data={
+        'amount': '1000', 'currency': 'JPY', 'category': 'Meals',
+        'description': 'Unconvertible', 'expense_date': '2025-06-01'
+    })
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/employee/expenses/submit')
+    with app.app_context():
+        assert Expense.query.filter_by(employee_id=company.employee).count() == 0
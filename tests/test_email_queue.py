@@ -0,0 +1,97 @@
+import time
+from datetime import datetime, timedelta
+
+from flask_mail import Connection
+
+from models import db, OutboundEmail
+from utils.email_queue import EmailWorkerPool, drain_outbox, install_wakeup_hook
+from utils.email_utils import enqueue_email, mail, send_approval_notification, send_otp_email
+
+def outbox(recipient):
+    return OutboundEmail.query.filter_by(recipient=recipient).order_by(OutboundEmail.id).all()
+
+def test_otp_email_is_left_to_the_callers_transaction(app_context):
+    assert send_otp_email('otp-rollback@example.com', '123456', 'Otp')
+    db.session.rollback()
+    assert outbox('otp-rollback@example.com') == []
+
+    send_otp_email('otp-commit@example.com', '654321', 'Otp')
+    db.session.commit()
+    [email] = outbox('otp-commit@example.com')
+    assert email.status == 'pending' and '654321' in email.html
+
+def test_dedupe_key_covers_pending_and_committed_rows(app_context):
+    assert enqueue_email('dedupe@example.com', 'One', '<p>1</p>', dedupe_key='dedupe-test')
+    assert not enqueue_email('dedupe@example.com', 'Two', '<p>2</p>', dedupe_key='dedupe-test')
+    db.session.commit()
+    assert not enqueue_email('dedupe@example.com', 'Three', '<p>3</p>', dedupe_key='dedupe-test')
+    assert [e.subject for e in outbox('dedupe@example.com')] == ['One']
+
+def test_approval_notification_dedupes_per_step(app_context):
+    recipient = 'steps@example.com'
+    assert send_approval_notification(recipient, 9001, 0, 10.0, 'USD', 'Approver')
+    assert not send_approval_notification(recipient, 9001, 0, 10.0, 'USD', 'Approver')
+    # The same approver reappearing on a later step still hears about it.
+    assert send_approval_notification(recipient, 9001, 2, 10.0, 'USD', 'Approver')
+    db.session.commit()
+    assert len(outbox(recipient)) == 2
+
+def test_drain_outbox_sends_and_retries(app, app_context, monkeypatch):
+    enqueue_email('drain-ok@example.com', 'Hello', '<p>hi</p>')
+    db.session.commit()
+    with mail.record_messages() as sent:
+        drain_outbox(app)
+    assert 'drain-ok@example.com' in [m.recipients[0] for m in sent]
+    [email] = outbox('drain-ok@example.com')
+    assert email.status == 'sent' and email.sent_at is not None
+
+    def refuse(self, message, envelope_from=None):
+        raise OSError('connection refused')
+    monkeypatch.setattr(Connection, 'send', refuse)
+    enqueue_email('drain-retry@example.com', 'Hello', '<p>hi</p>')
+    db.session.commit()
+    drain_outbox(app)
+    [email] = outbox('drain-retry@example.com')
+    assert email.status == 'pending'
+    assert email.attempts == 1
+    assert email.next_attempt_at > datetime.utcnow() + timedelta(seconds=app.config['EMAIL_RETRY_BASE_SECONDS'] - 5)
+    assert 'connection refused' in email.last_error
+
+def test_commit_wakes_idle_workers(app, app_context):
+    pool = EmailWorkerPool(app, workers=1, poll_interval=60)
+    install_wakeup_hook(db.session, pool)
+    pool.start()
+    try:
+        # Let the worker drain anything left over and go to sleep first.
+        time.sleep(0.2)
+        enqueue_email('wakeup@example.com', 'Hello', '<p>hi</p>')
+        db.session.commit()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            db.session.expire_all()
+            if outbox('wakeup@example.com')[0].status == 'sent':
+                break
+            time.sleep(0.05)
+        assert outbox('wakeup@example.com')[0].status == 'sent'
+    finally:
+        pool.stop(timeout=5)
+
+def test_web_process_starts_its_workers_once_per_pid(app, monkeypatch):
+    import app as app_module
+
+    started = []
+    monkeypatch.setitem(app.config, 'BACKGROUND_WORKERS', True)
+    for name in ('_workers_pid', 'email_worker_pool', 'receipt_gc'):
+        monkeypatch.setattr(app_module, name, None)
+    monkeypatch.setattr(app_module, 'start_email_workers', lambda app: started.append(app) or 'pool')
+    monkeypatch.setattr(app_module, 'start_receipt_gc', lambda app: None)
+
+    client = app.test_client()
+    client.get('/auth/login')
+    client.get('/auth/login')
+    assert len(started) == 1 and app_module.email_worker_pool == 'pool'
+
+    # A forked server worker inherits the flag but none of the threads.
+    monkeypatch.setattr(app_module, '_workers_pid', -1)
+    client.get('/auth/login')
+    assert len(started) == 2
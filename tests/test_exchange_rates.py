@@ -0,0 +1,99 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils import exchange_rates
+from utils.exchange_rates import RateCache
+
+class StubBackend:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.release = None
+
+    def fetch(self, base_currency):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        if self.fail:
+            raise ConnectionError('rates unavailable')
+        return {'EUR': 0.9 + self.calls / 100}
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(exchange_rates, 'time', SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+def wait_for_refresh(cache):
+    deadline = time.monotonic() + 5
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not cache._refreshing
+
+def test_fresh_table_is_served_from_cache(clock):
+    backend = StubBackend()
+    cache = RateCache(backend, ttl=60, stale_ttl=600)
+
+    table = cache.get_table()
+    clock.value += 59
+    assert cache.get_table() is table
+    assert backend.calls == 1
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+    assert cache.rate('USD', 'EUR') == pytest.approx(0.91)
+
+def test_stale_table_is_served_while_one_refresh_runs(clock):
+    backend = StubBackend()
+    cache = RateCache(backend, ttl=60, stale_ttl=600)
+    stale = cache.get_table()
+
+    clock.value += 61
+    backend.release = threading.Event()
+    assert cache.get_table() is stale
+    assert cache.get_table() is stale
+    backend.release.set()
+    wait_for_refresh(cache)
+
+    assert backend.calls == 2
+    assert cache.stats['stale_hits'] == 2
+    assert cache.get_table() is not stale
+    assert cache.rate('USD', 'EUR') == pytest.approx(0.92)
+
+def test_failed_refresh_backs_off_before_retrying(clock):
+    backend = StubBackend()
+    cache = RateCache(backend, ttl=60, stale_ttl=600, retry_after=30)
+    stale = cache.get_table()
+
+    clock.value += 61
+    backend.fail = True
+    assert cache.get_table() is stale
+    wait_for_refresh(cache)
+    assert backend.calls == 2 and cache.stats['errors'] == 1
+
+    clock.value += 29
+    assert cache.get_table() is stale
+    wait_for_refresh(cache)
+    assert backend.calls == 2
+
+    backend.fail = False
+    clock.value += 1
+    assert cache.get_table() is stale
+    wait_for_refresh(cache)
+    assert backend.calls == 3
+    assert cache.get_table() is not stale
+
+def test_failed_load_without_a_table_backs_off(clock):
+    backend = StubBackend()
+    backend.fail = True
+    cache = RateCache(backend, retry_after=30)
+
+    assert cache.get_table() is None
+    assert cache.rate('USD', 'EUR') is None
+    assert backend.calls == 1
+
+    clock.value += 31
+    backend.fail = False
+    assert cache.get_table() is not None
+    assert backend.calls == 2
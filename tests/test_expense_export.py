@@ -0,0 +1,58 @@
+import csv
+import io
+import time
+from datetime import date, datetime
+
+import pytest
+
+from models import db, Expense
+from utils import expense_export
+
+def add_expenses(app, company, descriptions):
+    with app.app_context():
+        db.session.execute(db.insert(Expense), [{
+            'employee_id': company.employee, 'amount': i + 1, 'currency': 'USD',
+            'amount_in_company_currency': i + 1, 'category': 'Travel', 'description': description,
+            'expense_date': date(2025, 1, 1 + i % 28), 'status': 'pending', 'submitted_at': datetime(2025, 1, 1)
+        } for i, description in enumerate(descriptions)])
+        db.session.commit()
+
+def test_csv_cells_cannot_start_formulas(app, company, login):
+    add_expenses(app, company, ['=HYPERLINK("http://x")', '+1', '-2', '@SUM(A1)', '\tTab', 'Plain -dash'])
+    response = login(company.admin).get('/admin/expenses/export?format=csv')
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row['description'] for row in rows] == [
+        '\'=HYPERLINK("http://x")', "'+1", "'-2", "'@SUM(A1)", "'\tTab", 'Plain -dash'
+    ]
+    assert rows[0]['amount'] == '1.0'
+
+def test_parquet_is_streamed_by_row_group(app, company, login, monkeypatch):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+
+    monkeypatch.setattr(expense_export.Config, 'EXPORT_BATCH_SIZE', 10)
+    monkeypatch.setattr(expense_export.Config, 'EXPORT_ROW_GROUP_SIZE', 10)
+    add_expenses(app, company, [f'Row {i}' for i in range(35)])
+
+    response = login(company.admin).get('/admin/expenses/export?format=parquet')
+    chunks = [chunk for chunk in response.response if chunk]
+    assert len(chunks) >= 4
+
+    parquet = pyarrow.parquet.ParquetFile(io.BytesIO(b''.join(chunks)))
+    assert parquet.metadata.num_rows == 35
+    assert parquet.metadata.num_row_groups == 4
+
+@pytest.mark.bench
+@pytest.mark.parametrize('fmt', sorted(expense_export.EXPORT_FORMATS))
+def test_export_throughput(app, company, login, fmt):
+    if not expense_export.format_available(fmt):
+        pytest.skip(f'{fmt} support is not installed')
+    add_expenses(app, company, [f'Synthetic expense {i}' for i in range(50000)])
+    client = login(company.admin)
+
+    start = time.perf_counter()
+    response = client.get(f'/admin/expenses/export?format={fmt}')
+    total_bytes = sum(len(chunk) for chunk in response.response)
+    elapsed = time.perf_counter() - start
+    print({'format': fmt, 'rows': 50000, 'bytes': total_bytes, 'seconds': round(elapsed, 3),
+           'rows_per_second': round(50000 / elapsed)})
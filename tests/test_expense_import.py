@@ -0,0 +1,94 @@
+import io
+import json
+
+import pytest
+
+from models import Expense, OutboundEmail
+from utils import expense_import
+from utils.approval_events import approval_events
+from utils.expense_import import iter_json_array
+
+def rows_for(company_number, count, **overrides):
+    return [dict({
+        'employee_email': f'employee{company_number}@example.com', 'amount': 10 + i, 'currency': 'USD',
+        'category': 'Travel', 'description': f'Import {i}', 'expense_date': '2025-04-01'
+    }, **overrides) for i in range(count)]
+
+def upload(client, body, filename):
+    return client.post('/admin/expenses/import', data={'file': (io.BytesIO(body), filename)})
+
+@pytest.mark.parametrize('read_size', [1, 7, 64 * 1024])
+def test_json_array_is_decoded_incrementally(monkeypatch, read_size):
+    monkeypatch.setattr(expense_import, 'JSON_READ_SIZE', read_size)
+    rows = [{'amount': 1234567, 'description': 'long ' * 20}, 12, 'x', [1, 2], {'amount': 0.5}]
+    body = ('\ufeff  ' + json.dumps(rows, indent=2)).encode('utf-8')
+    assert list(iter_json_array(io.BytesIO(body))) == rows
+
+@pytest.mark.parametrize('body', [b'{"amount": 1}', b'[{"amount": 1}', b'[{"amount": 1} {"amount": 2}]', b''])
+def test_malformed_json_arrays_are_rejected(body):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.BytesIO(body)))
+
+def test_bad_rows_are_reported_not_raised(company, login):
+    good = rows_for(company.number, 1)
+    body = json.dumps(good + [
+        ['not', 'an', 'object'], 'text', dict(good[0], amount='nan'), dict(good[0], amount=float('inf'))
+    ]).encode()
+    response = upload(login(company.admin), body, 'expenses.json')
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['imported'] == 1
+    assert [e['row'] for e in report['errors']] == [2, 3, 4, 5]
+    assert report['errors'][0]['message'] == 'row must be an object'
+    assert report['errors'][2]['message'] == "invalid amount 'nan'"
+
+def test_ndjson_upload(company, login):
+    body = '\n'.join(json.dumps(row) for row in rows_for(company.number, 3)).encode()
+    assert upload(login(company.admin), body, 'expenses.ndjson').get_json()['imported'] == 3
+
+def test_digests_and_events_go_out_per_chunk(app, workflow, login, monkeypatch):
+    monkeypatch.setattr(expense_import.Config, 'IMPORT_CHUNK_SIZE', 2)
+    subscription = approval_events.subscribe(workflow.manager)
+    try:
+        report = upload(login(workflow.admin), json.dumps(rows_for(workflow.number, 3)).encode(), 'expenses.json').get_json()
+        events = subscription.wait(0)
+    finally:
+        subscription.close()
+
+    assert report['imported'] == 3
+    with app.app_context():
+        imported = {e.id for e in Expense.query.filter(Expense.description.like('Import %'), Expense.employee_id == workflow.employee)}
+        digests = OutboundEmail.query.filter(OutboundEmail.dedupe_key.like(f"digest:{report['batch_id']}:%")).all()
+    assert sorted(e.dedupe_key.split(':')[2] for e in digests) == ['0', '1']
+    assert [e.type for e in events] == ['approval_created'] * 3
+    assert {e.data['expense_id'] for e in events} == imported
+
+def test_non_text_fields_are_reported_not_raised(company, login):
+    good = rows_for(company.number, 1)
+    body = json.dumps(good + [dict(good[0], employee_email=5), dict(good[0], currency=5), dict(good[0], description=['x'])]).encode()
+    response = upload(login(company.admin), body, 'expenses.json')
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['imported'] == 1
+    assert [e['message'] for e in report['errors']] == [
+        'employee_email must be text', 'currency must be text', 'description must be text'
+    ]
+
+def test_malformed_ndjson_line_is_reported_and_skipped(company, login):
+    lines = [json.dumps(row) for row in rows_for(company.number, 2)]
+    body = '\n'.join([lines[0], '{"amount": ', lines[1]]).encode()
+    response = upload(login(company.admin), body, 'expenses.ndjson')
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['imported'] == 2
+    assert [e['row'] for e in report['errors']] == [2]
+    assert report['errors'][0]['message'].startswith('invalid JSON')
+
+def test_malformed_json_array_element_returns_400_with_offset(company, login):
+    prefix = '[' + json.dumps(rows_for(company.number, 1)[0]) + ', '
+    body = (prefix + '{"amount": }]').encode()
+    response = upload(login(company.admin), body, 'expenses.json')
+    assert response.status_code == 400
+    report = response.get_json()
+    assert report['imported'] == 1
+    assert f'at byte {len(prefix.encode()) + 11}' in report['errors'][0]['message']
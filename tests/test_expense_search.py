@@ -0,0 +1,179 @@
+import random
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import date, datetime
+
+import pytest
+
+from models import db, Company, Expense, User
+from routes.employee_routes import record_ocr_result
+from utils.expense_search import INSERT_SQL, index_expense, search_available, search_expenses, search_row
+from utils.ocr_jobs import OcrJob
+
+@pytest.fixture(autouse=True)
+def fts5(app):
+    with app.app_context():
+        if not search_available():
+            pytest.skip('SQLite was built without FTS5')
+
+def submit(client, description):
+    response = client.post('/employee/expenses/submit', data={
+        'amount': '10', 'currency': 'USD', 'category': 'Travel',
+        'description': description, 'expense_date': '2025-01-02'
+    })
+    assert response.status_code == 302
+
+def expense_ids(employee_id):
+    return {e.id for e in Expense.query.filter_by(employee_id=employee_id)}
+
+def add_indexed_expense(company, description, receipt_path=None):
+    expense = Expense(
+        employee_id=company.employee, amount=10, currency='USD', amount_in_company_currency=10,
+        category='Travel', description=description, expense_date=date(2025, 1, 1),
+        status='pending', receipt_path=receipt_path
+    )
+    db.session.add(expense)
+    db.session.flush()
+    index_expense(expense, company.id)
+    db.session.commit()
+    return expense.id
+
+def all_pages(company_id, query, per_page):
+    hits, cursor = [], None
+    while True:
+        page = search_expenses(company_id, query, per_page, cursor)
+        hits.extend(page)
+        if not page.has_next:
+            return hits
+        cursor = page.next_cursor
+
+def test_manager_search_is_limited_to_the_subtree(app, workflow, login):
+    submit(login(workflow.outsider), 'Taxi to the airport')
+    submit(login(workflow.manager), 'Taxi home')
+    with app.app_context():
+        team = expense_ids(workflow.employee) | expense_ids(workflow.manager)
+        everyone = team | expense_ids(workflow.outsider)
+        found = {hit.id for hit in search_expenses(workflow.id, 'taxi', 20, team_of=workflow.manager)}
+        assert found == team
+        assert {hit.id for hit in search_expenses(workflow.id, 'taxi', 20)} == everyone
+        mine = search_expenses(workflow.id, 'taxi', 20, employee_id=workflow.outsider)
+        assert {hit.id for hit in mine} == expense_ids(workflow.outsider)
+
+def test_pages_follow_one_global_ranking(app_context, company):
+    # Older rows are the better matches, so the ranking runs against the
+    # insertion order.
+    for i in range(12):
+        add_indexed_expense(company, ' '.join(['hotel'] * (12 - i)) + f' night {i}')
+
+    ranked = list(search_expenses(company.id, 'hotel', 100))
+    assert len(ranked) == 12
+    assert [hit.score for hit in ranked] == sorted(hit.score for hit in ranked)
+    assert [(hit.id, hit.score) for hit in all_pages(company.id, 'hotel', 5)] == [(hit.id, hit.score) for hit in ranked]
+    assert [hit.id for hit in search_expenses(company.id, 'hotel', 5, cursor='not a cursor')] == [hit.id for hit in ranked[:5]]
+
+def test_late_ocr_text_reaches_the_index(app, app_context, company):
+    receipt_path = f'ab/cd/{uuid.uuid4().hex}.png'
+    expense_id = add_indexed_expense(company, 'Team lunch', receipt_path)
+    assert list(search_expenses(company.id, 'mastercard', 20)) == []
+
+    future = Future()
+    future.set_result({'amount': 18.5, 'raw_text': 'BISTRO\nMASTERCARD ****1234\nTOTAL 18.50'})
+    job = OcrJob(company.employee, '/tmp/receipt.png', uuid.uuid4().hex, future, 60)
+    record_ocr_result(app, receipt_path, job)
+
+    db.session.expire_all()
+    [hit] = search_expenses(company.id, 'mastercard', 20)
+    assert hit.id == expense_id
+    assert '[MASTERCARD]' in hit.ocr_snippet
+
+SYNTHETIC_WORDS = {
+    'description': [
+        'taxi', 'flight', 'hotel', 'dinner', 'lunch', 'breakfast', 'client', 'conference', 'train', 'parking',
+        'fuel', 'rental', 'printer', 'paper', 'laptop', 'monitor', 'cable', 'software', 'license', 'coffee',
+        'team', 'offsite', 'workshop', 'airport', 'shuttle', 'visa', 'toll', 'mileage', 'courier', 'postage',
+    ],
+    'vendor': [
+        'Uber', 'Lyft', 'Delta', 'United', 'Marriott', 'Hilton', 'Hertz', 'Avis', 'Staples', 'Amazon',
+        'Starbucks', 'Shell', 'Chevron', 'FedEx', 'DHL', 'Expedia', 'Airbnb', 'Dell', 'Apple', 'Adobe',
+    ],
+    'ocr': ['total', 'subtotal', 'tax', 'tip', 'visa', 'mastercard', 'receipt', 'thank', 'you', 'change', 'cash', 'invoice'],
+}
+
+def build_synthetic_expenses(size, companies=10, employees_per_company=100, seed=7):
+    rng = random.Random(seed)
+    words = SYNTHETIC_WORDS
+    categories = ['Travel', 'Meals', 'Accommodation', 'Transport', 'Supplies', 'Other']
+    batch = uuid.uuid4().hex[:8]
+    employees = []
+    for n in range(companies):
+        company = Company(name=f'Search Co {n}', country='US', currency='USD')
+        db.session.add(company)
+        db.session.flush()
+        ids = db.session.scalars(db.insert(User).returning(User.id, sort_by_parameter_order=True), [
+            {'email': f'search-{batch}-{n}-{m}@example.com', 'full_name': f'Search User {m}', 'role': 'employee',
+             'company_id': company.id, 'is_verified': True}
+            for m in range(employees_per_company)
+        ]).all()
+        employees.extend((company.id, user_id) for user_id in ids)
+
+    for start in range(0, size, 10000):
+        expense_rows, owners = [], []
+        for n in range(start, min(start + 10000, size)):
+            company_id, employee_id = employees[rng.randrange(len(employees))]
+            expense_rows.append({
+                'employee_id': employee_id, 'amount': 10.0, 'currency': 'USD', 'amount_in_company_currency': 10.0,
+                'category': rng.choice(categories),
+                'description': ' '.join(rng.sample(words['description'], 3)) + f' project{rng.randrange(20000)}',
+                'vendor_name': rng.choice(words['vendor']),
+                'expense_date': date(2025, 1, 1), 'status': 'pending',
+                'submitted_at': datetime(2025, 1, 1, 0, 0, n % 60)
+            })
+            owners.append((company_id, employee_id))
+        ids = db.session.scalars(db.insert(Expense).returning(Expense.id, sort_by_parameter_order=True), expense_rows).all()
+        db.session.execute(INSERT_SQL, [
+            search_row(
+                expense_id, company_id, employee_id, values['description'], values['vendor_name'], values['category'],
+                ' '.join(rng.choices(words['ocr'], k=6)) + ' ' + values['vendor_name'] if rng.random() < 0.3 else None
+            )
+            for expense_id, (company_id, employee_id), values in zip(ids, owners, expense_rows)
+        ])
+    db.session.execute(db.text("INSERT INTO expense_search(expense_search) VALUES ('optimize')"))
+    db.session.commit()
+    return employees
+
+@pytest.mark.bench
+def test_search_latency_on_a_million_expenses(app_context):
+    size, runs, per_page = 1000000, 20, 20
+    started = time.perf_counter()
+    employees = build_synthetic_expenses(size)
+    timings = {'expenses': size, 'build_seconds': round(time.perf_counter() - started, 1)}
+    company_id, employee_id = employees[0]
+
+    queries = {
+        'rare_term': ('project1234', None),
+        'common_term': ('taxi', None),
+        'two_terms': ('hotel marriott', None),
+        'prefix': ('conf*', None),
+        'ocr_text': ('mastercard tip', None),
+        'employee_scope': ('flight', employee_id),
+        'second_page': ('taxi', None),
+    }
+    for name, (query, scope) in queries.items():
+        cursor = None
+        if name == 'second_page':
+            cursor = search_expenses(company_id, query, per_page).next_cursor
+        durations = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            page = search_expenses(company_id, query, per_page, cursor=cursor, employee_id=scope)
+            ids = [row.id for row in page]
+            db.session.query(Expense.id, Expense.description, Expense.vendor_name).filter(Expense.id.in_(ids)).all()
+            durations.append((time.perf_counter() - started) * 1000)
+        durations.sort()
+        timings[name] = {
+            'median_ms': round(durations[len(durations) // 2], 2),
+            'p95_ms': round(durations[int(len(durations) * 0.95) - 1], 2),
+            'results_on_page': len(ids)
+        }
+    print(timings)
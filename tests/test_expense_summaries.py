@@ -0,0 +1,54 @@
+from models import db, Expense, ExpenseApproval, ExpenseSummary, User
+from utils.expense_summaries import company_status_totals
+
+def summary_rows(company_id):
+    rows = ExpenseSummary.query.filter(ExpenseSummary.company_id == company_id, ExpenseSummary.expense_count != 0)
+    return {(r.employee_id, r.status, r.category, r.month): (r.expense_count, round(r.total_amount, 2)) for r in rows}
+
+def recount(company_id):
+    rows = db.session.query(
+        Expense.employee_id, Expense.status, Expense.category, Expense.expense_date, Expense.amount_in_company_currency
+    ).join(User, User.id == Expense.employee_id).filter(User.company_id == company_id)
+    counts = {}
+    for employee_id, status, category, expense_date, amount in rows:
+        key = (employee_id, status, category, expense_date.strftime('%Y-%m'))
+        count, total = counts.get(key, (0, 0.0))
+        counts[key] = (count + 1, total + amount)
+    return {key: (count, round(total, 2)) for key, (count, total) in counts.items()}
+
+def pending_approvals(app, approver_id):
+    with app.app_context():
+        return [a.id for a in ExpenseApproval.query.join(Expense).filter(
+            ExpenseApproval.approver_id == approver_id,
+            ExpenseApproval.status == 'pending',
+            Expense.status == 'pending'
+        ).order_by(ExpenseApproval.expense_id)]
+
+def test_summary_matches_a_group_by_after_every_kind_of_decision(app, workflow, login):
+    employee, manager, admin = login(workflow.employee), login(workflow.manager), login(workflow.admin)
+    for amount, category, day in (('40', 'Meals', '2025-02-03'), ('50', 'Office Supplies', '2025-02-10'),
+                                  ('60', 'Meals', '2025-03-01'), ('70', 'Travel', '2025-03-15')):
+        assert employee.post('/employee/expenses/submit', data={
+            'amount': amount, 'currency': 'USD', 'category': category,
+            'description': f'Expense {amount}', 'expense_date': day
+        }).status_code == 302
+
+    one, two, three, four, five, six, seven = pending_approvals(app, workflow.manager)
+    manager.post(f'/manager/approvals/{one}/review', data={'action': 'approve'})
+    manager.post(f'/manager/approvals/{two}/review', data={'action': 'reject'})
+    manager.post('/manager/approvals/bulk', json={'approval_ids': [three, four, five], 'action': 'approve'})
+    manager.post('/manager/approvals/bulk', json={'approval_ids': [six, seven], 'action': 'reject'})
+
+    first, second, third, fourth = pending_approvals(app, workflow.admin)
+    admin.post(f'/manager/approvals/{first}/review', data={'action': 'approve'})
+    admin.post('/manager/approvals/bulk', json={'approval_ids': [second, third], 'action': 'approve'})
+    admin.post('/manager/approvals/bulk', json={'approval_ids': [fourth], 'action': 'reject'})
+
+    with app.app_context():
+        statuses = sorted(e.status for e in Expense.query.filter_by(employee_id=workflow.employee))
+        assert statuses == ['approved'] * 3 + ['rejected'] * 4
+        assert summary_rows(workflow.id) == recount(workflow.id)
+        totals = company_status_totals(workflow.id)
+        assert totals['approved']['count'] == 3
+        assert totals['rejected']['count'] == 4
+        assert totals.get('pending', {'count': 0})['count'] == 0
@@ -0,0 +1,36 @@
+import uuid
+from datetime import date
+
+from models import FxRate
+from utils.fx_history import convert_many, record_rates
+
+def test_rows_convert_at_the_last_rate_on_or_before_their_date(app_context):
+    # A base of our own keeps the series apart from the daily snapshots
+    # other tests record for USD.
+    base = uuid.uuid4().hex[:8].upper()
+    record_rates(date(2024, 1, 10), base, {'EUR': 0.9, 'GBP': 0.8})
+    record_rates(date(2024, 1, 20), base, {'EUR': 0.95})
+
+    # Nothing is recorded on Jan 15, the first requested day, so it has to
+    # resolve from the Jan 10 rate below the range.
+    assert convert_many([
+        (100, 'EUR', date(2024, 1, 15)),
+        (100, 'EUR', date(2024, 1, 20)),
+        (100, 'EUR', date(2024, 1, 25)),
+        (100, base, date(2024, 1, 15)),
+        (50, 'GBP', date(2024, 1, 25)),
+    ], 'GBP', base) == [88.89, 84.21, 84.21, 80.0, 50.0]
+
+    assert convert_many([
+        (100, 'EUR', date(2024, 1, 5)),
+        (50, 'GBP', date(2024, 1, 5)),
+        (100, 'EUR', date(2024, 1, 12)),
+    ], 'GBP', base) == [None, 50.0, 88.89]
+
+def test_recording_a_day_twice_keeps_the_first_snapshot(app_context):
+    base = uuid.uuid4().hex[:8].upper()
+    record_rates(date(2024, 2, 1), base, {'EUR': 0.9})
+    record_rates(date(2024, 2, 1), base, {'EUR': 5.0, 'GBP': 0.8})
+
+    rows = FxRate.query.filter_by(base=base).order_by(FxRate.quote).all()
+    assert [(row.quote, row.rate) for row in rows] == [('EUR', 0.9), ('GBP', 0.8)]
@@ -0,0 +1,38 @@
+from models import db, Company, User, UserHierarchy
+from utils.identity_cache import IdentityCache
+
+def test_version_bump_from_another_process_reloads(app_context, company):
+    cache = IdentityCache(ttl=60)
+    assert cache.get(company.employee).full_name.startswith('Employee')
+    assert cache.get(company.employee) is cache.get(company.employee)
+
+    # Another worker renames the user and bumps the version; this process
+    # never saw an invalidate() call.
+    db.session.execute(db.update(User).where(User.id == company.employee).values(full_name='Renamed'))
+    db.session.execute(db.update(Company).where(Company.id == company.id)
+                       .values(identity_version=Company.identity_version + 1))
+    db.session.commit()
+    assert cache.get(company.employee).full_name == 'Renamed'
+
+def test_deleted_user_is_dropped(app_context, company):
+    cache = IdentityCache(ttl=60)
+    assert cache.get(company.outsider) is not None
+    db.session.execute(db.delete(UserHierarchy).where(db.or_(
+        UserHierarchy.ancestor_id == company.outsider, UserHierarchy.descendant_id == company.outsider
+    )))
+    db.session.execute(db.delete(User).where(User.id == company.outsider))
+    db.session.commit()
+    assert cache.get(company.outsider) is None
+    assert cache.stats['deleted'] == 1
+
+def test_admin_edit_retires_cached_snapshots(app, company, login):
+    employee = login(company.employee)
+    assert employee.get('/employee/dashboard').status_code == 200
+    admin = login(company.admin)
+    response = admin.post(f'/admin/employees/{company.employee}/edit', data={
+        'full_name': 'Edited', 'role': 'employee', 'manager_id': company.manager
+    })
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(Company, company.id).identity_version == 1
+    assert b'Edited' in employee.get('/employee/dashboard').data
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import Counter
+
+import pytest
+from flask import got_request_exception
+
+from models import db, Expense, ExpenseApproval, User
+from utils.team_hierarchy import add_user
+
+# Parallel submit/approve traffic through the real routes. Runs against the
+# suite's throwaway SQLite file, or Postgres via TEST_DATABASE_URL:
+#
+#     pytest -m load
+#     TEST_DATABASE_URL=postgresql://localhost/expenses_load pytest -m load
+
+EMPLOYEES = 8
+EXPENSES_PER_EMPLOYEE = 25
+REVIEWERS = 2
+DEADLINE = 120
+
+@pytest.mark.load
+def test_concurrent_submits_and_reviews(app, workflow, login, monkeypatch):
+    # Failures have to come back as 500s rather than kill the worker thread.
+    monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', False)
+    errors = []
+    lock = threading.Lock()
+
+    def record_error(sender, exception, **extra):
+        with lock:
+            errors.append(repr(exception))
+    got_request_exception.connect(record_error, app)
+
+    with app.app_context():
+        staff = []
+        for i in range(EMPLOYEES):
+            user = User(email=f'load{i}-{workflow.number}@example.com', full_name=f'Load Employee {i}',
+                        role='employee', company_id=workflow.id, manager_id=workflow.manager, is_verified=True)
+            db.session.add(user)
+            db.session.flush()
+            add_user(user.id, workflow.manager)
+            staff.append(user.id)
+        db.session.commit()
+        database = db.engine.url.render_as_string(hide_password=True)
+    statuses = Counter()
+    latencies = []
+    submitted = threading.Event()
+
+    def timed(kind, call):
+        started = time.perf_counter()
+        response = call()
+        with lock:
+            statuses[(kind, response.status_code)] += 1
+            latencies.append(time.perf_counter() - started)
+
+    def submitter(user_id):
+        client = login(user_id)
+        for i in range(EXPENSES_PER_EMPLOYEE):
+            timed('submit', lambda: client.post('/employee/expenses/submit', data={
+                'amount': f'{10 + i}.50', 'currency': 'USD', 'category': 'Travel',
+                'description': f'load test {i}', 'expense_date': '2025-01-15', 'vendor_name': 'Load Vendor'
+            }))
+
+    def reviewer(offset):
+        client = login(workflow.manager)
+        stop_at = time.monotonic() + DEADLINE
+        while time.monotonic() < stop_at:
+            with app.app_context():
+                pending = db.session.scalars(
+                    db.select(ExpenseApproval.id).where(
+                        ExpenseApproval.approver_id == workflow.manager,
+                        ExpenseApproval.status == 'pending'
+                    ).order_by(ExpenseApproval.id).limit(20)
+                ).all()
+            mine = pending[offset::REVIEWERS]
+            if not mine:
+                if submitted.is_set():
+                    return
+                time.sleep(0.01)
+                continue
+            for approval_id in mine:
+                timed('review', lambda: client.post(
+                    f'/manager/approvals/{approval_id}/review', data={'action': 'approve', 'comments': 'load test'}
+                ))
+
+    started = time.perf_counter()
+    submit_threads = [threading.Thread(target=submitter, args=(user_id,)) for user_id in staff]
+    review_threads = [threading.Thread(target=reviewer, args=(offset,)) for offset in range(REVIEWERS)]
+    try:
+        for thread in submit_threads + review_threads:
+            thread.start()
+        for thread in submit_threads:
+            thread.join()
+        submitted.set()
+        for thread in review_threads:
+            thread.join()
+    finally:
+        got_request_exception.disconnect(record_error, app)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print({
+        'database': database,
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        'statuses': {f'{kind} {code}': count for (kind, code), count in sorted(statuses.items())},
+    })
+
+    assert not [error for error in errors if 'database is locked' in error]
+    assert errors == []
+    assert statuses[('submit', 302)] == EMPLOYEES * EXPENSES_PER_EMPLOYEE
+    with app.app_context():
+        waiting = ExpenseApproval.query.filter_by(approver_id=workflow.manager, status='pending').count()
+        stored = Expense.query.filter(Expense.employee_id.in_(staff)).count()
+    assert stored == EMPLOYEES * EXPENSES_PER_EMPLOYEE
+    assert waiting == 0
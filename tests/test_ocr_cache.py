@@ -0,0 +1,49 @@
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from test_ocr_jobs import FakeExecutor
+from utils.ocr_cache import ocr_cache
+from utils.ocr_jobs import ocr_job_queue
+from utils.receipt_store import LocalBackend, receipt_store
+
+@pytest.fixture
+def executor(tmp_path, monkeypatch):
+    monkeypatch.setattr(receipt_store, 'backend', LocalBackend(str(tmp_path)))
+    fake = FakeExecutor()
+    monkeypatch.setattr(ocr_job_queue, '_executor', fake)
+    return fake
+
+def receipt_bytes():
+    # Bytes no other test uploads, so the content hash starts uncached.
+    out = io.BytesIO()
+    Image.new('RGB', (300, 200), tuple(random.randrange(256) for _ in range(3))).save(out, 'PNG')
+    return out.getvalue()
+
+def scan(client, body):
+    return client.post('/employee/ocr-scan', data={'receipt': (io.BytesIO(body), 'receipt.png')})
+
+def test_same_bytes_are_answered_from_the_cache(company, login, executor):
+    client = login(company.employee)
+    body = receipt_bytes()
+
+    first = scan(client, body)
+    assert first.status_code == 202
+    assert len(executor.futures) == 1
+    executor.futures[0].set_result({'amount': 12.5, 'vendor': 'Cafe', 'raw_text': 'CAFE TOTAL 12.50'})
+
+    hits = dict(ocr_cache.stats)
+    second = scan(client, body)
+    assert second.status_code == 200
+    assert second.get_json()['status'] == 'done'
+    assert second.get_json()['data']['amount'] == 12.5
+    assert ocr_cache.stats['hits'] == hits['hits'] + 1
+
+    # Another process only has the stored result.
+    ocr_cache._entries.clear()
+    third = scan(client, body)
+    assert third.get_json()['data']['vendor'] == 'Cafe'
+    assert ocr_cache.stats['db_hits'] == hits['db_hits'] + 1
+    assert len(executor.futures) == 1
@@ -0,0 +1,87 @@
+from concurrent.futures import Future
+
+import pytest
+
+from utils.ocr_jobs import OcrJob, OcrJobQueue, QueueFullError
+
+def add_job(queue, timeout=60, running=False):
+    future = Future()
+    if running:
+        future.set_running_or_notify_cancel()
+    job = OcrJob(1, '/tmp/receipt.png', None, future, timeout)
+    queue._jobs[job.id] = job
+    return job
+
+def test_cancel_running_job_reports_cancelling_until_the_worker_finishes():
+    queue = OcrJobQueue(workers=1, max_queue=2)
+    job = add_job(queue, running=True)
+
+    assert queue.cancel(job.id) is False
+    assert job.status == 'cancelling'
+    assert queue.depth() == 1
+
+    job.future.set_result({'amount': 1.0})
+    assert job.status == 'cancelled'
+    assert job.result() is None
+    assert queue.depth() == 0
+
+def test_cancel_queued_job():
+    queue = OcrJobQueue(workers=1, max_queue=2)
+    job = add_job(queue)
+    assert queue.cancel(job.id) is True
+    assert job.status == 'cancelled'
+    assert queue.depth() == 0
+
+def test_overdue_job_times_out_only_once_it_leaves_the_pool():
+    queue = OcrJobQueue(workers=1, max_queue=2)
+    running = add_job(queue, timeout=-1, running=True)
+    queued = add_job(queue, timeout=-1)
+
+    assert running.status == 'running'
+    assert queued.status == 'timeout'
+    assert queue.depth() == 1
+
+    running.future.set_result({'amount': 2.0})
+    assert running.status == 'done'
+
+def test_zombies_count_against_the_queue_limit():
+    queue = OcrJobQueue(workers=1, max_queue=1, retention=0)
+    job = add_job(queue, timeout=-1, running=True)
+    queue.cancel(job.id)
+
+    with pytest.raises(QueueFullError):
+        queue.submit(1, '/tmp/receipt.png')
+    assert job.id in queue._jobs
+
+class FakeExecutor:
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self.futures.append(future)
+        return future
+
+def test_result_handler_runs_when_the_scan_finishes():
+    queue = OcrJobQueue(workers=1, max_queue=4)
+    queue._executor = FakeExecutor()
+    handled = []
+    done = queue.submit(1, '/tmp/a.png', 'a', on_result=handled.append)
+    failed = queue.submit(1, '/tmp/b.png', 'b', on_result=handled.append)
+
+    assert handled == []
+    done.future.set_result({'amount': 3.0, 'raw_text': 'TOTAL 3.00'})
+    failed.future.set_result(None)
+    assert handled == [done]
+    assert done.finished_at is not None and failed.finished_at is not None
+
+def test_overdue_queued_job_frees_its_slot_without_being_polled():
+    queue = OcrJobQueue(workers=1, max_queue=1)
+    queue._executor = FakeExecutor()
+    overdue = add_job(queue, timeout=-1)
+
+    job = queue.submit(1, '/tmp/receipt.png')
+    assert overdue.timed_out and overdue.future.cancelled()
+    assert overdue.id not in queue._jobs
+    assert queue.get(job.id) is job
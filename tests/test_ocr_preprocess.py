@@ -0,0 +1,17 @@
+from PIL import Image
+
+from config import Config
+from utils.ocr_preprocess import downscale, iter_pages
+
+def test_draft_decoded_jpeg_keeps_target_dpi(tmp_path):
+    path = tmp_path / 'scan.jpg'
+    Image.new('RGB', (Config.OCR_MAX_DIMENSION * 2, Config.OCR_MAX_DIMENSION), 'white').save(
+        path, dpi=(Config.OCR_TARGET_DPI * 4, Config.OCR_TARGET_DPI * 4)
+    )
+
+    [page] = list(iter_pages(str(path), {}))
+    assert page.width == Config.OCR_MAX_DIMENSION
+    assert round(page.info['dpi'][0]) == Config.OCR_TARGET_DPI * 2
+
+    # Half of the drafted size is exactly OCR_TARGET_DPI, not a quarter.
+    assert downscale(page).width == Config.OCR_MAX_DIMENSION // 2
@@ -0,0 +1,56 @@
+import base64
+from datetime import date, datetime
+
+import pytest
+
+from models import db, Expense
+from utils.pagination import encode_cursor
+
+def add_expenses(app, company):
+    # Three rows share each submitted_at, so pages have to break ties on id.
+    with app.app_context():
+        rows = [{
+            'employee_id': company.employee, 'amount': i + 1, 'currency': 'USD', 'amount_in_company_currency': i + 1,
+            'category': 'Travel', 'description': f'Row {i}', 'expense_date': date(2025, 1, 1), 'status': 'pending',
+            'submitted_at': datetime(2025, 1, 1 + i // 3)
+        } for i in range(7)]
+        ids = db.session.scalars(db.insert(Expense).returning(Expense.id, sort_by_parameter_order=True), rows).all()
+        db.session.commit()
+        return [(row['submitted_at'], id) for row, id in zip(rows, ids)]
+
+def walk(client, sort):
+    ids, cursor = [], None
+    while True:
+        url = f'/api/v1/expenses?per_page=2&sort={sort}' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        ids.extend(item['id'] for item in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+@pytest.mark.parametrize('sort', ['newest', 'oldest'])
+def test_pages_cover_ties_once_in_order(app, company, login, sort):
+    keys = add_expenses(app, company)
+    expected = [id for _, id in sorted(keys, reverse=sort == 'newest')]
+    assert walk(login(company.employee), sort) == expected
+
+def test_last_page_has_no_cursor(app, company, login):
+    add_expenses(app, company)
+    page = login(company.employee).get('/api/v1/expenses?per_page=7').get_json()
+    assert len(page['items']) == 7
+    assert page['next_cursor'] is None and page['next_url'] is None
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor',
+    base64.urlsafe_b64encode(b'2025-01-01T00:00:00').decode(),
+    base64.urlsafe_b64encode(b'yesterday|5').decode(),
+    base64.urlsafe_b64encode(b'\xff\xfe|5').decode(),
+    encode_cursor(datetime(2025, 1, 1), 10 ** 30),
+    encode_cursor(datetime(2025, 1, 1), -1),
+])
+def test_tampered_cursor_is_a_400(app, company, login, cursor):
+    client = login(company.employee)
+    response = client.get(f'/api/v1/expenses?cursor={cursor}')
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid cursor'
+    assert client.get(f'/employee/dashboard?cursor={cursor}').status_code == 400
@@ -0,0 +1,121 @@
+import logging
+
+import pytest
+
+from models import db, Expense, ExpenseApproval, OutboundEmail, User
+from routes.manager_routes import digest_key
+
+@pytest.fixture
+def auditor(app):
+    auditor = app.extensions['query_plan_auditor']
+    assert auditor.strict
+    auditor.reset()
+    yield auditor
+    auditor.reset()
+
+def pending_for(app, approver_id):
+    with app.app_context():
+        return [a.id for a in ExpenseApproval.query.filter_by(
+            approver_id=approver_id, status='pending'
+        ).order_by(ExpenseApproval.id)]
+
+PAGES = {
+    'admin': [
+        '/admin/dashboard', '/admin/employees', '/admin/expenses', '/admin/expenses?status=pending',
+        '/admin/approval-rules', '/admin/approval-rules/create', '/admin/employees/create',
+        '/manager/team-expenses', '/admin/expenses/export?format=csv',
+        '/admin/expenses?q=taxi', '/api/v1/expenses/search?q=taxi',
+    ],
+    'manager': [
+        '/manager/dashboard', '/manager/approvals', '/manager/approvals?stream=1',
+        '/manager/team-expenses', '/manager/team-expenses?category=Travel',
+        '/api/v1/approvals', '/api/v1/expenses', '/api/v1/expenses/search?q=taxi',
+    ],
+    'employee': [
+        '/employee/dashboard', '/employee/dashboard?status=pending', '/employee/expenses/submit',
+        '/api/v1/expenses', '/api/v1/expenses?status=pending', '/api/v1/expenses/search?q=tax*',
+    ],
+}
+
+@pytest.mark.parametrize('role', sorted(PAGES))
+def test_pages_run_without_full_scans(role, workflow, login, auditor):
+    client = login(getattr(workflow, role))
+    for path in PAGES[role]:
+        response = client.get(path)
+        response.get_data()
+        assert response.status_code == 200, path
+    assert auditor.violations == []
+
+def test_expense_detail_views_run_without_full_scans(app, workflow, login, auditor):
+    with app.app_context():
+        expense_id = Expense.query.filter_by(employee_id=workflow.employee).first().id
+    for user_id in (workflow.employee, workflow.manager, workflow.admin):
+        client = login(user_id)
+        assert client.get(f'/employee/expenses/{expense_id}').status_code == 200
+        assert client.get(f'/api/v1/expenses/{expense_id}').status_code == 200
+    assert auditor.violations == []
+
+def test_decisions_run_without_full_scans(app, workflow, login, auditor):
+    manager = login(workflow.manager)
+    first, second, third = pending_for(app, workflow.manager)
+
+    assert manager.get(f'/manager/approvals/{first}/review').status_code == 200
+    assert manager.post(f'/manager/approvals/{first}/review', data={'action': 'approve'}).status_code == 302
+    response = manager.post(f'/api/v1/approvals/{second}/decision', json={'action': 'reject', 'comments': 'no'})
+    assert response.status_code == 200
+
+    admin = login(workflow.admin)
+    # The admin's step on the first expense is now the active one.
+    admin_step = pending_for(app, workflow.admin)[0]
+    assert admin.post(f'/manager/approvals/{admin_step}/review', data={'action': 'approve'}).status_code == 302
+    assert auditor.violations == []
+
+def test_api_submit_runs_without_full_scans(company, login, auditor):
+    response = login(company.employee).post('/api/v1/expenses', json={
+        'amount': 12.5, 'currency': 'USD', 'category': 'Meals',
+        'description': 'Lunch', 'expense_date': '2025-02-01'
+    })
+    assert response.status_code == 201
+    assert auditor.violations == []
+
+def test_streamed_responses_log_their_query_count(workflow, login, caplog):
+    client = login(workflow.manager)
+    with caplog.at_level(logging.INFO, logger='app'):
+        response = client.get('/manager/approvals?stream=1')
+        response.get_data()
+        response.close()
+    assert 'X-Query-Count' not in response.headers
+    [record] = [r for r in caplog.records if 'X-Query-Count manager.approvals (streamed)' in r.getMessage()]
+    assert int(record.getMessage().rsplit(' ', 1)[1]) > 0
+
+    assert int(client.get('/manager/approvals').headers['X-Query-Count']) > 0
+
+def test_bulk_review_runs_without_full_scans(app, workflow, login, auditor):
+    manager = login(workflow.manager)
+    response = manager.post('/manager/approvals/bulk', json={
+        'approval_ids': pending_for(app, workflow.manager), 'action': 'approve'
+    })
+    assert response.status_code == 200
+    assert auditor.violations == []
+
+    # All three expenses moved on to the admin's step: one digest, keyed by
+    # exactly the approvals it announces.
+    admin_steps = pending_for(app, workflow.admin)
+    with app.app_context():
+        admin_email = db.session.get(User, workflow.admin).email
+        [digest] = OutboundEmail.query.filter_by(recipient=admin_email).filter(
+            OutboundEmail.dedupe_key.like('digest:bulk:%')
+        ).all()
+    assert digest.dedupe_key == f"digest:bulk:{digest_key(admin_steps)}:{admin_email}"
+
+def test_search_pages_run_without_full_scans(workflow, login, auditor):
+    client = login(workflow.manager)
+    ids, url = [], '/api/v1/expenses/search?q=taxi&per_page=1'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        body = response.get_json()
+        ids.extend(item['id'] for item in body['items'])
+        url = body['next_url']
+    assert len(ids) == len(set(ids)) == 3
+    assert auditor.violations == []
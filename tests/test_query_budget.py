@@ -0,0 +1,99 @@
+from datetime import date
+
+import pytest
+
+from models import db, Expense, ExpenseApproval
+
+# Queries per request once the per-process caches (identity, approval plan,
+# hierarchy) are warm; every request still reads its company's identity
+# version. Pages must stay flat as the data grows: every list view loads
+# its rows and their relations in a fixed number of queries.
+BUDGETS = {
+    'admin': {
+        '/admin/dashboard': 4,
+        '/admin/employees': 2,
+        '/admin/expenses': 2,
+        '/admin/expenses?status=pending': 2,
+        '/admin/approval-rules': 2,
+        '/manager/team-expenses': 3,
+    },
+    'manager': {
+        '/manager/dashboard': 3,
+        '/manager/approvals': 2,
+        '/manager/team-expenses': 3,
+        '/api/v1/approvals': 3,
+        '/api/v1/expenses': 3,
+    },
+    'employee': {
+        '/employee/dashboard': 3,
+        '/employee/expenses/submit': 1,
+        '/api/v1/expenses': 3,
+    },
+}
+
+WRITE_BUDGETS = {
+    'submit': 11,
+    'review': 17,
+    'decision': 12,
+}
+
+def query_count(client, path, **kwargs):
+    method = kwargs.pop('method', 'get')
+    response = getattr(client, method)(path, **kwargs)
+    assert response.status_code < 400, path
+    return int(response.headers['X-Query-Count'])
+
+def add_expenses(app, company, count):
+    with app.app_context():
+        for i in range(count):
+            expense = Expense(
+                employee_id=company.employee, amount=5 + i, currency='USD', amount_in_company_currency=5 + i,
+                category='Meals', description=f'Bulk {i}', expense_date=date(2025, 3, 1), status='pending'
+            )
+            db.session.add(expense)
+            db.session.flush()
+            db.session.add(ExpenseApproval(
+                expense_id=expense.id, approver_id=company.manager, step_sequence=0, status='pending'
+            ))
+        db.session.commit()
+
+@pytest.mark.parametrize('role', sorted(BUDGETS))
+def test_pages_stay_within_budget(role, app, workflow, login):
+    client = login(getattr(workflow, role))
+    for path in BUDGETS[role]:
+        query_count(client, path)
+
+    counts = {path: query_count(client, path) for path in BUDGETS[role]}
+    assert {path: count for path, count in counts.items() if count > BUDGETS[role][path]} == {}
+
+    add_expenses(app, workflow, 25)
+    grown = {path: query_count(client, path) for path in BUDGETS[role]}
+    assert grown == counts
+
+def test_detail_views_stay_within_budget(app, workflow, login):
+    with app.app_context():
+        expense_id = Expense.query.filter_by(employee_id=workflow.employee).first().id
+    for user_id in (workflow.employee, workflow.manager):
+        client = login(user_id)
+        query_count(client, f'/api/v1/expenses/{expense_id}')
+        assert query_count(client, f'/api/v1/expenses/{expense_id}') <= 4
+        assert query_count(client, f'/employee/expenses/{expense_id}') <= 4
+
+def test_writes_stay_within_budget(app, workflow, login):
+    employee = login(workflow.employee)
+    submit = {
+        'amount': '42', 'currency': 'EUR', 'category': 'Travel',
+        'description': 'Train', 'expense_date': '2025-01-03'
+    }
+    query_count(employee, '/employee/expenses/submit', method='post', data=submit)
+    assert query_count(employee, '/employee/expenses/submit', method='post', data=submit) <= WRITE_BUDGETS['submit']
+
+    with app.app_context():
+        first, second = [a.id for a in ExpenseApproval.query.filter_by(
+            approver_id=workflow.manager, status='pending'
+        ).order_by(ExpenseApproval.id).limit(2)]
+    manager = login(workflow.manager)
+    review = query_count(manager, f'/manager/approvals/{first}/review', method='post', data={'action': 'approve'})
+    assert review <= WRITE_BUDGETS['review']
+    decision = query_count(manager, f'/api/v1/approvals/{second}/decision', method='post', json={'action': 'reject'})
+    assert decision <= WRITE_BUDGETS['decision']
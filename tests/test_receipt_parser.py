@@ -0,0 +1,59 @@
+import time
+from datetime import date
+
+import pytest
+
+from utils.receipt_parser import has_total, parse_receipt
+
+SAMPLE_RECEIPTS = [
+    "STARBUCKS COFFEE\nStore #1234\n12/03/2024 08:15\nLatte 4.50\nMuffin 3.25\nSubtotal 7.75\nTax 0.62\nTOTAL $8.37\nVisa ****1234",
+    "Carrefour Market\n15 rue de Rivoli\n05.11.2023\nPain 1,20\nFromage 6,45\nTOTAL EUR 7,65\nCB 7,65",
+    "Taj Hotel\nInvoice No 4455\n3 Jan 2024\nRoom charges Rs 12,500.00\nGST 1,500.00\nGrand Total ₹14,000.00",
+    "UBER\nTrip receipt\nMarch 5, 2024\nTotal\n£23.40\nPaid with Apple Pay",
+    "Tokyo Ramen\n2024-02-10\nRamen ¥1,200\nGyoza ¥450\nAmount due ¥1,650",
+]
+
+@pytest.mark.parametrize('text, vendor, day, amount', [
+    (SAMPLE_RECEIPTS[0], 'STARBUCKS COFFEE', date(2024, 3, 12), 8.37),
+    (SAMPLE_RECEIPTS[1], 'Carrefour Market', date(2023, 11, 5), 7.65),
+    (SAMPLE_RECEIPTS[2], 'Taj Hotel', date(2024, 1, 3), 14000.0),
+    (SAMPLE_RECEIPTS[3], 'UBER', date(2024, 3, 5), 23.40),
+    (SAMPLE_RECEIPTS[4], 'Tokyo Ramen', date(2024, 2, 10), 1650.0),
+])
+def test_sample_receipts(text, vendor, day, amount):
+    parsed = parse_receipt(text)
+    assert (parsed['vendor'], parsed['date'], parsed['amount']) == (vendor, day, amount)
+
+@pytest.mark.parametrize('line', [
+    'Total 1 234,56',
+    'Total 1\u202f234,56',
+    'Total 1\u00a0234,56',
+    'Total EUR 1 234,56',
+])
+def test_space_grouped_totals(line):
+    assert parse_receipt(line)['amount'] == 1234.56
+
+def test_quantity_before_price_is_not_grouped():
+    parsed = parse_receipt("Widgets 2 125.00\nTotal 250.00")
+    assert [a['value'] for a in parsed['amounts']] == [125.00, 250.00]
+
+def test_line_items_alone_are_not_a_total():
+    page = parse_receipt("Carrefour Market\nPain 1,20\nFromage 6,45")
+    assert page['amount'] is not None
+    assert not has_total(page)
+
+def test_total_keyword_marks_the_total_page():
+    assert has_total(parse_receipt("Subtotal 7.75\nTax 0.62\nTOTAL $8.37"))
+    assert has_total(parse_receipt("UBER\nTotal\n£23.40"))
+    assert not has_total(parse_receipt("Subtotal 7.75\nTax 0.62"))
+
+@pytest.mark.bench
+def test_parse_throughput():
+    iterations = 2000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in SAMPLE_RECEIPTS:
+            parse_receipt(text)
+    elapsed = time.perf_counter() - start
+    parsed = iterations * len(SAMPLE_RECEIPTS)
+    print({'receipts': parsed, 'seconds': round(elapsed, 3), 'receipts_per_second': round(parsed / elapsed)})
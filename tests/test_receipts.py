@@ -0,0 +1,148 @@
+import hashlib
+import io
+import os
+import time
+from datetime import date
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from conftest import seed_company
+from models import db, Expense
+from utils.receipt_previews import PREVIEW_EXTENSION, VARIANTS, preview_generator
+from utils.receipt_store import LocalBackend, collect_garbage, receipt_key, receipt_store
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(receipt_store, 'backend', LocalBackend(str(tmp_path)))
+    return receipt_store
+
+@pytest.fixture
+def queued(monkeypatch):
+    # Renders are only recorded, so a preview stays pending for the test.
+    submitted = []
+    monkeypatch.setattr(preview_generator, 'submit', submitted.append)
+    return submitted
+
+def png_upload():
+    out = io.BytesIO()
+    Image.new('RGB', (600, 400), 'white').save(out, 'PNG')
+    return FileStorage(io.BytesIO(out.getvalue()), filename='receipt.png'), out.getvalue()
+
+def add_expense(app, employee_id, receipt_path):
+    with app.app_context():
+        expense = Expense(
+            employee_id=employee_id, amount=10, currency='USD', amount_in_company_currency=10,
+            category='Meals', description='Receipt', expense_date=date(2025, 1, 1),
+            status='pending', receipt_path=receipt_path
+        )
+        db.session.add(expense)
+        db.session.commit()
+        return expense.id
+
+def test_pending_preview_serves_the_original_briefly(app, company, login, store, queued):
+    upload, original = png_upload()
+    key, _ = store.save_upload(upload)
+    expense_id = add_expense(app, company.employee, key)
+
+    response = login(company.employee).get(f'/employee/expenses/{expense_id}/receipt/preview')
+    assert response.status_code == 200
+    assert response.data == original
+    assert response.cache_control.max_age == app.config['RECEIPT_PENDING_MAX_AGE']
+    assert not response.cache_control.immutable
+    assert queued == [key]
+
+def test_pending_pdf_preview_is_a_placeholder(app, company, login, store, queued):
+    expense_id = add_expense(app, company.employee, 'ab/cd/' + 'ab' * 32 + '.pdf')
+    response = login(company.employee).get(f'/employee/expenses/{expense_id}/receipt/thumb')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/svg+xml'
+    assert response.cache_control.max_age == app.config['RECEIPT_PENDING_MAX_AGE']
+
+def test_rendered_preview_is_cached_for_good(app, company, login, store):
+    upload, _ = png_upload()
+    key, _ = store.save_upload(upload)
+    expense_id = add_expense(app, company.employee, key)
+    preview_generator.submit(key).result()
+
+    response = login(company.employee).get(f'/employee/expenses/{expense_id}/receipt/thumb')
+    assert response.status_code == 200
+    assert response.cache_control.immutable
+    assert max(Image.open(io.BytesIO(response.data)).size) == app.config['RECEIPT_THUMB_SIZE']
+
+def test_receipts_stay_inside_the_company(app, company, login, store, queued):
+    upload, _ = png_upload()
+    key, _ = store.save_upload(upload)
+    expense_id = add_expense(app, company.employee, key)
+    with app.app_context():
+        other = seed_company(company.number + 10000)
+
+    for user_id in (other.admin, other.manager):
+        client = login(user_id)
+        for variant in ('original', 'preview'):
+            assert client.get(f'/employee/expenses/{expense_id}/receipt/{variant}').status_code == 403
+    assert login(company.manager).get(f'/employee/expenses/{expense_id}/receipt/original').status_code == 200
+
+@pytest.mark.parametrize('receipt_path', [
+    '../../x', '../../config.py', 'static/uploads/receipts/{hash}.png', '{hash}.png', 'derivatives/{shard}-thumb.webp',
+    '00/00/{hash}.png', '{shard}.png\n', '{shard}.exe', ['{shard}.png'],
+])
+def test_api_only_accepts_stored_receipt_keys(company, login, store, queued, receipt_path):
+    upload, _ = png_upload()
+    key, content_hash = store.save_upload(upload)
+    shard = key.rsplit('.', 1)[0]
+    fill = lambda value: value.format(hash=content_hash, shard=shard)
+    receipt_path = [fill(p) for p in receipt_path] if isinstance(receipt_path, list) else fill(receipt_path)
+
+    client = login(company.employee)
+    payload = {
+        'amount': 12.5, 'currency': 'USD', 'category': 'Meals',
+        'description': 'Lunch', 'expense_date': '2025-02-01'
+    }
+    response = client.post('/api/v1/expenses', json=dict(payload, receipt_path=receipt_path))
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Unknown receipt_path'
+
+    response = client.post('/api/v1/expenses', json=dict(payload, receipt_path=key))
+    assert response.status_code == 201
+
+def test_garbage_collection_keeps_referenced_and_recent_receipts(app, company, store, tmp_path):
+    grace = 3600
+    old = time.time() - 2 * grace
+
+    def stored(name, mtime=None, legacy=False):
+        content_hash = hashlib.sha256(name.encode()).hexdigest()
+        key = receipt_key(content_hash, 'png')
+        path = store.backend.legacy_path(key) if legacy else store.backend.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(name.encode())
+        if mtime:
+            os.utime(path, (mtime, mtime))
+        return key, content_hash
+
+    referenced, _ = stored('referenced', old)
+    legacy, _ = stored('legacy', old, legacy=True)
+    orphan, orphan_hash = stored('orphan', old)
+    recent, _ = stored('recent')
+    previews = []
+    for variant in VARIANTS:
+        source = tmp_path / f'.preview-{variant}'
+        source.write_bytes(b'preview')
+        previews.append(store.put_derivative(str(source), orphan_hash, variant, PREVIEW_EXTENSION))
+
+    add_expense(app, company.employee, referenced)
+    add_expense(app, company.employee, f"{app.config['UPLOAD_FOLDER']}/{os.path.basename(legacy)}")
+
+    assert all(store.backend.exists(key) for key in previews)
+    with app.app_context():
+        stats = collect_garbage(store, grace)
+
+    assert stats['relocated'] == 1
+    assert stats['deleted'] == 1
+    assert store.exists(referenced)
+    assert store.exists(legacy)
+    assert store.exists(recent)
+    assert not store.exists(orphan)
+    assert not any(store.backend.exists(key) for key in previews)
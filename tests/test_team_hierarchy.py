@@ -0,0 +1,109 @@
+import time
+from datetime import date, datetime
+
+import pytest
+
+from models import db, Company, Expense, User, UserHierarchy
+from utils.team_hierarchy import (
+    TeamCycleError, in_subtree, join_team, move_user, rebuild_hierarchy, team_member_ids
+)
+
+def build_synthetic_org(company_id, size, fanout):
+    # Breadth-first tree: user n reports to user (n - 1) // fanout.
+    ids = []
+    for start in range(0, size, 5000):
+        batch = [
+            {
+                'email': f'org-{company_id}-{n}@example.com',
+                'full_name': f'Org User {n}',
+                'role': 'manager' if n * fanout + 1 < size else 'employee',
+                'company_id': company_id,
+                'is_verified': True,
+            }
+            for n in range(start, min(start + 5000, size))
+        ]
+        ids.extend(db.session.scalars(db.insert(User).returning(User.id, sort_by_parameter_order=True), batch).all())
+    db.session.execute(db.update(User), [
+        {'id': ids[n], 'manager_id': ids[(n - 1) // fanout]} for n in range(1, size)
+    ])
+    return ids
+
+def synthetic_org(size, fanout):
+    company = Company(name='Synthetic Org', country='US', currency='USD')
+    db.session.add(company)
+    db.session.flush()
+    ids = build_synthetic_org(company.id, size, fanout)
+    rebuild_hierarchy(company.id)
+    return ids
+
+def walk_team(manager_id):
+    # The per-level walk the closure table replaced, as a baseline.
+    members, frontier = [], [manager_id]
+    while frontier:
+        frontier = [row[0] for row in db.session.query(User.id).filter(User.manager_id.in_(frontier))]
+        members.extend(frontier)
+    return members
+
+def team_of(manager_id):
+    return set(db.session.scalars(team_member_ids(manager_id)))
+
+def test_closure_matches_the_manager_links(app_context):
+    ids = synthetic_org(40, 3)
+    assert team_of(ids[1]) == set(walk_team(ids[1]))
+    assert team_of(ids[0]) == set(ids[1:])
+    assert db.session.scalar(
+        db.select(UserHierarchy.depth).where(UserHierarchy.ancestor_id == ids[0], UserHierarchy.descendant_id == ids[13])
+    ) == 3
+
+def test_move_user_carries_the_subtree(app_context):
+    ids = synthetic_org(40, 3)
+    subtree = team_of(ids[1]) | {ids[1]}
+    move_user(ids[1], ids[2])
+    assert team_of(ids[2]) >= subtree
+    assert all(in_subtree(ids[0], user_id) for user_id in subtree)
+    assert not team_of(ids[3]) & subtree
+
+def test_move_user_rejects_cycles(app_context):
+    ids = synthetic_org(40, 3)
+    with pytest.raises(TeamCycleError):
+        move_user(ids[1], ids[4])
+    with pytest.raises(TeamCycleError):
+        move_user(ids[1], ids[1])
+
+@pytest.mark.bench
+def test_team_queries_on_a_large_org(app_context):
+    size, fanout, expenses_per_user = 50000, 8, 2
+    started = time.perf_counter()
+    ids = synthetic_org(size, fanout)
+    timings = {'users': size, 'fanout': fanout, 'build_org_seconds': round(time.perf_counter() - started, 3)}
+
+    for start in range(0, size, 5000):
+        db.session.execute(db.insert(Expense), [
+            {
+                'employee_id': user_id, 'amount': 10.0, 'currency': 'USD', 'amount_in_company_currency': 10.0,
+                'category': 'Travel', 'description': 'synthetic', 'expense_date': date(2025, 1, 1),
+                'status': 'pending', 'submitted_at': datetime(2025, 1, 1, 0, 0, n % 60)
+            }
+            for user_id in ids[start:start + 5000] for n in range(expenses_per_user)
+        ])
+
+    # A skip-level manager two levels below the root owns a deep subtree.
+    skip_level = ids[fanout + 1]
+    newest = (Expense.submitted_at.desc(), Expense.id.desc())
+
+    started = time.perf_counter()
+    walked = walk_team(skip_level)
+    by_walk = Expense.query.filter(Expense.employee_id.in_(walked)).order_by(*newest).limit(50).all()
+    timings['walk_team_seconds'] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    by_join = join_team(Expense.query, skip_level, Expense.employee_id).order_by(*newest).limit(50).all()
+    timings['closure_join_seconds'] = round(time.perf_counter() - started, 3)
+    timings['team_size'] = len(walked)
+
+    started = time.perf_counter()
+    move_user(skip_level, ids[2])
+    timings['move_subtree_seconds'] = round(time.perf_counter() - started, 3)
+    print(timings)
+
+    assert [e.id for e in by_walk] == [e.id for e in by_join]
@@ -0,0 +1,198 @@
+from datetime import datetime
+from models import db, Expense, ExpenseApproval, ExpenseStepCounter
+
+def init_counters(expense, step_sequences, initial_step):
+    totals = {}
+    for sequence in step_sequences:
+        totals[sequence] = totals.get(sequence, 0) + 1
+
+    expense.approvals_total = len(step_sequences)
+    expense.approvals_approved = 0
+    expense.approvals_rejected = 0
+    expense.current_step_pending = totals.get(initial_step, 0)
+    for sequence, total in totals.items():
+        db.session.add(ExpenseStepCounter(expense_id=expense.id, step_sequence=sequence, total=total))
+
+def record_decision(approval, status, comments):
+    decided = db.session.execute(
+        db.update(ExpenseApproval)
+        .where(ExpenseApproval.id == approval.id, ExpenseApproval.status == 'pending')
+        .values(status=status, comments=comments, decision_at=datetime.utcnow())
+    ).rowcount
+    if not decided:
+        return False
+
+    counter = 'approved' if status == 'approved' else 'rejected'
+    db.session.execute(
+        db.update(Expense)
+        .where(Expense.id == approval.expense_id)
+        .values({
+            f'approvals_{counter}': getattr(Expense, f'approvals_{counter}') + 1,
+            'current_step_pending': Expense.current_step_pending - db.case(
+                (Expense.current_approval_step == approval.step_sequence, 1),
+                else_=0
+            )
+        }),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(
+        db.update(ExpenseStepCounter)
+        .where(
+            ExpenseStepCounter.expense_id == approval.expense_id,
+            ExpenseStepCounter.step_sequence == approval.step_sequence
+        )
+        .values({counter: getattr(ExpenseStepCounter, counter) + 1}),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.refresh(approval.expense)
+    return True
+
+def record_decisions(approval_ids, status, comments):
+    # Set-based variant of record_decision for a batch of pending approvals.
+    # Returns the ids that were actually decided by this call.
+    decided_ids = db.session.scalars(
+        db.update(ExpenseApproval)
+        .where(
+            ExpenseApproval.id.in_(approval_ids),
+            ExpenseApproval.status == 'pending',
+            # A decided expense keeps its later steps' approvals pending;
+            # they must not be decided after the fact.
+            db.select(Expense.id).where(Expense.id == ExpenseApproval.expense_id, Expense.status == 'pending').exists()
+        )
+        .values(status=status, comments=comments, decision_at=datetime.utcnow())
+        .returning(ExpenseApproval.id),
+        execution_options={'synchronize_session': False}
+    ).all()
+    if not decided_ids:
+        return []
+
+    counter = 'approved' if status == 'approved' else 'rejected'
+    decided = db.select(db.func.count(ExpenseApproval.id)).where(
+        ExpenseApproval.id.in_(decided_ids),
+        ExpenseApproval.expense_id == Expense.id
+    )
+    db.session.execute(
+        db.update(Expense)
+        .where(Expense.id.in_(
+            db.select(ExpenseApproval.expense_id).where(ExpenseApproval.id.in_(decided_ids))
+        ))
+        .values({
+            f'approvals_{counter}': getattr(Expense, f'approvals_{counter}') + decided.scalar_subquery(),
+            'current_step_pending': Expense.current_step_pending - decided.where(
+                ExpenseApproval.step_sequence == Expense.current_approval_step
+            ).scalar_subquery()
+        }),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(
+        db.update(ExpenseStepCounter)
+        .where(ExpenseStepCounter.expense_id.in_(
+            db.select(ExpenseApproval.expense_id).where(ExpenseApproval.id.in_(decided_ids))
+        ))
+        .values({counter: getattr(ExpenseStepCounter, counter) + db.select(db.func.count(ExpenseApproval.id)).where(
+            ExpenseApproval.id.in_(decided_ids),
+            ExpenseApproval.expense_id == ExpenseStepCounter.expense_id,
+            ExpenseApproval.step_sequence == ExpenseStepCounter.step_sequence
+        ).scalar_subquery()}),
+        execution_options={'synchronize_session': False}
+    )
+    return decided_ids
+
+def next_open_step(counters, current_step):
+    # Steps decided out of order, before the workflow reached them, have no
+    # pending approvals left and are passed over.
+    return next(
+        (c for c in counters if c.step_sequence > current_step and c.total - c.approved - c.rejected > 0),
+        None
+    )
+
+def advance_to_next_step(expense):
+    # Returns the step the expense moves to, or None when no step is left
+    # waiting on a decision.
+    counters = ExpenseStepCounter.query.filter(
+        ExpenseStepCounter.expense_id == expense.id,
+        ExpenseStepCounter.step_sequence > expense.current_approval_step
+    ).order_by(ExpenseStepCounter.step_sequence).all()
+    next_counter = next_open_step(counters, expense.current_approval_step)
+    if next_counter is None:
+        return None
+
+    expense.current_approval_step = next_counter.step_sequence
+    expense.current_step_pending = next_counter.total - next_counter.approved - next_counter.rejected
+    return next_counter.step_sequence
+
+def advance_many(expenses):
+    # Batch form of advance_to_next_step; returns {expense_id: next_step or None}.
+    if not expenses:
+        return {}
+    counters = ExpenseStepCounter.query.filter(
+        ExpenseStepCounter.expense_id.in_([expense.id for expense in expenses])
+    ).order_by(ExpenseStepCounter.expense_id, ExpenseStepCounter.step_sequence).all()
+
+    by_expense = {}
+    for counter in counters:
+        by_expense.setdefault(counter.expense_id, []).append(counter)
+
+    next_steps = {}
+    for expense in expenses:
+        next_counter = next_open_step(by_expense.get(expense.id, []), expense.current_approval_step)
+        if next_counter is None:
+            next_steps[expense.id] = None
+            continue
+        expense.current_approval_step = next_counter.step_sequence
+        expense.current_step_pending = next_counter.total - next_counter.approved - next_counter.rejected
+        next_steps[expense.id] = next_counter.step_sequence
+    return next_steps
+
+def final_status(expense):
+    # Once every step is decided, any rejection among them rejects the
+    # expense; ordinarily a rejection has already ended it.
+    return 'rejected' if expense.approvals_rejected else 'approved'
+
+def rebuild_counters(expense_ids=None):
+    query = db.session.query(
+        ExpenseApproval.expense_id,
+        ExpenseApproval.step_sequence,
+        db.func.count(ExpenseApproval.id),
+        db.func.sum(db.case((ExpenseApproval.status == 'approved', 1), else_=0)),
+        db.func.sum(db.case((ExpenseApproval.status == 'rejected', 1), else_=0))
+    ).group_by(ExpenseApproval.expense_id, ExpenseApproval.step_sequence)
+    if expense_ids is not None:
+        query = query.filter(ExpenseApproval.expense_id.in_(expense_ids))
+
+    steps = {}
+    for expense_id, sequence, total, approved, rejected in query:
+        steps.setdefault(expense_id, {})[sequence] = (total, approved or 0, rejected or 0)
+
+    expenses = Expense.query.options(db.selectinload(Expense.step_counters))
+    if expense_ids is not None:
+        expenses = expenses.filter(Expense.id.in_(expense_ids))
+
+    repaired = []
+    for expense in expenses:
+        expense_steps = steps.get(expense.id, {})
+        current_total, current_approved, current_rejected = expense_steps.get(expense.current_approval_step, (0, 0, 0))
+        expected = (
+            sum(total for total, _, _ in expense_steps.values()),
+            sum(approved for _, approved, _ in expense_steps.values()),
+            sum(rejected for _, _, rejected in expense_steps.values()),
+            current_total - current_approved - current_rejected
+        )
+        actual = (expense.approvals_total, expense.approvals_approved, expense.approvals_rejected, expense.current_step_pending)
+        existing = {c.step_sequence: c for c in expense.step_counters}
+        if expected == actual and {seq: (c.total, c.approved, c.rejected) for seq, c in existing.items()} == expense_steps:
+            continue
+
+        (expense.approvals_total, expense.approvals_approved,
+         expense.approvals_rejected, expense.current_step_pending) = expected
+        for sequence, counter in existing.items():
+            if sequence not in expense_steps:
+                expense.step_counters.remove(counter)
+        for sequence, (total, approved, rejected) in expense_steps.items():
+            counter = existing.get(sequence)
+            if counter is None:
+                counter = ExpenseStepCounter(expense_id=expense.id, step_sequence=sequence)
+                expense.step_counters.append(counter)
+            counter.total, counter.approved, counter.rejected = total, approved, rejected
+        repaired.append(expense.id)
+    return repaired
@@ -0,0 +1,149 @@
+import itertools
+import json
+import threading
+from collections import deque
+from sqlalchemy import event
+from config import Config
+
+class ApprovalEvent:
+    __slots__ = ('id', 'type', 'data')
+
+    def __init__(self, event_id, event_type, data):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+
+    def encode(self):
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+class Subscription:
+    # One per open SSE connection. Publishers append without ever waiting;
+    # a reader that falls more than buffer_size events behind has its
+    # backlog dropped and gets a single 'resync' event instead, telling the
+    # page to reload the queue once rather than replay every change.
+    def __init__(self, broker, user_id, buffer_size):
+        self.broker = broker
+        self.user_id = user_id
+        self.buffer_size = buffer_size
+        self.dropped = 0
+        self._events = deque()
+        self._overflowed = False
+        self._closed = False
+        self._ready = threading.Condition()
+
+    def push(self, approval_event):
+        with self._ready:
+            if self._overflowed:
+                self.dropped += 1
+                return
+            if len(self._events) >= self.buffer_size:
+                self.dropped += len(self._events) + 1
+                self._events.clear()
+                self._overflowed = True
+            else:
+                self._events.append(approval_event)
+            self._ready.notify()
+
+    def request_resync(self):
+        with self._ready:
+            self._events.clear()
+            self._overflowed = True
+            self._ready.notify()
+
+    def wait(self, timeout):
+        # Returns the buffered events, [] on timeout (time for a heartbeat)
+        # or None once the subscription has been closed.
+        with self._ready:
+            if not self._events and not self._overflowed and not self._closed:
+                self._ready.wait(timeout)
+            if self._closed:
+                return None
+            if self._overflowed:
+                self._overflowed = False
+                return [ApprovalEvent(self.broker.next_id(), 'resync', {'dropped': self.dropped})]
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def close(self):
+        with self._ready:
+            self._closed = True
+            self._ready.notify()
+        self.broker.unsubscribe(self)
+
+class ApprovalEventBroker:
+    def __init__(self, buffer_size=100, max_connections=100):
+        self.buffer_size = buffer_size
+        self.max_connections = max_connections
+        self.stats = {'published': 0, 'delivered': 0, 'rejected_connections': 0}
+        self._subscribers = {}
+        self._count = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        return next(self._ids)
+
+    @property
+    def connections(self):
+        return self._count
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._count >= self.max_connections:
+                self.stats['rejected_connections'] += 1
+                return None
+            subscription = Subscription(self, user_id, self.buffer_size)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self._count -= 1
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, event_type, data):
+        approval_event = ApprovalEvent(self.next_id(), event_type, data)
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+            self.stats['published'] += 1
+            self.stats['delivered'] += len(subscriptions)
+        for subscription in subscriptions:
+            subscription.push(approval_event)
+        return approval_event
+
+approval_events = ApprovalEventBroker(Config.SSE_BUFFER_SIZE, Config.SSE_MAX_CONNECTIONS)
+
+def publish_after_commit(session, user_id, event_type, data):
+    # Staged on the session so dashboards never hear about rows that are
+    # rolled back or not yet visible to their follow-up requests.
+    session.info.setdefault('approval_events', []).append((user_id, event_type, data))
+
+def install_event_hooks(session):
+    @event.listens_for(session, 'after_commit')
+    def send_staged(session):
+        for user_id, event_type, data in session.info.pop('approval_events', ()):
+            approval_events.publish(user_id, event_type, data)
+
+    @event.listens_for(session, 'after_soft_rollback')
+    def drop_staged(session, previous_transaction):
+        if not session.in_transaction():
+            session.info.pop('approval_events', None)
+
+def approval_payload(approval_id, step_sequence, expense, employee_name, currency):
+    return {
+        'approval_id': approval_id,
+        'expense_id': expense.id,
+        'step_sequence': step_sequence,
+        'current_approval_step': expense.current_approval_step,
+        'employee_name': employee_name,
+        'amount': expense.amount_in_company_currency,
+        'currency': currency,
+        'category': expense.category,
+        'expense_date': expense.expense_date.isoformat() if expense.expense_date else None
+    }
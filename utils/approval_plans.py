@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import namedtuple
+from config import Config
+from models import db, ApprovalRule, ApprovalStep
+
+Approver = namedtuple('Approver', ['id', 'email', 'full_name'])
+PlanStep = namedtuple('PlanStep', ['sequence', 'approver'])
+
+class ApprovalPlan:
+    __slots__ = (
+        'rule_id', 'rule_type', 'percentage_required', 'specific_approver',
+        'is_manager_first', 'steps', 'approver_ids', '_decide'
+    )
+
+    def __init__(self, rule_id, rule_type, percentage_required, specific_approver, is_manager_first, steps):
+        self.rule_id = rule_id
+        self.rule_type = rule_type
+        self.percentage_required = percentage_required or 0
+        self.specific_approver = specific_approver
+        self.is_manager_first = bool(is_manager_first)
+        self.steps = tuple(steps)
+        self.approver_ids = frozenset(step.approver.id for step in self.steps)
+        self._decide = {
+            'percentage': self._decide_percentage,
+            'specific': self._decide_specific,
+            'hybrid': self._decide_hybrid,
+            'sequential': self._decide_sequential,
+        }.get(rule_type, self._decide_unanimous)
+
+    @property
+    def specific_approver_id(self):
+        return self.specific_approver.id if self.specific_approver else None
+
+    def initial_approvals(self, manager):
+        # Returns (step_sequence, Approver, notify) for every approval row the
+        # workflow should create, in the same order the rule defines them.
+        approvals = []
+        if self.is_manager_first and manager:
+            approvals.append((0, manager, True))
+
+        if self.rule_type == 'sequential':
+            first_sequence = 0 if approvals else min((s.sequence for s in self.steps), default=0)
+            for step in self.steps:
+                approvals.append((step.sequence, step.approver, step.sequence == first_sequence))
+        elif self.rule_type in ('percentage', 'hybrid'):
+            for step in self.steps:
+                approvals.append((0, step.approver, True))
+            if self.rule_type == 'hybrid' and self.specific_approver and self.specific_approver.id not in self.approver_ids:
+                approvals.append((0, self.specific_approver, True))
+        elif self.rule_type == 'specific' and self.specific_approver:
+            approvals.append((0, self.specific_approver, True))
+        return approvals
+
+    def initial_step(self, approvals):
+        sequences = [sequence for sequence, _, notify in approvals if notify]
+        return min(sequences) if sequences else 0
+
+    def decide(self, expense, approval):
+        # Returns 'approved', 'step_complete' or None from the expense's
+        # decision counters and the approval that was just granted.
+        return self._decide(expense, approval)
+
+    def _decide_unanimous(self, expense, approval):
+        if expense.approvals_approved >= expense.approvals_total:
+            return 'approved'
+        return None
+
+    def _percentage_met(self, expense):
+        total = expense.approvals_total
+        return total > 0 and expense.approvals_approved * 100 >= self.percentage_required * total
+
+    def _specific_approved(self, approval):
+        return approval.approver_id == self.specific_approver_id
+
+    def _decide_percentage(self, expense, approval):
+        return 'approved' if self._percentage_met(expense) else None
+
+    def _decide_specific(self, expense, approval):
+        return 'approved' if self._specific_approved(approval) else None
+
+    def _decide_hybrid(self, expense, approval):
+        if self._percentage_met(expense) or self._specific_approved(approval):
+            return 'approved'
+        return None
+
+    def _decide_sequential(self, expense, approval):
+        if expense.current_step_pending <= 0:
+            return 'step_complete'
+        return None
+
+NO_RULE_PLAN = ApprovalPlan(None, None, None, None, False, ())
+
+def snapshot_user(user):
+    return Approver(user.id, user.email, user.full_name) if user else None
+
+def compile_plan(company_id):
+    rule = ApprovalRule.query.options(
+        db.selectinload(ApprovalRule.approval_steps).joinedload(ApprovalStep.approver),
+        db.joinedload(ApprovalRule.specific_approver)
+    ).filter_by(company_id=company_id, is_active=True).order_by(ApprovalRule.id).first()
+
+    if rule is None:
+        return NO_RULE_PLAN
+
+    return ApprovalPlan(
+        rule.id,
+        rule.rule_type,
+        rule.percentage_required,
+        snapshot_user(rule.specific_approver),
+        rule.is_manager_first,
+        [PlanStep(step.sequence, snapshot_user(step.approver)) for step in rule.approval_steps]
+    )
+
+class ApprovalPlanCache:
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def get(self, company_id):
+        entry = self._plans.get(company_id)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self.stats['hits'] += 1
+            return entry[0]
+
+        self.stats['misses'] += 1
+        plan = compile_plan(company_id)
+        with self._lock:
+            self._plans[company_id] = (plan, time.monotonic())
+        return plan
+
+    def invalidate(self, company_id=None):
+        with self._lock:
+            self.stats['invalidations'] += 1
+            if company_id is None:
+                self._plans.clear()
+            else:
+                self._plans.pop(company_id, None)
+
+approval_plan_cache = ApprovalPlanCache(ttl=Config.APPROVAL_PLAN_CACHE_TTL)
@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+import requests
+from markupsafe import Markup, escape
+from config import Config
+
+def normalize_countries(data):
+    # restcountries response -> [{'country', 'currency_code', 'currency_name'}]
+    entries = []
+    for country in data:
+        if 'currencies' in country and country['currencies']:
+            country_name = country['name']['common']
+            for currency_code, currency_data in country['currencies'].items():
+                entries.append({
+                    'country': country_name,
+                    'currency_code': currency_code,
+                    'currency_name': currency_data.get('name', currency_code)
+                })
+    return entries
+
+def render_country_options(entries):
+    return Markup(''.join(
+        f'<option value="{escape(entry["country"])}" data-currency="{escape(entry["currency_code"])}">'
+        f'{escape(entry["country"])} ({escape(entry["currency_code"])})</option>'
+        for entry in entries
+    ))
+
+class CatalogueSnapshot:
+    __slots__ = ('countries', 'currencies', 'country_options', 'loaded_at', '_currency_options')
+
+    def __init__(self, entries):
+        self.countries = tuple(sorted(entries, key=lambda entry: (entry['country'], entry['currency_code'])))
+        self.currencies = tuple(sorted({entry['currency_code'] for entry in self.countries}))
+        self.country_options = render_country_options(self.countries)
+        self.loaded_at = time.monotonic()
+        self._currency_options = {}
+
+    def currency_options(self, selected=None, codes=None):
+        # One fragment per pre-selected currency and set of offered codes;
+        # the codes only change when the rate table does.
+        codes = self.currencies if codes is None else tuple(codes)
+        key = (selected, codes)
+        fragment = self._currency_options.get(key)
+        if fragment is None:
+            fragment = Markup(''.join(
+                f'<option value="{code}"{" selected" if code == selected else ""}>{code}</option>'
+                for code in codes
+            ))
+            if len(self._currency_options) >= 64:
+                self._currency_options.clear()
+            self._currency_options[key] = fragment
+        return fragment
+
+class Catalogue:
+    def __init__(self, snapshot_file, source_url, refresh_interval=0):
+        self.snapshot_file = snapshot_file
+        self.source_url = source_url
+        self.refresh_interval = refresh_interval
+        self.stats = {'refreshes': 0, 'errors': 0}
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    @property
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load_file()
+                snapshot = self._snapshot
+        return snapshot
+
+    def _load_file(self):
+        with open(self.snapshot_file, encoding='utf-8') as f:
+            return CatalogueSnapshot(json.load(f)['countries'])
+
+    def refresh(self):
+        try:
+            response = requests.get(self.source_url, timeout=10)
+            response.raise_for_status()
+            entries = normalize_countries(response.json())
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Country catalogue refresh error: {e}")
+            return False
+
+        if not entries:
+            self.stats['errors'] += 1
+            return False
+        self._snapshot = CatalogueSnapshot(entries)
+        self.stats['refreshes'] += 1
+        return True
+
+    def start_refresh(self):
+        if self.refresh_interval <= 0 or (self._refresher is not None and self._refresher.is_alive()):
+            return None
+
+        def run():
+            while True:
+                time.sleep(self.refresh_interval)
+                self.refresh()
+
+        self._refresher = threading.Thread(target=run, name='catalogue-refresh', daemon=True)
+        self._refresher.start()
+        return self._refresher
+
+catalogue = Catalogue(Config.COUNTRY_CATALOGUE_FILE, Config.COUNTRIES_API, Config.COUNTRY_CATALOGUE_REFRESH_INTERVAL)
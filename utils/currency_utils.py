@@ -1,53 +1,27 @@
-import requests
-from config import Config
+from utils.catalogue import catalogue
+from utils.exchange_rates import rate_cache
+
+class CurrencyConversionError(ValueError):
+    pass
 
 def get_all_countries_currencies():
-    try:
-        response = requests.get(Config.COUNTRIES_API, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        countries_data = []
-        for country in data:
-            if 'currencies' in country and country['currencies']:
-                country_name = country['name']['common']
-                for currency_code, currency_data in country['currencies'].items():
-                    countries_data.append({
-                        'country': country_name,
-                        'currency_code': currency_code,
-                        'currency_name': currency_data.get('name', currency_code)
-                    })
-        
-        countries_data.sort(key=lambda x: x['country'])
-        return countries_data
-    except Exception as e:
-        print(f"Currency API Error: {e}")
-        return []
+    return list(catalogue.snapshot.countries)
 
 def convert_currency(amount, from_currency, to_currency):
     if from_currency == to_currency:
         return amount
     
-    try:
-        response = requests.get(f"{Config.CURRENCY_API_BASE}{from_currency}", timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        if to_currency in data['rates']:
-            rate = data['rates'][to_currency]
-            return round(amount * rate, 2)
-        else:
-            print(f"Currency conversion failed: {to_currency} not found")
-            return amount
-    except Exception as e:
-        print(f"Currency conversion error: {e}")
-        return amount
+    rate = rate_cache.rate(from_currency, to_currency)
+    if rate is None:
+        raise CurrencyConversionError(f"No exchange rate for {from_currency} to {to_currency}")
+    return round(amount * rate, 2)
+
+def get_supported_currencies(to_currency):
+    # Catalogue currencies an amount can be converted from into to_currency;
+    # the catalogue lists many codes the rate table has no rate for.
+    table = rate_cache.get_table()
+    rates = table.rates if table is not None and to_currency in table.rates else {}
+    return [code for code in catalogue.snapshot.currencies if code == to_currency or code in rates]
 
-def get_supported_currencies():
-    try:
-        response = requests.get(f"{Config.CURRENCY_API_BASE}USD", timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        return sorted(data['rates'].keys())
-    except:
-        return ['USD', 'EUR', 'GBP', 'INR', 'JPY', 'AUD', 'CAD']
+def currency_options(to_currency):
+    return catalogue.snapshot.currency_options(to_currency, get_supported_currencies(to_currency))
@@ -0,0 +1,81 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+SQLITE_JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SQLITE_SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+def is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    }
+
+    # In-memory SQLite lives inside a single connection, so it keeps
+    # SQLAlchemy's singleton pool and sizing options do not apply.
+    if not is_memory_sqlite(url):
+        options.update({
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+        })
+
+    if url.get_backend_name() == 'sqlite':
+        # The driver-level timeout and busy_timeout both wait for a lock
+        # instead of failing straight away with "database is locked".
+        options['connect_args'] = {
+            'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+            'check_same_thread': False,
+        }
+    return options
+
+def sqlite_pragmas(config):
+    journal_mode = config['SQLITE_JOURNAL_MODE'].upper()
+    synchronous = config['SQLITE_SYNCHRONOUS'].upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f"unsupported SQLITE_JOURNAL_MODE '{journal_mode}'")
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f"unsupported SQLITE_SYNCHRONOUS '{synchronous}'")
+    return [
+        f"PRAGMA journal_mode={journal_mode}",
+        f"PRAGMA synchronous={synchronous}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+def install_sqlite_pragmas(engine, config):
+    if engine.dialect.name != 'sqlite':
+        return None
+
+    pragmas = sqlite_pragmas(config)
+    if is_memory_sqlite(engine.url):
+        pragmas = [pragma for pragma in pragmas if not pragma.startswith(('PRAGMA journal_mode', 'PRAGMA mmap_size'))]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    event.listen(engine, 'connect', set_pragmas)
+    # Drop any connection opened before the listener was attached so every
+    # pooled connection carries the pragmas.
+    engine.dispose()
+    return pragmas
+
+def connection_settings(engine):
+    if engine.dialect.name != 'sqlite':
+        return {'dialect': engine.dialect.name, 'pool': engine.pool.status()}
+
+    with engine.connect() as connection:
+        settings = {
+            name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size')
+        }
+    settings.update({'dialect': 'sqlite', 'pool': engine.pool.status()})
+    return settings
@@ -0,0 +1,135 @@
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from models import db, OutboundEmail
+from utils.email_utils import mail, build_message
+
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+def claim_batch(batch_size):
+    now = datetime.utcnow()
+    candidates = db.session.query(OutboundEmail.id).filter(
+        db.or_(
+            db.and_(OutboundEmail.status == 'pending', OutboundEmail.next_attempt_at <= now),
+            db.and_(OutboundEmail.status == 'sending', OutboundEmail.claimed_at <= now - CLAIM_TIMEOUT)
+        )
+    ).order_by(OutboundEmail.next_attempt_at).limit(batch_size).all()
+
+    claimed = []
+    for (email_id,) in candidates:
+        result = db.session.execute(
+            db.update(OutboundEmail)
+            .where(OutboundEmail.id == email_id, OutboundEmail.status.in_(['pending', 'sending']))
+            .where(db.or_(OutboundEmail.claimed_at.is_(None), OutboundEmail.claimed_at <= now - CLAIM_TIMEOUT))
+            .values(status='sending', claimed_at=now)
+        )
+        if result.rowcount:
+            claimed.append(email_id)
+    db.session.commit()
+
+    if not claimed:
+        return []
+    return OutboundEmail.query.filter(OutboundEmail.id.in_(claimed)).all()
+
+def deliver_batch(emails, max_attempts, retry_base_seconds):
+    try:
+        with mail.connect() as connection:
+            for email in emails:
+                try:
+                    connection.send(build_message(email))
+                    email.status = 'sent'
+                    email.sent_at = datetime.utcnow()
+                    email.last_error = None
+                except Exception as e:
+                    schedule_retry(email, e, max_attempts, retry_base_seconds)
+    except Exception as e:
+        for email in emails:
+            if email.status == 'sending':
+                schedule_retry(email, e, max_attempts, retry_base_seconds)
+
+    for email in emails:
+        email.claimed_at = None
+    db.session.commit()
+
+def schedule_retry(email, error, max_attempts, retry_base_seconds):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+        print(f"Email Error: giving up on #{email.id} to {email.recipient}: {error}")
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_base_seconds * 2 ** (email.attempts - 1))
+
+def drain_outbox(app):
+    sent = 0
+    with app.app_context():
+        config = app.config
+        while True:
+            emails = claim_batch(config['EMAIL_BATCH_SIZE'])
+            if not emails:
+                return sent
+            deliver_batch(emails, config['EMAIL_MAX_ATTEMPTS'], config['EMAIL_RETRY_BASE_SECONDS'])
+            sent += sum(1 for e in emails if e.status == 'sent')
+
+class EmailWorkerPool:
+    def __init__(self, app, workers=2, poll_interval=2):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._claim_lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"email-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        config = self.app.config
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    with self._claim_lock:
+                        emails = claim_batch(config['EMAIL_BATCH_SIZE'])
+                    if emails:
+                        deliver_batch(emails, config['EMAIL_MAX_ATTEMPTS'], config['EMAIL_RETRY_BASE_SECONDS'])
+                        continue
+            except Exception as e:
+                print(f"Email worker error: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+def install_wakeup_hook(session, pool):
+    # Wakes the pool as soon as a transaction that queued mail commits, so
+    # OTPs and approval notices don't wait out the poll interval.
+    @event.listens_for(session, 'after_commit')
+    def wake_workers(session):
+        if session.info.pop('emails_enqueued', False):
+            pool.notify()
+
+    @event.listens_for(session, 'after_soft_rollback')
+    def forget_enqueued(session, previous_transaction):
+        if not session.in_transaction():
+            session.info.pop('emails_enqueued', None)
+
+def start_email_workers(app):
+    if app.config['EMAIL_WORKERS'] <= 0:
+        return None
+    pool = EmailWorkerPool(app, app.config['EMAIL_WORKERS'], app.config['EMAIL_POLL_INTERVAL'])
+    install_wakeup_hook(db.session, pool)
+    pool.start()
+    return pool
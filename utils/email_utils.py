@@ -1,13 +1,41 @@
 from flask_mail import Message, Mail
+from models import db, OutboundEmail
 
 mail = Mail()
 
+def enqueue_email(recipient_email, subject, html, dedupe_key=None):
+    if dedupe_key:
+        pending = next(
+            (e for e in db.session.new if isinstance(e, OutboundEmail) and e.dedupe_key == dedupe_key),
+            None
+        )
+        if pending or OutboundEmail.query.filter_by(dedupe_key=dedupe_key).first():
+            return False
+    
+    db.session.add(OutboundEmail(
+        recipient=recipient_email,
+        subject=subject,
+        html=html,
+        dedupe_key=dedupe_key
+    ))
+    # Read by the email worker hook, which wakes the pool once this commits.
+    db.session.info['emails_enqueued'] = True
+    return True
+
+def build_message(outbound_email):
+    return Message(
+        subject=outbound_email.subject,
+        recipients=[outbound_email.recipient],
+        html=outbound_email.html
+    )
+
 def send_otp_email(recipient_email, otp_code, user_name):
+    # Only stages the email; it goes out once the caller commits.
     try:
-        msg = Message(
-            subject='Your OTP Code - Expense Manager',
-            recipients=[recipient_email],
-            html=f"""
+        return enqueue_email(
+            recipient_email,
+            'Your OTP Code - Expense Manager',
+            f"""
             <html>
                 <body style="font-family: Arial, sans-serif; padding: 20px;">
                     <h2>Welcome to Expense Manager!</h2>
@@ -24,18 +52,16 @@ def send_otp_email(recipient_email, otp_code, user_name):
             </html>
             """
         )
-        mail.send(msg)
-        return True
     except Exception as e:
         print(f"Email Error: {e}")
         return False
 
-def send_approval_notification(recipient_email, expense_id, expense_amount, currency, user_name):
+def send_approval_notification(recipient_email, expense_id, step_sequence, expense_amount, currency, user_name):
     try:
-        msg = Message(
-            subject='New Expense Awaiting Your Approval',
-            recipients=[recipient_email],
-            html=f"""
+        return enqueue_email(
+            recipient_email,
+            'New Expense Awaiting Your Approval',
+            f"""
             <html>
                 <body style="font-family: Arial, sans-serif; padding: 20px;">
                     <h2>Expense Approval Required</h2>
@@ -50,10 +76,42 @@ def send_approval_notification(recipient_email, expense_id, expense_amount, curr
                     <p>Best regards,<br>Expense Manager Team</p>
                 </body>
             </html>
-            """
+            """,
+            dedupe_key=f"approval:{expense_id}:{step_sequence}:{recipient_email}"
+        )
+    except Exception as e:
+        print(f"Email Error: {e}")
+        return False
+
+def send_approval_digest(recipient_email, user_name, expenses, currency, batch_id):
+    rows = ''.join(
+        f"<tr><td>#{expense_id}</td><td>{currency} {amount}</td></tr>"
+        for expense_id, amount in expenses[:50]
+    )
+    if len(expenses) > 50:
+        rows += f"<tr><td colspan=\"2\">...and {len(expenses) - 50} more</td></tr>"
+    try:
+        return enqueue_email(
+            recipient_email,
+            f'{len(expenses)} New Expenses Awaiting Your Approval',
+            f"""
+            <html>
+                <body style="font-family: Arial, sans-serif; padding: 20px;">
+                    <h2>Expense Approvals Required</h2>
+                    <p>Hello {user_name},</p>
+                    <p>{len(expenses)} expenses have been submitted and require your approval:</p>
+                    <table style="background-color: #f9f9f9; padding: 15px; margin: 20px 0;">
+                        <tr><th align="left">Expense ID</th><th align="left">Amount</th></tr>
+                        {rows}
+                    </table>
+                    <p>Please log in to the Expense Manager to review and approve/reject these expenses.</p>
+                    <br>
+                    <p>Best regards,<br>Expense Manager Team</p>
+                </body>
+            </html>
+            """,
+            dedupe_key=f"digest:{batch_id}:{recipient_email}"
         )
-        mail.send(msg)
-        return True
     except Exception as e:
         print(f"Email Error: {e}")
         return False
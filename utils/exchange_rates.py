@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+import requests
+from config import Config
+
+class HttpRateBackend:
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def fetch(self, base_currency):
+        response = requests.get(f"{self.base_url}{base_currency}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['rates']
+
+class FileRateBackend:
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self, base_currency):
+        with open(self.path) as f:
+            data = json.load(f)
+
+        rates = dict(data['rates'])
+        table_base = data.get('base', base_currency)
+        if table_base != base_currency:
+            rates.setdefault(table_base, 1.0)
+            pivot = rates[base_currency]
+            rates = {code: rate / pivot for code, rate in rates.items()}
+        return rates
+
+class RateTable:
+    def __init__(self, base_currency, rates, fetched_at):
+        self.base_currency = base_currency
+        self.rates = dict(rates)
+        self.rates[base_currency] = 1.0
+        self.fetched_at = fetched_at
+
+    def age(self):
+        return time.monotonic() - self.fetched_at
+
+    def rate(self, from_currency, to_currency):
+        if from_currency not in self.rates or to_currency not in self.rates:
+            return None
+        return self.rates[to_currency] / self.rates[from_currency]
+
+    def currencies(self):
+        return sorted(self.rates.keys())
+
+class RateCache:
+    def __init__(self, backend, base_currency='USD', ttl=3600, stale_ttl=86400, retry_after=60):
+        self.backend = backend
+        self.base_currency = base_currency
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.retry_after = retry_after
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'errors': 0}
+        self._table = None
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._refreshing = False
+        self._failed_at = None
+
+    def get_table(self):
+        table = self._table
+        if table is not None:
+            age = table.age()
+            if age < self.ttl:
+                self.stats['hits'] += 1
+                return table
+            if age < self.stale_ttl:
+                self.stats['stale_hits'] += 1
+                self._refresh_in_background()
+                return table
+
+        self.stats['misses'] += 1
+        with self._lock:
+            if self._table is not None and self._table.age() < self.ttl:
+                return self._table
+            if self._backing_off():
+                return self._table
+            return self._refresh() or self._table
+
+    def rate(self, from_currency, to_currency):
+        table = self.get_table()
+        if table is None:
+            return None
+        return table.rate(from_currency, to_currency)
+
+    def invalidate(self):
+        with self._lock:
+            self._table = None
+            self._failed_at = None
+
+    def _refresh(self):
+        try:
+            rates = self.backend.fetch(self.base_currency)
+        except Exception as e:
+            self.stats['errors'] += 1
+            self._failed_at = time.monotonic()
+            print(f"Exchange rate refresh error: {e}")
+            return None
+
+        self._table = RateTable(self.base_currency, rates, time.monotonic())
+        self._failed_at = None
+        self.stats['refreshes'] += 1
+        return self._table
+
+    def _backing_off(self):
+        return self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_after
+
+    def _refresh_in_background(self):
+        # At most one refresh in flight, and none while the last attempt
+        # failed less than retry_after seconds ago; stale reads keep being
+        # served from the old table meanwhile. The flag has its own lock so
+        # a stale read never waits on the fetch itself, which holds _lock.
+        with self._state_lock:
+            if self._refreshing or self._backing_off():
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                with self._lock:
+                    self._refresh()
+            finally:
+                with self._state_lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+def build_backend():
+    if Config.CURRENCY_RATES_FILE:
+        return FileRateBackend(Config.CURRENCY_RATES_FILE)
+    return HttpRateBackend(Config.CURRENCY_API_BASE)
+
+rate_cache = RateCache(
+    build_backend(),
+    base_currency=Config.CURRENCY_RATE_BASE,
+    ttl=Config.CURRENCY_RATE_TTL,
+    stale_ttl=Config.CURRENCY_RATE_STALE_TTL
+)
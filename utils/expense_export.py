@@ -0,0 +1,255 @@
+import csv
+import io
+import tempfile
+from datetime import datetime
+from config import Config
+from models import db, Company, Expense, User
+from utils.fx_history import convert_many
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+EXPORT_COLUMNS = [
+    ('id', Expense.id),
+    ('employee_email', User.email),
+    ('employee_name', User.full_name),
+    ('amount', Expense.amount),
+    ('currency', Expense.currency),
+    ('amount_in_company_currency', Expense.amount_in_company_currency),
+    ('category', Expense.category),
+    ('description', Expense.description),
+    ('expense_date', Expense.expense_date),
+    ('vendor_name', Expense.vendor_name),
+    ('status', Expense.status),
+    ('submitted_at', Expense.submitted_at),
+    ('final_decision_at', Expense.final_decision_at),
+]
+FIELD_NAMES = [name for name, _ in EXPORT_COLUMNS]
+CONVERTED_INDEX = FIELD_NAMES.index('amount_in_company_currency')
+
+RATE_MODES = ('submitted', 'expense_date')
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+FILE_CHUNK_SIZE = 64 * 1024
+# Spreadsheet apps evaluate a cell that starts with one of these as a formula.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+class ExportFilterError(ValueError):
+    pass
+
+def format_available(fmt):
+    if fmt == 'parquet':
+        return pyarrow is not None
+    if fmt == 'xlsx':
+        return Workbook is not None
+    return fmt in EXPORT_FORMATS
+
+def parse_filters(args):
+    filters = {}
+    for key in ('date_from', 'date_to'):
+        value = (args.get(key) or '').strip()
+        if value:
+            try:
+                filters[key] = datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                raise ExportFilterError(f"invalid {key} '{value}', expected YYYY-MM-DD")
+    for key in ('status', 'category'):
+        value = (args.get(key) or '').strip()
+        if value:
+            filters[key] = value
+    employee_id = (args.get('employee_id') or '').strip()
+    if employee_id:
+        if not employee_id.isdigit():
+            raise ExportFilterError(f"invalid employee_id '{employee_id}'")
+        filters['employee_id'] = int(employee_id)
+    rates = (args.get('rates') or '').strip()
+    if rates:
+        if rates not in RATE_MODES:
+            raise ExportFilterError(f"invalid rates '{rates}', expected submitted or expense_date")
+        filters['rates'] = rates
+    return filters
+
+def build_export_query(company_id, filters):
+    # Plain column rows rather than ORM entities so nothing accumulates in the
+    # identity map while a large export is being read.
+    query = db.select(*[column for _, column in EXPORT_COLUMNS]).join(
+        User, Expense.employee_id == User.id
+    ).where(User.company_id == company_id)
+
+    if 'date_from' in filters:
+        query = query.where(Expense.expense_date >= filters['date_from'])
+    if 'date_to' in filters:
+        query = query.where(Expense.expense_date <= filters['date_to'])
+    if 'status' in filters:
+        query = query.where(Expense.status == filters['status'])
+    if 'category' in filters:
+        query = query.where(Expense.category == filters['category'])
+    if 'employee_id' in filters:
+        query = query.where(Expense.employee_id == filters['employee_id'])
+    return query.order_by(Expense.id)
+
+def iter_export_batches(company_id, filters, batch_size=None):
+    batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+    result = db.session.execute(
+        build_export_query(company_id, filters).execution_options(yield_per=batch_size)
+    )
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+def convert_at_expense_date(batches, currency):
+    # Re-prices amount_in_company_currency at the recorded rate for each
+    # row's expense_date; rows with no rate history keep the amount that was
+    # converted at submission time.
+    for rows in batches:
+        converted = convert_many(
+            [(row.amount, row.currency, row.expense_date) for row in rows], currency
+        )
+        yield [
+            row if value is None else row[:CONVERTED_INDEX] + (value,) + row[CONVERTED_INDEX + 1:]
+            for row, value in zip(rows, converted)
+        ]
+
+def escape_formula(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def escape_row(row):
+    return [escape_formula(value) for value in row]
+
+def iter_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELD_NAMES)
+    for rows in batches:
+        writer.writerows(escape_row(row) for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode('utf-8')
+
+def iter_file(handle):
+    try:
+        handle.seek(0)
+        while True:
+            chunk = handle.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        handle.close()
+
+def parquet_schema():
+    return pyarrow.schema([
+        ('id', pyarrow.int64()),
+        ('employee_email', pyarrow.string()),
+        ('employee_name', pyarrow.string()),
+        ('amount', pyarrow.float64()),
+        ('currency', pyarrow.string()),
+        ('amount_in_company_currency', pyarrow.float64()),
+        ('category', pyarrow.string()),
+        ('description', pyarrow.string()),
+        ('expense_date', pyarrow.date32()),
+        ('vendor_name', pyarrow.string()),
+        ('status', pyarrow.string()),
+        ('submitted_at', pyarrow.timestamp('us')),
+        ('final_decision_at', pyarrow.timestamp('us')),
+    ])
+
+class ChunkSink:
+    # Write-only file object for ParquetWriter that hands each written
+    # block back to the caller instead of keeping it.
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def iter_parquet(batches, row_group_size=None):
+    # Row groups are sent as soon as they are written and only the footer
+    # waits for the last one, so at most one row group is held in memory.
+    row_group_size = row_group_size or Config.EXPORT_ROW_GROUP_SIZE
+    schema = parquet_schema()
+    sink = ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='snappy')
+    pending = []
+    try:
+        for rows in batches:
+            pending.extend(rows)
+            if len(pending) >= row_group_size:
+                writer.write_table(rows_to_table(pending, schema), row_group_size=row_group_size)
+                pending = []
+                yield sink.drain()
+        if pending:
+            writer.write_table(rows_to_table(pending, schema), row_group_size=row_group_size)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def rows_to_table(rows, schema):
+    columns = list(zip(*rows))
+    return pyarrow.Table.from_arrays(
+        [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+def write_xlsx(batches):
+    # An xlsx file is a zip archive that openpyxl only assembles on save(),
+    # so unlike CSV and Parquet the whole workbook is built (spooled to disk
+    # past EXPORT_SPOOL_SIZE) before the first byte is sent.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Expenses')
+    sheet.append(FIELD_NAMES)
+    for rows in batches:
+        for row in rows:
+            sheet.append(escape_row(row))
+    handle = tempfile.SpooledTemporaryFile(max_size=Config.EXPORT_SPOOL_SIZE)
+    workbook.save(handle)
+    return handle
+
+def export_expenses(company_id, filters, fmt):
+    batches = iter_export_batches(company_id, filters)
+    if filters.get('rates') == 'expense_date':
+        currency = db.session.scalar(db.select(Company.currency).where(Company.id == company_id))
+        batches = convert_at_expense_date(batches, currency)
+    if fmt == 'parquet':
+        return iter_parquet(batches)
+    if fmt == 'xlsx':
+        return iter_file(write_xlsx(batches))
+    return iter_csv(batches)
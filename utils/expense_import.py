@@ -0,0 +1,293 @@
+import codecs
+import csv
+import json
+import math
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from config import Config
+from models import db, Expense, ExpenseApproval, ExpenseStepCounter, User
+from utils.approval_events import approval_payload, publish_after_commit
+from utils.approval_plans import approval_plan_cache, snapshot_user
+from utils.email_utils import send_approval_digest
+from utils.exchange_rates import rate_cache
+from utils.expense_search import index_expenses, search_row
+from utils.expense_summaries import apply_delta
+
+MAX_REPORTED_ERRORS = 100
+JSON_READ_SIZE = 64 * 1024
+MAX_JSON_ROW_BYTES = 1024 * 1024
+
+class ImportRowError(ValueError):
+    pass
+
+def iter_rows(stream, fmt):
+    if fmt == 'csv':
+        reader = csv.DictReader(codecs.iterdecode(stream, 'utf-8-sig'))
+        for line_no, row in enumerate(reader, start=2):
+            yield line_no, row
+    elif fmt in ('jsonl', 'ndjson'):
+        for line_no, line in enumerate(codecs.iterdecode(stream, 'utf-8'), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                # Each line stands alone, so a bad one is reported like any
+                # other invalid row and the rest of the file still imports.
+                row = ImportRowError(f'invalid JSON: {e}')
+            yield line_no, row
+    else:
+        yield from enumerate(iter_json_array(stream), start=1)
+
+def iter_json_array(stream):
+    # Decodes a top-level JSON array one element at a time, so a large
+    # upload is never materialised as a single list.
+    decoder = json.JSONDecoder()
+    reader = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    eof = False
+    bytes_read = 0
+
+    def fill():
+        nonlocal buffer, eof, bytes_read
+        chunk = stream.read(JSON_READ_SIZE)
+        eof = not chunk
+        bytes_read += len(chunk or b'')
+        buffer += reader.decode(chunk or b'', final=eof)
+
+    def byte_offset(pos):
+        # Bytes read so far, less what is still buffered or held back by
+        # the decoder, plus the position of the error within the buffer.
+        unconsumed = len(buffer.encode('utf-8')) + len(reader.getstate()[0])
+        return bytes_read - unconsumed + len(buffer[:pos].encode('utf-8'))
+
+    def skip_whitespace():
+        nonlocal buffer
+        while True:
+            buffer = buffer.lstrip()
+            if buffer or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if not buffer.startswith('['):
+        raise ValueError('expected a JSON array of expense objects')
+    buffer = buffer[1:]
+    expect_value = True
+    while True:
+        skip_whitespace()
+        if not buffer:
+            raise ValueError('unterminated JSON array')
+        if buffer[0] == ']':
+            return
+        if not expect_value:
+            if buffer[0] != ',':
+                raise ValueError(f"expected ',' or ']' but found '{buffer[0]}'")
+            buffer = buffer[1:]
+            expect_value = True
+            continue
+        try:
+            row, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            # Most likely the element continues in the next read.
+            if eof or len(buffer) > MAX_JSON_ROW_BYTES:
+                raise ValueError(f'invalid JSON at byte {byte_offset(e.pos)}: {e.msg}')
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            # A number may be cut short at the end of the buffer.
+            fill()
+            continue
+        buffer = buffer[end:]
+        expect_value = False
+        yield row
+
+def text_field(row, name, default=''):
+    value = row.get(name)
+    if value is None or value == '':
+        return default
+    if not isinstance(value, str):
+        raise ImportRowError(f"{name} must be text")
+    return str(value).strip()
+
+def parse_row(row, employees, table, company_currency):
+    if isinstance(row, ImportRowError):
+        raise row
+    if not isinstance(row, dict):
+        raise ImportRowError('row must be an object')
+
+    email = text_field(row, 'employee_email').lower()
+    employee = employees.get(email)
+    if employee is None:
+        raise ImportRowError(f"unknown employee '{email}'")
+
+    try:
+        amount = float(row.get('amount'))
+    except (TypeError, ValueError):
+        raise ImportRowError(f"invalid amount '{row.get('amount')}'")
+    if not math.isfinite(amount):
+        raise ImportRowError(f"invalid amount '{row.get('amount')}'")
+    if amount <= 0:
+        raise ImportRowError('amount must be positive')
+
+    currency = text_field(row, 'currency', company_currency).upper()
+    if currency == company_currency:
+        rate = 1.0
+    else:
+        rate = table.rate(currency, company_currency) if table else None
+    if rate is None:
+        raise ImportRowError(f"no exchange rate for '{currency}'")
+
+    category = text_field(row, 'category')
+    if category not in Config.EXPENSE_CATEGORIES:
+        raise ImportRowError(f"invalid category '{category}'")
+
+    description = text_field(row, 'description')
+    if not description:
+        raise ImportRowError('description is required')
+
+    expense_date = text_field(row, 'expense_date')
+    try:
+        expense_date = datetime.strptime(expense_date, '%Y-%m-%d').date()
+    except ValueError:
+        raise ImportRowError(f"invalid expense_date '{row.get('expense_date')}'")
+
+    return employee, {
+        'employee_id': employee.id,
+        'amount': amount,
+        'currency': currency,
+        'amount_in_company_currency': round(amount * rate, 2),
+        'category': category,
+        'description': description,
+        'expense_date': expense_date,
+        'vendor_name': text_field(row, 'vendor_name'),
+        'status': 'pending'
+    }
+
+def import_expenses(stream, fmt, company, chunk_size=None):
+    chunk_size = chunk_size or Config.IMPORT_CHUNK_SIZE
+    started = time.perf_counter()
+    batch_id = uuid.uuid4().hex
+
+    users = User.query.filter_by(company_id=company.id).all()
+    by_id = {user.id: user for user in users}
+    employees = {user.email.lower(): user for user in users}
+    managers = {user.id: snapshot_user(by_id.get(user.manager_id)) for user in users}
+    plan = approval_plan_cache.get(company.id)
+    table = rate_cache.get_table()
+
+    report = {'batch_id': batch_id, 'imported': 0, 'failed': 0, 'errors': [], 'aborted': False}
+    chunk = []
+    chunks = 0
+
+    def flush():
+        # Each chunk commits its rows together with the digests announcing
+        # them, so a failure later in the file never leaves approvers
+        # notified about rows that don't exist, or rows nobody was told of.
+        nonlocal chunks
+        digests = {}
+        insert_chunk(chunk, plan, managers, company, digests)
+        for approver, expenses in digests.values():
+            send_approval_digest(approver.email, approver.full_name, expenses, company.currency, f"{batch_id}:{chunks}")
+        db.session.commit()
+        chunks += 1
+        report['imported'] += len(chunk)
+        chunk.clear()
+
+    try:
+        for line_no, row in iter_rows(stream, fmt):
+            try:
+                chunk.append(parse_row(row, employees, table, company.currency))
+            except ImportRowError as e:
+                report['failed'] += 1
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    report['errors'].append({'row': line_no, 'message': str(e)})
+                continue
+            if len(chunk) >= chunk_size:
+                flush()
+    except (ValueError, csv.Error) as e:
+        report['errors'].append({'row': None, 'message': f'could not parse file: {e}'})
+        report['aborted'] = True
+
+    if chunk:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round((report['imported'] + report['failed']) / elapsed, 1) if elapsed else None
+    return report
+
+def insert_chunk(chunk, plan, managers, company, digests):
+    expense_rows = []
+    workflows = []
+    for employee, values in chunk:
+        manager = managers.get(employee.id) if plan.is_manager_first else None
+        approvals = plan.initial_approvals(manager)
+        current_step = plan.initial_step(approvals)
+        values.update({
+            'current_approval_step': current_step,
+            'approvals_total': len(approvals),
+            'current_step_pending': sum(1 for sequence, _, _ in approvals if sequence == current_step)
+        })
+        expense_rows.append(values)
+        workflows.append(approvals)
+
+    expense_ids = db.session.scalars(
+        db.insert(Expense).returning(Expense.id, sort_by_parameter_order=True),
+        expense_rows
+    ).all()
+
+    approval_rows = []
+    approval_expenses = []
+    counter_rows = []
+    summary_deltas = {}
+    for (employee, _), expense_id, values, approvals in zip(chunk, expense_ids, expense_rows, workflows):
+        expense = SimpleNamespace(id=expense_id, **values)
+        step_totals = {}
+        for sequence, approver, notify in approvals:
+            approval_rows.append({
+                'expense_id': expense_id,
+                'approver_id': approver.id,
+                'step_sequence': sequence,
+                'status': 'pending'
+            })
+            approval_expenses.append((expense, employee.full_name))
+            step_totals[sequence] = step_totals.get(sequence, 0) + 1
+            if notify:
+                digests.setdefault(approver.id, (approver, []))[1].append(
+                    (expense_id, values['amount_in_company_currency'])
+                )
+        counter_rows.extend(
+            {'expense_id': expense_id, 'step_sequence': sequence, 'total': total, 'approved': 0, 'rejected': 0}
+            for sequence, total in step_totals.items()
+        )
+
+        key = (company.id, values['employee_id'], 'pending', values['category'], values['expense_date'].strftime('%Y-%m'))
+        count, amount = summary_deltas.get(key, (0, 0.0))
+        summary_deltas[key] = (count + 1, amount + values['amount_in_company_currency'])
+
+    if approval_rows:
+        approval_ids = db.session.scalars(
+            db.insert(ExpenseApproval).returning(ExpenseApproval.id, sort_by_parameter_order=True),
+            approval_rows
+        ).all()
+        for approval_id, row, (expense, employee_name) in zip(approval_ids, approval_rows, approval_expenses):
+            publish_after_commit(db.session, row['approver_id'], 'approval_created', approval_payload(
+                approval_id, row['step_sequence'], expense, employee_name, company.currency
+            ))
+    index_expenses([
+        search_row(expense_id, company.id, values['employee_id'], values['description'], values['vendor_name'], values['category'])
+        for expense_id, values in zip(expense_ids, expense_rows)
+    ])
+    if counter_rows:
+        db.session.execute(db.insert(ExpenseStepCounter), counter_rows)
+    for (company_id, employee_id, status, category, month), (count, amount) in summary_deltas.items():
+        apply_delta({
+            'company_id': company_id,
+            'employee_id': employee_id,
+            'status': status,
+            'category': category,
+            'month': month
+        }, count, amount)
@@ -0,0 +1,190 @@
+import base64
+import re
+import sqlite3
+from models import db, Expense, OcrResult, User
+
+# FTS5 table keyed by rowid = Expense.id. company and employee hold a single
+# scoping token each ('c12', 'e34') so the company filter is answered by the
+# index itself instead of by joining every match back to users.
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS expense_search USING fts5("
+    "company, employee, description, vendor_name, category, ocr_text, "
+    "tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')"
+)
+INSERT_SQL = db.text(
+    "INSERT OR REPLACE INTO expense_search(rowid, company, employee, description, vendor_name, category, ocr_text) "
+    "VALUES (:rowid, :company, :employee, :description, :vendor_name, :category, :ocr_text)"
+)
+SEARCH_COLUMNS = '{description vendor_name category ocr_text}'
+# bm25 weight per column, scoping tokens excluded from the score.
+RANK = 'bm25(expense_search, 0.0, 0.0, 4.0, 3.0, 2.0, 1.0)'
+TERM_PATTERN = re.compile(r'\w+')
+MAX_TERMS = 8
+
+_fts5_compiled = None
+
+class SearchPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def search_available():
+    global _fts5_compiled
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    if _fts5_compiled is None:
+        connection = sqlite3.connect(':memory:')
+        try:
+            connection.execute('CREATE VIRTUAL TABLE probe USING fts5(x)')
+            _fts5_compiled = True
+        except sqlite3.OperationalError:
+            _fts5_compiled = False
+        finally:
+            connection.close()
+    return _fts5_compiled
+
+def create_search_index():
+    # Returns True when the table did not exist yet and needs a backfill.
+    exists = db.session.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'expense_search'"
+    )).first()
+    db.session.execute(db.text(CREATE_SQL))
+    return exists is None
+
+def search_row(expense_id, company_id, employee_id, description, vendor_name, category, ocr_text=None):
+    return {
+        'rowid': expense_id,
+        'company': f'c{company_id}',
+        'employee': f'e{employee_id}',
+        'description': description or '',
+        'vendor_name': vendor_name or '',
+        'category': category or '',
+        'ocr_text': ocr_text or ''
+    }
+
+def ocr_texts(receipt_paths):
+    from utils.receipt_store import content_hash_of
+
+    hashes = {path: content_hash_of(path) for path in receipt_paths if path}
+    if not hashes:
+        return {}
+    texts = dict(db.session.query(OcrResult.content_hash, OcrResult.raw_text).filter(
+        OcrResult.content_hash.in_(set(hashes.values()))
+    ).all())
+    return {path: texts.get(content_hash) for path, content_hash in hashes.items()}
+
+def index_expenses(rows):
+    if rows and search_available():
+        db.session.execute(INSERT_SQL, rows)
+
+def index_expense(expense, company_id):
+    # Called in the submit transaction. The OCR scan normally finishes while
+    # the form is being filled in, so its text is already in ocr_results.
+    ocr_text = ocr_texts([expense.receipt_path]).get(expense.receipt_path)
+    index_expenses([search_row(
+        expense.id, company_id, expense.employee_id, expense.description,
+        expense.vendor_name, expense.category, ocr_text
+    )])
+
+def attach_ocr_text(receipt_path, ocr_text):
+    # For a scan that finishes after its expense was submitted: the rows
+    # indexed without OCR text are written again with it.
+    if not search_available():
+        return 0
+    rows = db.session.query(
+        Expense.id, User.company_id, Expense.employee_id, Expense.description,
+        Expense.vendor_name, Expense.category
+    ).join(User, User.id == Expense.employee_id).filter(Expense.receipt_path == receipt_path).all()
+    index_expenses([search_row(*row, ocr_text) for row in rows])
+    return len(rows)
+
+def rebuild_search_index(batch_size=5000):
+    db.session.execute(db.text('DELETE FROM expense_search'))
+    last_id, indexed = 0, 0
+    while True:
+        batch = db.session.query(
+            Expense.id, User.company_id, Expense.employee_id, Expense.description,
+            Expense.vendor_name, Expense.category, Expense.receipt_path
+        ).join(User, User.id == Expense.employee_id).filter(
+            Expense.id > last_id
+        ).order_by(Expense.id).limit(batch_size).all()
+        if not batch:
+            break
+        texts = ocr_texts([row.receipt_path for row in batch])
+        db.session.execute(INSERT_SQL, [
+            search_row(*row[:6], texts.get(row.receipt_path)) for row in batch
+        ])
+        last_id = batch[-1].id
+        indexed += len(batch)
+    db.session.execute(db.text("INSERT INTO expense_search(expense_search) VALUES ('optimize')"))
+    return indexed
+
+def match_expression(query, company_id, employee_id=None):
+    # User input never reaches the FTS5 query parser as syntax: every word
+    # is quoted, and a trailing '*' turns the last one into a prefix.
+    terms = TERM_PATTERN.findall(query.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if query.rstrip().endswith('*') and len(terms[-1]) >= 2:
+        quoted[-1] += ' *'
+    expression = f'company : "c{company_id}"'
+    if employee_id is not None:
+        expression += f' AND employee : "e{employee_id}"'
+    return expression + f" AND {SEARCH_COLUMNS} : ({' AND '.join(quoted)})"
+
+def encode_search_cursor(score, row_id):
+    raw = f"{score!r}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_search_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return float(score), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def search_expenses(company_id, query, per_page, cursor=None, employee_id=None, team_of=None):
+    # Every match is ranked and pages are keyset-paginated on (score, id):
+    # the cursor holds the last pair served, so a later page starts right
+    # after it instead of re-ranking and skipping an OFFSET's worth of rows.
+    match = match_expression(query, company_id, employee_id)
+    if match is None:
+        return SearchPage([], None)
+
+    conditions, params = '', {'match': match, 'limit': per_page + 1}
+    if team_of is not None:
+        # A manager's search is limited to their reporting subtree, themselves
+        # included, through the same closure table the other team views join.
+        conditions += (' AND rowid IN (SELECT expenses.id FROM user_hierarchy JOIN expenses'
+                       ' ON expenses.employee_id = user_hierarchy.descendant_id'
+                       ' WHERE user_hierarchy.ancestor_id = :team_of)')
+        params['team_of'] = team_of
+    after = decode_search_cursor(cursor) if cursor else None
+    if after:
+        conditions += f' AND ({RANK} > :score OR ({RANK} = :score AND rowid > :row_id))'
+        params['score'], params['row_id'] = after
+
+    rows = db.session.execute(db.text(
+        f"SELECT rowid AS id, {RANK} AS score, "
+        f"snippet(expense_search, 5, '[', ']', '...', 10) AS ocr_snippet "
+        f"FROM expense_search WHERE expense_search MATCH :match{conditions} "
+        f"ORDER BY score, rowid LIMIT :limit"
+    ), params).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_search_cursor(rows[-1].score, rows[-1].id)
+    return SearchPage(rows, next_cursor)
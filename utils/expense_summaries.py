@@ -0,0 +1,114 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Expense, ExpenseSummary, User
+
+def summary_key(company_id, expense, status):
+    return {
+        'company_id': company_id,
+        'employee_id': expense.employee_id,
+        'status': status,
+        'category': expense.category,
+        'month': expense.expense_date.strftime('%Y-%m')
+    }
+
+def apply_delta(key, count, amount):
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = insert(ExpenseSummary).values(expense_count=count, total_amount=amount, **key)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={
+                'expense_count': ExpenseSummary.expense_count + statement.excluded.expense_count,
+                'total_amount': ExpenseSummary.total_amount + statement.excluded.total_amount
+            }
+        )
+        db.session.execute(statement)
+        return
+
+    summary = db.session.get(ExpenseSummary, tuple(key.values()))
+    if summary is None:
+        summary = ExpenseSummary(expense_count=0, total_amount=0, **key)
+        db.session.add(summary)
+    summary.expense_count += count
+    summary.total_amount += amount
+
+def record_new_expense(expense, company_id):
+    apply_delta(summary_key(company_id, expense, expense.status or 'pending'), 1, expense.amount_in_company_currency)
+
+def record_status_change(expense, company_id, old_status, new_status):
+    if old_status == new_status:
+        return
+    amount = expense.amount_in_company_currency
+    apply_delta(summary_key(company_id, expense, old_status), -1, -amount)
+    apply_delta(summary_key(company_id, expense, new_status), 1, amount)
+
+def record_status_changes(changes):
+    # changes: iterable of (expense, company_id, old_status, new_status)
+    deltas = {}
+    for expense, company_id, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        amount = expense.amount_in_company_currency
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            key = tuple(summary_key(company_id, expense, status).items())
+            count, total = deltas.get(key, (0, 0.0))
+            deltas[key] = (count + sign, total + sign * amount)
+
+    for key, (count, total) in deltas.items():
+        if count or total:
+            apply_delta(dict(key), count, total)
+
+def status_totals(criterion):
+    rows = db.session.query(
+        ExpenseSummary.status,
+        db.func.sum(ExpenseSummary.expense_count),
+        db.func.sum(ExpenseSummary.total_amount)
+    ).filter(criterion).group_by(ExpenseSummary.status).all()
+    return {status: {'count': count or 0, 'amount': round(amount or 0, 2)} for status, count, amount in rows}
+
+def company_status_totals(company_id):
+    return status_totals(ExpenseSummary.company_id == company_id)
+
+def employee_status_totals(employee_id):
+    return status_totals(ExpenseSummary.employee_id == employee_id)
+
+def rebuild_summaries(company_id=None):
+    month = db.func.strftime('%Y-%m', Expense.expense_date)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        month = db.func.to_char(Expense.expense_date, 'YYYY-MM')
+
+    query = db.session.query(
+        User.company_id,
+        Expense.employee_id,
+        Expense.status,
+        Expense.category,
+        month,
+        db.func.count(Expense.id),
+        db.func.sum(Expense.amount_in_company_currency)
+    ).join(User, Expense.employee_id == User.id).group_by(
+        User.company_id, Expense.employee_id, Expense.status, Expense.category, month
+    )
+
+    delete = db.delete(ExpenseSummary)
+    if company_id is not None:
+        query = query.filter(User.company_id == company_id)
+        delete = delete.where(ExpenseSummary.company_id == company_id)
+
+    rows = query.all()
+    db.session.execute(delete)
+    if not rows:
+        return 0
+
+    db.session.execute(db.insert(ExpenseSummary), [
+        {
+            'company_id': row_company_id,
+            'employee_id': employee_id,
+            'status': status,
+            'category': category,
+            'month': row_month,
+            'expense_count': count,
+            'total_amount': amount or 0
+        }
+        for row_company_id, employee_id, status, category, row_month, count, amount in rows
+    ])
+    return len(rows)
@@ -0,0 +1,122 @@
+from bisect import bisect_right
+from datetime import date as date_type
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, FxRate
+from config import Config
+from utils.exchange_rates import rate_cache
+
+_last_snapshot_date = None
+
+def record_rates(day, base_currency, rates):
+    # Runs in its own transaction so concurrent first submits of the day can
+    # race on uq_fx_rates_base_quote_date without failing either request:
+    # the loser's rows are simply skipped.
+    rows = [
+        {'date': day, 'base': base_currency, 'quote': quote, 'rate': rate}
+        for quote, rate in rates.items()
+    ]
+    if not rows:
+        return
+    with db.engine.begin() as connection:
+        dialect = connection.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            connection.execute(
+                insert(FxRate).on_conflict_do_nothing(index_elements=['base', 'quote', 'date']),
+                rows
+            )
+            return
+        existing = {
+            quote for (quote,) in connection.execute(
+                db.select(FxRate.quote).where(FxRate.base == base_currency, FxRate.date == day)
+            )
+        }
+        rows = [row for row in rows if row['quote'] not in existing]
+        if rows:
+            connection.execute(db.insert(FxRate), rows)
+
+def record_daily_snapshot():
+    # Call outside any open write transaction (after the request commits);
+    # on SQLite a second writer would otherwise wait on the request's lock.
+    global _last_snapshot_date
+    today = date_type.today()
+    if _last_snapshot_date == today:
+        return
+
+    table = rate_cache.get_table()
+    if table is None:
+        return
+    try:
+        record_rates(today, table.base_currency, table.rates)
+    except Exception as e:
+        print(f"Exchange rate snapshot error: {e}")
+        return
+    _last_snapshot_date = today
+
+def load_rate_history(currencies, start_date, end_date, base_currency=None):
+    base_currency = base_currency or Config.CURRENCY_RATE_BASE
+    quotes = set(currencies) - {base_currency}
+
+    history = {base_currency: ([date_type.min], [1.0])}
+    if not quotes:
+        return history
+
+    # Pull the last known rate before start_date as well, so the first rows of
+    # the range still resolve when no rate was recorded on that exact day.
+    floor_dates = dict(db.session.query(FxRate.quote, db.func.max(FxRate.date)).filter(
+        FxRate.base == base_currency,
+        FxRate.quote.in_(quotes),
+        FxRate.date <= start_date
+    ).group_by(FxRate.quote).all())
+    lower_bound = min(floor_dates.values()) if floor_dates else start_date
+
+    rows = db.session.query(FxRate.quote, FxRate.date, FxRate.rate).filter(
+        FxRate.base == base_currency,
+        FxRate.quote.in_(quotes),
+        FxRate.date >= lower_bound,
+        FxRate.date <= end_date
+    ).order_by(FxRate.quote, FxRate.date).all()
+
+    for quote, day, rate in rows:
+        dates, rates = history.setdefault(quote, ([], []))
+        dates.append(day)
+        rates.append(rate)
+    return history
+
+def rate_on(history, currency, day):
+    series = history.get(currency)
+    if not series:
+        return None
+    dates, rates = series
+    idx = bisect_right(dates, day) - 1
+    if idx < 0:
+        return None
+    return rates[idx]
+
+def convert_many(rows, to_currency, base_currency=None):
+    rows = list(rows)
+    if not rows:
+        return []
+
+    currencies = {currency for _, currency, _ in rows}
+    currencies.add(to_currency)
+    days = [day for _, _, day in rows]
+    history = load_rate_history(currencies, min(days), max(days), base_currency)
+
+    factors = {}
+    for _, currency, day in rows:
+        key = (currency, day)
+        if key in factors:
+            continue
+        if currency == to_currency:
+            factors[key] = 1.0
+            continue
+        from_rate = rate_on(history, currency, day)
+        to_rate = rate_on(history, to_currency, day)
+        factors[key] = to_rate / from_rate if from_rate and to_rate else None
+
+    results = []
+    for amount, currency, day in rows:
+        factor = factors[(currency, day)]
+        results.append(round(amount * factor, 2) if factor is not None else None)
+    return results
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask_login import UserMixin
+from config import Config
+from models import db, Company, User
+from utils.approval_plans import snapshot_user
+
+CompanySnapshot = namedtuple('CompanySnapshot', ['id', 'name', 'country', 'currency'])
+
+class CachedUser(UserMixin):
+    # Detached, read-only stand-in for the logged-in User. Views only read
+    # identity fields from current_user; anything that writes loads the row.
+    __slots__ = (
+        'id', 'email', 'full_name', 'role', 'company_id', 'manager_id',
+        'is_verified', 'company', 'manager', 'subordinates', 'version'
+    )
+
+    def __init__(self, user):
+        self.id = user.id
+        self.email = user.email
+        self.full_name = user.full_name
+        self.role = user.role
+        self.company_id = user.company_id
+        self.manager_id = user.manager_id
+        self.is_verified = user.is_verified
+        self.company = CompanySnapshot(user.company.id, user.company.name, user.company.country, user.company.currency)
+        self.manager = snapshot_user(user.manager)
+        self.subordinates = tuple(snapshot_user(subordinate) for subordinate in user.subordinates)
+        self.version = user.company.identity_version
+
+    def __repr__(self):
+        return f'<CachedUser {self.id} v{self.version}>'
+
+class IdentityCache:
+    # Snapshots are shared per process, but every lookup first reads the
+    # company's identity_version (one primary-key query), so a change made
+    # through any worker process retires them everywhere on its next request.
+    def __init__(self, ttl=60, max_size=4096):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0, 'deleted': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        version = db.session.scalar(
+            db.select(Company.identity_version).join(User, User.company_id == Company.id).where(User.id == user_id)
+        )
+        with self._lock:
+            if version is None:
+                if self._entries.pop(user_id, None) is not None:
+                    self.stats['deleted'] += 1
+                return None
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                snapshot, loaded_at = entry
+                if snapshot.version == version and time.monotonic() - loaded_at < self.ttl:
+                    self._entries.move_to_end(user_id)
+                    self.stats['hits'] += 1
+                    return snapshot
+                del self._entries[user_id]
+                self.stats['expired'] += 1
+            self.stats['misses'] += 1
+
+        user = User.query.options(
+            db.joinedload(User.company),
+            db.joinedload(User.manager),
+            db.selectinload(User.subordinates)
+        ).filter_by(id=user_id).first()
+        if user is None:
+            return None
+
+        snapshot = CachedUser(user)
+        with self._lock:
+            self._entries[user_id] = (snapshot, time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return snapshot
+
+    def invalidate(self, company_id):
+        # Bumping the company version retires every snapshot in it, which
+        # covers the manager and team links that change along with one user.
+        # Runs in the caller's transaction, so call it before the commit.
+        db.session.execute(
+            db.update(Company).where(Company.id == company_id)
+            .values(identity_version=Company.identity_version + 1)
+        )
+        with self._lock:
+            self.stats['invalidations'] += 1
+
+identity_cache = IdentityCache(ttl=Config.IDENTITY_CACHE_TTL, max_size=Config.IDENTITY_CACHE_SIZE)
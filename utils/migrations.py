@@ -0,0 +1,66 @@
+from models import db, Expense, ExpenseSummary
+from utils.approval_counters import rebuild_counters
+from utils.expense_search import search_available, create_search_index, rebuild_search_index
+from utils.expense_summaries import rebuild_summaries
+from utils.team_hierarchy import hierarchy_out_of_date, rebuild_hierarchy
+
+def add_missing_columns():
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ''
+            not_null = ' NOT NULL' if not column.nullable and default else ''
+            db.session.execute(db.text(
+                f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}{not_null}'
+            ))
+            added.append(f'{table.name}.{column.name}')
+
+    db.session.commit()
+    return added
+
+def create_missing_indexes():
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(db.engine)
+                created.append(index.name)
+    return created
+
+def upgrade_schema():
+    added = add_missing_columns()
+    create_missing_indexes()
+
+    if not db.session.query(ExpenseSummary.company_id).first() and db.session.query(Expense.id).first():
+        rebuild_summaries()
+        db.session.commit()
+
+    if 'expenses.approvals_total' in added:
+        rebuild_counters()
+        db.session.commit()
+
+    if hierarchy_out_of_date():
+        rebuild_hierarchy()
+        db.session.commit()
+
+    if search_available() and create_search_index():
+        if db.session.query(Expense.id).first():
+            rebuild_search_index()
+        db.session.commit()
+
+    return added
@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+from config import Config
+from models import db, OcrResult
+
+class OcrCache:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'db_hits': 0, 'misses': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, content_hash):
+        with self._lock:
+            if content_hash in self._entries:
+                self._entries.move_to_end(content_hash)
+                self.stats['hits'] += 1
+                return self._entries[content_hash]
+
+        row = db.session.get(OcrResult, content_hash)
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['db_hits'] += 1
+        data = {
+            'amount': row.amount,
+            'date': row.date,
+            'vendor': row.vendor,
+            'description': row.description,
+            'raw_text': row.raw_text
+        }
+        self._remember(content_hash, data)
+        return data
+
+    def put(self, content_hash, data):
+        self._remember(content_hash, data)
+        if db.session.get(OcrResult, content_hash) is None:
+            db.session.add(OcrResult(
+                content_hash=content_hash,
+                amount=data.get('amount'),
+                date=data.get('date'),
+                vendor=data.get('vendor'),
+                description=data.get('description'),
+                raw_text=data.get('raw_text')
+            ))
+
+    def _remember(self, content_hash, data):
+        with self._lock:
+            self._entries[content_hash] = data
+            self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+ocr_cache = OcrCache(Config.OCR_CACHE_SIZE)
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+from utils.ocr_utils import extract_receipt_data
+
+class QueueFullError(Exception):
+    pass
+
+class OcrJob:
+    def __init__(self, user_id, filepath, content_hash, future, timeout):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.filepath = filepath
+        self.content_hash = content_hash
+        self.future = future
+        self.timeout = timeout
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self.cancelled = False
+        self.timed_out = False
+
+    @property
+    def status(self):
+        # A process pool can only drop jobs that haven't started, so a job
+        # that is cancelled or runs past its deadline mid-scan keeps its
+        # worker busy; it reports 'cancelling'/'running' until that worker is
+        # actually free again.
+        self.expire()
+        if self.future.cancelled():
+            return 'timeout' if self.timed_out else 'cancelled'
+        if not self.future.done():
+            if self.cancelled:
+                return 'cancelling'
+            return 'running' if self.future.running() else 'queued'
+        if self.cancelled:
+            return 'cancelled'
+        if self.future.exception() is not None:
+            return 'failed'
+        if self.future.result() is None:
+            return 'failed'
+        return 'done'
+
+    def expire(self, now=None):
+        # Drops a job still waiting for a worker once it is past its
+        # deadline; returns True if this call timed it out.
+        if self.future.done() or (now or time.monotonic()) - self.submitted_at <= self.timeout:
+            return False
+        if not self.future.cancel():
+            return False
+        self.timed_out = True
+        return True
+
+    def result(self):
+        if self.status != 'done':
+            return None
+        return self.future.result()
+
+class OcrJobQueue:
+    # Jobs live in this process only: polls have to reach the web process
+    # that accepted the scan (see "OCR scans" in the README).
+    def __init__(self, workers=None, max_queue=32, job_timeout=60, retention=600):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.retention = retention
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, filepath, content_hash=None, on_result=None):
+        with self._lock:
+            self._prune()
+            if self.depth() >= self.max_queue:
+                raise QueueFullError('OCR queue is full')
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            future = self._executor.submit(extract_receipt_data, filepath, self.job_timeout)
+            job = OcrJob(user_id, filepath, content_hash, future, self.job_timeout)
+            future.add_done_callback(lambda f: self._finished(job, on_result))
+            self._jobs[job.id] = job
+            return job
+
+    def _finished(self, job, on_result):
+        # Runs on the pool's result thread as soon as the scan ends, whether
+        # or not anyone is still polling the job.
+        job.finished_at = time.monotonic()
+        if on_result is None or job.status != 'done':
+            return
+        try:
+            on_result(job)
+        except Exception as e:
+            print(f"OCR result handler error for job {job.id}: {e}")
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job.future.done():
+            return False
+        job.cancelled = True
+        return job.future.cancel()
+
+    def depth(self):
+        # Every unfinished future holds a slot, including cancelled or
+        # overdue jobs whose worker is still busy with them.
+        return sum(1 for job in self._jobs.values() if not job.future.done())
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _prune(self):
+        # Deadlines are enforced here too, so an overdue job nobody polls
+        # gives its slot back on the next submit.
+        now = time.monotonic()
+        for job in list(self._jobs.values()):
+            job.expire(now)
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.future.done() and (
+                (job.finished_at or job.submitted_at + self.job_timeout) + self.retention < now
+                or job.cancelled or job.timed_out
+            )
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+ocr_job_queue = OcrJobQueue(
+    workers=Config.OCR_WORKERS,
+    max_queue=Config.OCR_MAX_QUEUE,
+    job_timeout=Config.OCR_JOB_TIMEOUT,
+    retention=Config.OCR_JOB_RETENTION
+)
@@ -0,0 +1,112 @@
+import time
+from contextlib import contextmanager
+import pytesseract
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+from config import Config
+
+@contextmanager
+def stage_timer(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def iter_pages(path, timings):
+    if path.lower().endswith('.pdf'):
+        yield from iter_pdf_pages(path, timings)
+        return
+
+    with stage_timer(timings, 'load'):
+        image = Image.open(path)
+        full_width = image.width
+        if image.format == 'JPEG':
+            # Let the JPEG decoder drop resolution while decoding instead of
+            # materialising the full phone-camera frame first.
+            scale = Config.OCR_MAX_DIMENSION / max(image.size)
+            if scale < 1:
+                image.draft('RGB', (round(image.width * scale), round(image.height * scale)))
+        image.load()
+        if image.width != full_width and 'dpi' in image.info:
+            # draft() decodes at 1/2, 1/4 or 1/8 scale; the header dpi still
+            # describes the full frame, and downscale() would otherwise
+            # shrink the page below OCR_TARGET_DPI a second time.
+            factor = image.width / full_width
+            image.info['dpi'] = tuple(value * factor for value in image.info['dpi'])
+    yield image
+
+def iter_pdf_pages(path, timings):
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        for index in range(min(len(pdf), Config.OCR_PDF_MAX_PAGES)):
+            with stage_timer(timings, 'rasterize'):
+                page = pdf[index]
+                scale = min(Config.OCR_TARGET_DPI / 72, Config.OCR_MAX_DIMENSION / max(page.get_size()))
+                image = page.render(scale=scale).to_pil()
+                page.close()
+            yield image
+    finally:
+        pdf.close()
+
+def preprocess_image(image, timings):
+    with stage_timer(timings, 'rotate'):
+        image = ImageOps.exif_transpose(image)
+        if Config.OCR_AUTO_ROTATE:
+            image = rotate_upright(image)
+
+    with stage_timer(timings, 'downscale'):
+        image = downscale(image)
+
+    with stage_timer(timings, 'grayscale'):
+        image = ImageOps.autocontrast(image.convert('L'))
+
+    with stage_timer(timings, 'crop'):
+        image = crop_to_receipt(image)
+
+    with stage_timer(timings, 'threshold'):
+        image = adaptive_threshold(image, Config.OCR_THRESHOLD_RADIUS, Config.OCR_THRESHOLD_OFFSET)
+
+    return image
+
+def rotate_upright(image):
+    try:
+        osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+    except Exception:
+        return image
+    angle = osd.get('rotate', 0)
+    return image.rotate(-angle, expand=True) if angle else image
+
+def downscale(image):
+    dpi = image.info.get('dpi', (0, 0))[0]
+    if dpi and dpi > Config.OCR_TARGET_DPI:
+        scale = Config.OCR_TARGET_DPI / dpi
+    else:
+        scale = Config.OCR_MAX_DIMENSION / max(image.size)
+
+    if scale >= 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+def crop_to_receipt(image, margin=10):
+    paper = image.point(lambda p: 255 if p > 160 else 0).filter(ImageFilter.MinFilter(5))
+    bbox = paper.getbbox()
+    if not bbox:
+        return image
+
+    left, top, right, bottom = bbox
+    if (right - left) * (bottom - top) < image.width * image.height * 0.2:
+        return image
+    return image.crop((
+        max(0, left - margin),
+        max(0, top - margin),
+        min(image.width, right + margin),
+        min(image.height, bottom + margin)
+    ))
+
+def adaptive_threshold(image, radius, offset):
+    local_mean = image.filter(ImageFilter.BoxBlur(radius))
+    darker_than_mean = ImageChops.subtract(local_mean, image)
+    return darker_than_mean.point(lambda p: 0 if p > offset else 255)
@@ -1,19 +1,33 @@
 import pytesseract
-from PIL import Image
-import re
-from datetime import datetime
+from utils.receipt_parser import has_total, parse_receipt
+from utils.ocr_preprocess import iter_pages, preprocess_image, stage_timer
 
-def extract_receipt_data(image_path):
+def extract_receipt_data(image_path, timeout=0):
     try:
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image)
+        timings = {}
+        page_texts = []
+        
+        for page in iter_pages(image_path, timings):
+            image = preprocess_image(page, timings)
+            with stage_timer(timings, 'tesseract'):
+                page_text = pytesseract.image_to_string(image, timeout=timeout)
+            page_texts.append(page_text)
+            
+            # Stop at the page carrying the total; line-item prices on an
+            # earlier page parse as amounts too but are not the answer.
+            if has_total(parse_receipt(page_text)):
+                break
+        
+        text = '\n'.join(page_texts)
+        parsed = parse_receipt(text)
         
         extracted_data = {
-            'amount': extract_amount(text),
-            'date': extract_date(text),
-            'vendor': extract_vendor(text),
+            'amount': parsed['amount'],
+            'date': parsed['date'],
+            'vendor': parsed['vendor'],
             'description': text[:200] if text else '',
-            'raw_text': text
+            'raw_text': text,
+            'timings': timings
         }
         
         return extracted_data
@@ -22,43 +36,10 @@ def extract_receipt_data(image_path):
         return None
 
 def extract_amount(text):
-    patterns = [
-        r'(?:total|amount|sum)[:\s]*[\$\£\€]?\s*(\d+(?:\.\d{2})?)',
-        r'[\$\£\€]\s*(\d+(?:\.\d{2})?)',
-        r'(\d+\.\d{2})\s*(?:total|amount)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            try:
-                return float(match.group(1))
-            except:
-                continue
-    return None
+    return parse_receipt(text)['amount']
 
 def extract_date(text):
-    patterns = [
-        r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'(\d{4}[/-]\d{1,2}[/-]\d{1,2})',
-        r'(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{2,4})',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            date_str = match.group(1)
-            for fmt in ['%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d %B %Y', '%d %b %Y']:
-                try:
-                    return datetime.strptime(date_str, fmt).date()
-                except:
-                    continue
-    return None
+    return parse_receipt(text)['date']
 
 def extract_vendor(text):
-    lines = text.split('\n')
-    for line in lines[:5]:
-        line = line.strip()
-        if line and len(line) > 3 and not re.match(r'^\d', line):
-            return line[:100]
-    return None
+    return parse_receipt(text)['vendor']
@@ -0,0 +1,91 @@
+import base64
+from datetime import datetime
+from flask import abort, request, current_app, stream_template
+from models import db
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, sort):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.sort = sort
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def encode_cursor(submitted_at, row_id):
+    raw = f"{submitted_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        submitted_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        submitted_at, row_id = datetime.fromisoformat(submitted_at), int(row_id)
+    except (ValueError, UnicodeError):
+        return None
+    # An id outside a 64-bit column would only fail later, in the driver.
+    if not 0 <= row_id < 2 ** 63:
+        return None
+    return submitted_at, row_id
+
+def page_size():
+    per_page = request.args.get('per_page', type=int) or current_app.config['PAGE_SIZE']
+    return max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+
+def sort_order():
+    return 'oldest' if request.args.get('sort') == 'oldest' else 'newest'
+
+def order_keyset(query, time_column, id_column, sort):
+    if sort == 'oldest':
+        return query.order_by(time_column.asc(), id_column.asc())
+    return query.order_by(time_column.desc(), id_column.desc())
+
+def keyset_paginate(query, time_column, id_column, key_of):
+    sort = sort_order()
+    per_page = page_size()
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor = decode_cursor(cursor)
+        if cursor is None:
+            abort(400, description='Invalid cursor')
+        cursor_time, cursor_id = cursor
+        if sort == 'oldest':
+            query = query.filter(db.or_(
+                time_column > cursor_time,
+                db.and_(time_column == cursor_time, id_column > cursor_id)
+            ))
+        else:
+            query = query.filter(db.or_(
+                time_column < cursor_time,
+                db.and_(time_column == cursor_time, id_column < cursor_id)
+            ))
+
+    rows = order_keyset(query, time_column, id_column, sort).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(*key_of(rows[-1]))
+    return KeysetPage(rows, next_cursor, sort)
+
+def apply_expense_filters(query, expense_model):
+    status = request.args.get('status')
+    if status:
+        query = query.filter(expense_model.status == status)
+    category = request.args.get('category')
+    if category:
+        query = query.filter(expense_model.category == category)
+    return query
+
+def wants_stream():
+    return request.args.get('stream') == '1'
+
+def stream_listing(template_name, **context):
+    return stream_template(template_name, **context)
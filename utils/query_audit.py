@@ -0,0 +1,111 @@
+import threading
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+class FullTableScanError(AssertionError):
+    pass
+
+class QueryPlanAuditor:
+    def __init__(self, engine, strict=False, allowed_tables=()):
+        self.engine = engine
+        self.strict = strict
+        self.allowed_tables = set(allowed_tables)
+        self.violations = []
+        self._local = threading.local()
+
+    def install(self):
+        if self.engine.dialect.name != 'sqlite':
+            return self
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def uninstall(self):
+        if event.contains(self.engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def reset(self):
+        self.violations = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not has_request_context() or getattr(self._local, 'explaining', False):
+            return
+        if not statement.lstrip().upper().startswith('SELECT'):
+            return
+
+        self._local.explaining = True
+        try:
+            plan_cursor = conn.connection.cursor()
+            try:
+                plan_cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+                plan = [row[-1] for row in plan_cursor.fetchall()]
+            finally:
+                plan_cursor.close()
+        finally:
+            self._local.explaining = False
+
+        scans = [detail for detail in plan if self._is_full_scan(detail)]
+        if not scans:
+            return
+
+        violation = {'endpoint': request.endpoint, 'statement': statement, 'plan': plan, 'scans': scans}
+        self.violations.append(violation)
+        if self.strict:
+            raise FullTableScanError(f"Full table scan in {request.endpoint}: {scans} for {statement}")
+
+    def _is_full_scan(self, detail):
+        parts = detail.split()
+        if len(parts) < 2 or parts[0] != 'SCAN':
+            return False
+        if 'VIRTUAL TABLE' in detail:
+            # FTS5 reports every MATCH as 'SCAN <table> VIRTUAL TABLE INDEX
+            # ...'; the module answers it from its own index.
+            return False
+        table = parts[1]
+        return table not in self.allowed_tables and table != 'CONSTANT' and not table.startswith('(')
+
+def install_query_plan_auditor(app, engine):
+    auditor = QueryPlanAuditor(
+        engine,
+        strict=app.config['QUERY_PLAN_AUDIT_STRICT'],
+        allowed_tables=app.config['QUERY_PLAN_AUDIT_ALLOWED_TABLES']
+    ).install()
+    app.extensions['query_plan_auditor'] = auditor
+    return auditor
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def install(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def uninstall(self):
+        if event.contains(self.engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+
+def install_query_counter(app, engine):
+    counter = QueryCounter(engine).install()
+    app.extensions['query_counter'] = counter
+
+    @app.after_request
+    def add_query_count_header(response):
+        if not response.is_streamed:
+            response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+            return response
+
+        # Headers of a streamed response (stream_template, exports) go out
+        # before its body runs most of the queries, so no X-Query-Count is
+        # sent; the total is logged once the body has been sent instead.
+        request_globals = g._get_current_object()
+        endpoint = request.endpoint
+        response.call_on_close(lambda: app.logger.info(
+            'X-Query-Count %s (streamed): %d', endpoint, request_globals.get('query_count', 0)
+        ))
+        return response
+
+    return counter
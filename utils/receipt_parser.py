@@ -0,0 +1,187 @@
+import re
+from datetime import date
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+AMOUNT_KEYWORDS = {
+    'grand total': 0.9,
+    'total due': 0.85,
+    'amount due': 0.85,
+    'balance due': 0.85,
+    'total': 0.8,
+    'amount': 0.6,
+    'sum': 0.6,
+    'net': 0.4,
+    'subtotal': 0.35,
+    'sub total': 0.35,
+    'tax': -0.5,
+    'vat': -0.5,
+    'gst': -0.5,
+    'change': -0.6,
+    'cash': -0.3,
+    'tip': -0.4,
+}
+
+TOTAL_KEYWORDS = {'grand total', 'total due', 'amount due', 'balance due', 'total'}
+
+CURRENCY_SYMBOLS = '$£€¥₹₩₽₺₪₫฿₱₦₴'
+CURRENCY_CODES = ('USD', 'EUR', 'GBP', 'INR', 'JPY', 'AUD', 'CAD', 'CHF', 'CNY', 'SGD', 'AED', 'Rs', 'R\\$', 'kr')
+
+MONTH_NAME = r'(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?'
+# Plain spaces only count as group separators in front of a decimal comma
+# ("1 234,56"); elsewhere "1 250.00" is far more often a quantity and a price.
+NUMBER = r'\d{1,3}(?: \d{3})+,\d{1,2}|\d{1,3}(?:[,.\u00a0\u202f]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?'
+
+TOKEN_PATTERN = re.compile(
+    r'(?P<date_iso>\b\d{4}[/.-]\d{1,2}[/.-]\d{1,2}\b)'
+    r'|(?P<date_num>\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b)'
+    rf'|(?P<date_dmy>\b\d{{1,2}}(?:st|nd|rd|th)?\s+{MONTH_NAME},?\s+\d{{2,4}}\b)'
+    rf'|(?P<date_mdy>\b{MONTH_NAME}\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{2,4}}\b)'
+    r'|(?P<keyword>\b(?:' + '|'.join(k.replace(' ', r'\s+') for k in sorted(AMOUNT_KEYWORDS, key=len, reverse=True)) + r')\b)'
+    r'|(?P<currency>[' + CURRENCY_SYMBOLS + r']|\b(?:' + '|'.join(CURRENCY_CODES) + r')(?![a-z]))'
+    rf'|(?P<number>(?<![\d.,]){NUMBER})',
+    re.IGNORECASE
+)
+
+DECIMAL_SUFFIX = re.compile(r'[.,]\d{1,2}$')
+DATE_SEPARATOR = re.compile(r'[/.-]')
+DATE_WORDS = re.compile(r'[a-z]+|\d+')
+WHITESPACE = re.compile(r'\s+')
+VENDOR_NOISE = re.compile(r'\b(?:receipt|invoice|tel|phone|gst|vat|tax)\b|www\.|http|@', re.IGNORECASE)
+
+def parse_number(token):
+    token = token.replace(' ', '').replace('\u00a0', '').replace('\u202f', '')
+    last_comma = token.rfind(',')
+    last_dot = token.rfind('.')
+    decimal_at = max(last_comma, last_dot)
+
+    if decimal_at == -1:
+        return float(token)
+
+    if last_comma != -1 and last_dot != -1:
+        integer, fraction = token[:decimal_at], token[decimal_at + 1:]
+    elif len(token) - decimal_at - 1 == 3:
+        integer, fraction = token, ''
+    else:
+        integer, fraction = token[:decimal_at], token[decimal_at + 1:]
+
+    integer = integer.replace(',', '').replace('.', '')
+    return float(f"{integer}.{fraction}" if fraction else integer)
+
+def parse_date_token(kind, token, day_first=True):
+    try:
+        if kind == 'date_iso':
+            year, month, day = (int(p) for p in DATE_SEPARATOR.split(token))
+        elif kind == 'date_num':
+            first, second, year = (int(p) for p in DATE_SEPARATOR.split(token))
+            if first > 12 or (day_first and second <= 12):
+                day, month = first, second
+            else:
+                month, day = first, second
+        else:
+            parts = DATE_WORDS.findall(token.lower())
+            numbers = [int(p) for p in parts if p.isdigit()]
+            month = next(MONTHS[p[:3]] for p in parts if p[:3] in MONTHS)
+            day, year = numbers[0], numbers[-1]
+
+        if year < 100:
+            year += 2000
+        return date(year, month, day)
+    except (ValueError, StopIteration, IndexError):
+        return None
+
+def parse_receipt(text, day_first=True):
+    amounts = []
+    dates = []
+    vendors = []
+    carried_keyword = None
+    carried_total = False
+
+    for line_no, line in enumerate(text.splitlines()):
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        keyword_score = None
+        is_total = False
+        last_currency_end = None
+        line_amounts = []
+
+        for match in TOKEN_PATTERN.finditer(stripped):
+            kind = match.lastgroup
+            token = match.group(kind)
+
+            if kind == 'keyword':
+                keyword = WHITESPACE.sub(' ', token.lower())
+                score = AMOUNT_KEYWORDS[keyword]
+                is_total = is_total or keyword in TOTAL_KEYWORDS
+                keyword_score = score if keyword_score is None else max(keyword_score, score)
+            elif kind == 'currency':
+                last_currency_end = match.end()
+            elif kind == 'number':
+                has_decimals = DECIMAL_SUFFIX.search(token) is not None
+                near_currency = last_currency_end is not None and match.start() - last_currency_end <= 1
+                line_amounts.append((token, has_decimals, near_currency, match.start()))
+            else:
+                parsed = parse_date_token(kind, token, day_first)
+                if parsed:
+                    confidence = 0.9 if kind in ('date_iso', 'date_dmy', 'date_mdy') else 0.7
+                    dates.append({'value': parsed, 'confidence': confidence, 'line': line_no})
+
+        effective_keyword = keyword_score
+        effective_total = is_total
+        if effective_keyword is None and carried_keyword is not None:
+            effective_keyword = carried_keyword - 0.1
+            effective_total = carried_total
+
+        for token, has_decimals, near_currency, _ in line_amounts:
+            if not has_decimals and not near_currency and effective_keyword is None:
+                continue
+            try:
+                value = parse_number(token)
+            except ValueError:
+                continue
+
+            confidence = 0.2 if has_decimals else 0.1
+            if near_currency:
+                confidence += 0.2
+            if effective_keyword is not None:
+                confidence += effective_keyword
+            if confidence > 0:
+                amounts.append({
+                    'value': value,
+                    'confidence': round(min(confidence, 1.0), 2),
+                    'line': line_no,
+                    'total': effective_total
+                })
+
+        carried_keyword = keyword_score if keyword_score is not None and not line_amounts else None
+        carried_total = is_total and carried_keyword is not None
+
+        if line_no < 5 and len(stripped) > 3 and not stripped[0].isdigit():
+            letters = sum(c.isalpha() for c in stripped)
+            if letters >= 3 and keyword_score is None and not line_amounts and not VENDOR_NOISE.search(stripped):
+                confidence = 0.8 - 0.15 * len(vendors) - 0.3 * (1 - letters / len(stripped))
+                vendors.append({'value': stripped[:100], 'confidence': round(max(confidence, 0.05), 2), 'line': line_no})
+
+    return {
+        'amount': best_candidate(amounts, prefer_larger=True),
+        'date': best_candidate(dates),
+        'vendor': best_candidate(vendors),
+        'amounts': amounts,
+        'dates': dates,
+        'vendors': vendors
+    }
+
+def has_total(parsed):
+    return any(candidate['total'] for candidate in parsed['amounts'])
+
+def best_candidate(candidates, prefer_larger=False):
+    if not candidates:
+        return None
+    if prefer_larger:
+        return max(candidates, key=lambda c: (c['confidence'], c['value']))['value']
+    return max(candidates, key=lambda c: (c['confidence'], -c['line']))['value']
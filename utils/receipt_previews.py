@@ -0,0 +1,109 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, features
+from config import Config
+from utils.receipt_store import content_hash_of, derivative_key, receipt_store
+
+VARIANTS = {
+    'thumb': Config.RECEIPT_THUMB_SIZE,
+    'preview': Config.RECEIPT_PREVIEW_SIZE,
+}
+PREVIEW_FORMAT = 'webp' if features.check('webp') else 'jpeg'
+PREVIEW_EXTENSION = 'webp' if PREVIEW_FORMAT == 'webp' else 'jpg'
+PREVIEW_MIMETYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+# Stands in for a PDF's preview while its first page is still rendering.
+PENDING_PLACEHOLDER = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="320" height="400" viewBox="0 0 320 400">'
+    '<rect width="320" height="400" fill="#f1f3f5"/>'
+    '<text x="160" y="200" font-family="sans-serif" font-size="16" fill="#868e96" text-anchor="middle">'
+    'Preview pending</text></svg>'
+)
+
+def open_first_page(filepath, max_dimension):
+    if filepath.lower().endswith('.pdf'):
+        import pypdfium2
+
+        pdf = pypdfium2.PdfDocument(filepath)
+        try:
+            page = pdf[0]
+            image = page.render(scale=max_dimension / max(page.get_size())).to_pil()
+            page.close()
+        finally:
+            pdf.close()
+        return image
+
+    image = Image.open(filepath)
+    if image.format == 'JPEG':
+        image.draft('RGB', (max_dimension, max_dimension))
+    image.load()
+    return ImageOps.exif_transpose(image)
+
+def render_derivatives(store, receipt_path):
+    # Decodes the original once at preview size and writes every variant
+    # from that, largest first.
+    content_hash = content_hash_of(receipt_path)
+    image = open_first_page(store.local_path(receipt_path), max(VARIANTS.values()))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    written = {}
+    for variant, size in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+        fd, temp_path = tempfile.mkstemp(dir=store.scratch_folder, prefix='.preview-')
+        with os.fdopen(fd, 'wb') as out:
+            image.save(out, PREVIEW_FORMAT.upper(), quality=Config.RECEIPT_PREVIEW_QUALITY, optimize=True)
+        written[variant] = store.put_derivative(temp_path, content_hash, variant, PREVIEW_EXTENSION)
+    return written
+
+class PreviewGenerator:
+    def __init__(self, store, workers=2):
+        self.store = store
+        self.workers = workers
+        self.stats = {'submitted': 0, 'rendered': 0, 'errors': 0}
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, receipt_path):
+        content_hash = content_hash_of(receipt_path)
+        with self._lock:
+            future = self._pending.get(content_hash)
+            if future is not None:
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='receipt-preview')
+            future = self._executor.submit(self._render, receipt_path)
+            self._pending[content_hash] = future
+            self.stats['submitted'] += 1
+        future.add_done_callback(lambda f: self._pending.pop(content_hash, None))
+        return future
+
+    def _render(self, receipt_path):
+        try:
+            written = render_derivatives(self.store, receipt_path)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Receipt preview error for {receipt_path}: {e}")
+            return None
+        self.stats['rendered'] += 1
+        return written
+
+    def lookup(self, receipt_path, variant):
+        # Serving path: never waits on a render. Returns the finished
+        # derivative, or None once a render is queued (or already running).
+        key = derivative_key(content_hash_of(receipt_path), variant, PREVIEW_EXTENSION)
+        path = self.store.backend.local_path(key)
+        if path is not None and os.path.exists(path):
+            return path
+        self.submit(receipt_path)
+        return None
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+preview_generator = PreviewGenerator(receipt_store, workers=Config.RECEIPT_PREVIEW_WORKERS)
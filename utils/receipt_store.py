@@ -0,0 +1,348 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from config import Config
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of every receipt type we accept, mapped to the extension the
+# stored file gets. The client's filename is only a hint.
+MAGIC_NUMBERS = [
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'%PDF-', 'pdf'),
+]
+SNIFF_BYTES = max(len(magic) for magic, _ in MAGIC_NUMBERS)
+DERIVATIVES_PREFIX = 'derivatives/'
+# The only receipt_path a client may hand back: a shard key as receipt_key
+# builds it, for one of the extensions MAGIC_NUMBERS produces.
+RECEIPT_KEY_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.(png|jpe?g|gif|pdf)$')
+
+class ReceiptRejected(ValueError):
+    pass
+
+def sniff_type(head):
+    for magic, extension in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return extension
+    return None
+
+def spool_upload(file, scratch_folder, max_bytes=None):
+    # Streams the upload to a temp file in fixed-size chunks, hashing as it
+    # goes, and stops as soon as the size cap is crossed.
+    fd, temp_path = tempfile.mkstemp(dir=scratch_folder, prefix='.upload-')
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if extension is None:
+                    while len(chunk) < SNIFF_BYTES:
+                        more = file.stream.read(SNIFF_BYTES - len(chunk))
+                        if not more:
+                            break
+                        chunk += more
+                    extension = sniff_type(chunk)
+                    if extension is None:
+                        raise ReceiptRejected('Receipt must be a PNG, JPEG, GIF or PDF file')
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise ReceiptRejected(f'Receipt is larger than the {max_bytes // 1024} KB limit')
+                digest.update(chunk)
+                out.write(chunk)
+        if extension is None:
+            raise ReceiptRejected('Receipt file is empty')
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), extension
+
+def shard_key(filename):
+    # Two levels of two hex characters keep every directory (or listing
+    # prefix) to a few hundred entries even with millions of receipts.
+    return f"{filename[:2]}/{filename[2:4]}/{filename}"
+
+def receipt_key(content_hash, extension):
+    return shard_key(f"{content_hash}.{extension}")
+
+def is_receipt_key(key):
+    return bool(RECEIPT_KEY_PATTERN.fullmatch(key)) and shard_key(os.path.basename(key)) == key
+
+def derivative_key(content_hash, variant, extension):
+    return DERIVATIVES_PREFIX + shard_key(f"{content_hash}-{variant}.{extension}")
+
+def content_hash_of(key):
+    return os.path.basename(key).rsplit('.', 1)[0]
+
+class LocalBackend:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def scratch_folder(self):
+        # Same filesystem as the store, so put_file is an atomic rename.
+        return self.root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put_file(self, source_path, key):
+        target = self.path(key)
+        if os.path.exists(target):
+            os.remove(source_path)
+            os.utime(target)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source_path, target)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key)) or os.path.exists(self.legacy_path(key))
+
+    def local_path(self, key):
+        target = self.path(key)
+        if not os.path.exists(target) and os.path.exists(self.legacy_path(key)):
+            return self.legacy_path(key)
+        return target
+
+    def legacy_path(self, key):
+        # Receipts stored before sharding sit directly in the root folder.
+        return os.path.join(self.root, os.path.basename(key))
+
+    def delete(self, key):
+        for path in (self.path(key), self.legacy_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def iter_keys(self, prefix=''):
+        base = self.path(prefix) if prefix else self.root
+        for dirpath, dirnames, filenames in os.walk(base):
+            if not prefix:
+                dirnames[:] = [d for d in dirnames if f"{d}/" != DERIVATIVES_PREFIX]
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                full_path = os.path.join(dirpath, filename)
+                key = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                yield key, os.path.getmtime(full_path)
+
+    def relocate_legacy(self):
+        moved = 0
+        for folder, prefix in ((self.root, ''), (self.path(DERIVATIVES_PREFIX), DERIVATIVES_PREFIX)):
+            if not os.path.isdir(folder):
+                continue
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.startswith('.'):
+                        target = self.path(prefix + shard_key(entry.name))
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        os.replace(entry.path, target)
+                        moved += 1
+        return moved
+
+class S3Backend:
+    # Works against any S3-compatible API (AWS, MinIO, a moto server) via
+    # endpoint_url; credentials come from the usual boto3 environment.
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, cache_folder=None):
+        if boto3 is None:
+            raise RuntimeError('The s3 receipt backend requires boto3')
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client('s3', endpoint_url=endpoint_url or None, region_name=region or None)
+        self.cache_folder = cache_folder or os.path.join(tempfile.gettempdir(), 'receipt-cache')
+        os.makedirs(self.cache_folder, exist_ok=True)
+
+    @property
+    def scratch_folder(self):
+        return self.cache_folder
+
+    def object_key(self, key):
+        return f"{self.prefix}{key}"
+
+    def put_file(self, source_path, key):
+        try:
+            self.client.upload_file(source_path, self.bucket, self.object_key(key))
+        finally:
+            os.remove(source_path)
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except ClientError:
+            return False
+
+    def local_path(self, key):
+        # OCR and preview rendering need a real file; objects are content
+        # addressed, so a cached download never goes stale.
+        target = os.path.join(self.cache_folder, *key.split('/'))
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.download-')
+            os.close(fd)
+            try:
+                self.client.download_file(self.bucket, self.object_key(key), temp_path)
+            except ClientError:
+                os.remove(temp_path)
+                return target
+            os.replace(temp_path, target)
+        return target
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+        cached = os.path.join(self.cache_folder, *key.split('/'))
+        if os.path.exists(cached):
+            os.remove(cached)
+
+    def iter_keys(self, prefix=''):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.object_key(prefix)):
+            for item in page.get('Contents', []):
+                key = item['Key'][len(self.prefix):]
+                if not prefix and key.startswith(DERIVATIVES_PREFIX):
+                    continue
+                yield key, item['LastModified'].timestamp()
+
+    def relocate_legacy(self):
+        return 0
+
+class ReceiptStore:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def save_upload(self, file, max_bytes=None):
+        temp_path, content_hash, extension = spool_upload(file, self.backend.scratch_folder, max_bytes)
+        key = receipt_key(content_hash, extension)
+        self.backend.put_file(temp_path, key)
+        return key, content_hash
+
+    def put_derivative(self, source_path, content_hash, variant, extension):
+        key = derivative_key(content_hash, variant, extension)
+        self.backend.put_file(source_path, key)
+        return key
+
+    def key_for(self, receipt_path):
+        # Expense.receipt_path holds a shard key; rows written before the
+        # storage layer hold a flat 'static/uploads/receipts/<hash>.<ext>'.
+        if receipt_path.count('/') == 2 and not receipt_path.startswith(DERIVATIVES_PREFIX):
+            return receipt_path
+        return shard_key(os.path.basename(receipt_path))
+
+    def exists(self, receipt_path):
+        return self.backend.exists(self.key_for(receipt_path))
+
+    def local_path(self, receipt_path):
+        return self.backend.local_path(self.key_for(receipt_path))
+
+    def delete(self, receipt_path):
+        self.backend.delete(self.key_for(receipt_path))
+
+    @property
+    def scratch_folder(self):
+        return self.backend.scratch_folder
+
+def collect_garbage(store, grace_seconds, batch_size=500, now=None):
+    # Deletes stored receipts, mostly abandoned OCR scans, that are older
+    # than the grace period and not referenced by any Expense.receipt_path,
+    # together with their previews.
+    from models import db, Expense
+    from utils.receipt_previews import VARIANTS, PREVIEW_EXTENSION
+
+    cutoff = (now or time.time()) - grace_seconds
+    stats = {'relocated': store.backend.relocate_legacy(), 'scanned': 0, 'deleted': 0}
+
+    def sweep(keys):
+        names = set(keys) | {f"{Config.UPLOAD_FOLDER}/{os.path.basename(key)}" for key in keys}
+        referenced = {
+            store.key_for(path) for path in db.session.scalars(
+                db.select(Expense.receipt_path).where(Expense.receipt_path.in_(names))
+            )
+        }
+        for key in keys:
+            if key in referenced:
+                continue
+            store.backend.delete(key)
+            for variant in VARIANTS:
+                store.backend.delete(derivative_key(content_hash_of(key), variant, PREVIEW_EXTENSION))
+            stats['deleted'] += 1
+
+    batch = []
+    for key, modified_at in store.backend.iter_keys():
+        stats['scanned'] += 1
+        if modified_at >= cutoff:
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            sweep(batch)
+            batch = []
+    if batch:
+        sweep(batch)
+    return stats
+
+class ReceiptGcScheduler:
+    def __init__(self, app, store, interval, grace_seconds):
+        self.app = app
+        self.store = store
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='receipt-gc', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.last_run = collect_garbage(self.store, self.grace_seconds)
+            except Exception as e:
+                print(f"Receipt GC error: {e}")
+
+def build_backend():
+    if Config.RECEIPT_STORAGE_BACKEND == 's3':
+        return S3Backend(
+            Config.RECEIPT_S3_BUCKET,
+            prefix=Config.RECEIPT_S3_PREFIX,
+            endpoint_url=Config.RECEIPT_S3_ENDPOINT_URL,
+            region=Config.RECEIPT_S3_REGION
+        )
+    return LocalBackend(Config.UPLOAD_FOLDER)
+
+def start_receipt_gc(app):
+    if app.config['RECEIPT_GC_INTERVAL'] <= 0:
+        return None
+    scheduler = ReceiptGcScheduler(app, receipt_store, app.config['RECEIPT_GC_INTERVAL'], app.config['RECEIPT_GC_GRACE'])
+    scheduler.start()
+    return scheduler
+
+receipt_store = ReceiptStore(build_backend())
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        print(collect_garbage(receipt_store, app.config['RECEIPT_GC_GRACE']))
@@ -0,0 +1,110 @@
+from models import db, User, UserHierarchy
+
+class TeamCycleError(ValueError):
+    pass
+
+def add_user(user_id, manager_id=None):
+    # The new user sits under every ancestor of its manager (manager included,
+    # via the manager's own depth-0 row), plus its own depth-0 row.
+    db.session.add(UserHierarchy(ancestor_id=user_id, descendant_id=user_id, depth=0))
+    if manager_id is not None:
+        db.session.flush()
+        db.session.execute(db.insert(UserHierarchy).from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            db.select(UserHierarchy.ancestor_id, db.literal(user_id), UserHierarchy.depth + 1)
+            .where(UserHierarchy.descendant_id == manager_id)
+        ))
+
+def in_subtree(root_id, user_id):
+    return db.session.query(
+        db.exists().where(UserHierarchy.ancestor_id == root_id, UserHierarchy.descendant_id == user_id)
+    ).scalar()
+
+def check_manager(user_id, manager_id):
+    if manager_id is None:
+        return
+    if manager_id == user_id or in_subtree(user_id, manager_id):
+        raise TeamCycleError('A user cannot report to themselves or to someone in their own team')
+
+def move_user(user_id, manager_id):
+    # Re-parents user_id and its whole subtree in two set-based statements:
+    # drop every link from an outside ancestor into the subtree, then link
+    # each ancestor of the new manager to each member of the subtree.
+    check_manager(user_id, manager_id)
+
+    subtree = db.select(UserHierarchy.descendant_id).where(UserHierarchy.ancestor_id == user_id)
+    db.session.execute(db.delete(UserHierarchy).where(
+        UserHierarchy.descendant_id.in_(subtree),
+        UserHierarchy.ancestor_id.not_in(subtree)
+    ))
+
+    if manager_id is not None:
+        above = db.aliased(UserHierarchy)
+        below = db.aliased(UserHierarchy)
+        db.session.execute(db.insert(UserHierarchy).from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            db.select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+            .select_from(above)
+            .join(below, db.true())
+            .where(above.descendant_id == manager_id, below.ancestor_id == user_id)
+        ))
+
+def set_manager(user, manager_id):
+    # Called from the admin views before commit; raises TeamCycleError with
+    # nothing changed when the new manager sits inside the user's team.
+    if manager_id == user.manager_id:
+        return
+    move_user(user.id, manager_id)
+    user.manager_id = manager_id
+
+def team_member_ids(manager_id, max_depth=None):
+    query = db.select(UserHierarchy.descendant_id).where(
+        UserHierarchy.ancestor_id == manager_id,
+        UserHierarchy.depth > 0
+    )
+    if max_depth is not None:
+        query = query.where(UserHierarchy.depth <= max_depth)
+    return query
+
+def join_team(query, manager_id, employee_column):
+    return query.join(UserHierarchy, UserHierarchy.descendant_id == employee_column).filter(
+        UserHierarchy.ancestor_id == manager_id,
+        UserHierarchy.depth > 0
+    )
+
+def rebuild_hierarchy(company_id=None):
+    query = db.session.query(User.id, User.manager_id)
+    if company_id is not None:
+        query = query.filter(User.company_id == company_id)
+    managers = dict(query.all())
+
+    if company_id is None:
+        db.session.execute(db.delete(UserHierarchy))
+    else:
+        db.session.execute(db.delete(UserHierarchy).where(
+            UserHierarchy.descendant_id.in_(db.select(User.id).where(User.company_id == company_id))
+        ))
+
+    rows, broken = [], []
+    for user_id in managers:
+        rows.append({'ancestor_id': user_id, 'descendant_id': user_id, 'depth': 0})
+        seen = {user_id}
+        ancestor, depth = managers.get(user_id), 1
+        while ancestor is not None:
+            if ancestor in seen:
+                # A cycle already stored in manager_id; the links that were
+                # gathered up to that point are kept and the rest dropped.
+                broken.append(user_id)
+                break
+            seen.add(ancestor)
+            rows.append({'ancestor_id': ancestor, 'descendant_id': user_id, 'depth': depth})
+            ancestor, depth = managers.get(ancestor), depth + 1
+
+    for start in range(0, len(rows), 5000):
+        db.session.execute(db.insert(UserHierarchy), rows[start:start + 5000])
+    return broken
+
+def hierarchy_out_of_date():
+    users = db.session.query(db.func.count(User.id)).scalar()
+    self_rows = db.session.query(db.func.count()).select_from(UserHierarchy).filter(UserHierarchy.depth == 0).scalar()
+    return users != self_rows